@@ -7,6 +7,7 @@ import asyncio
 
 import json
 import logging
+import os
 import shutil
 
 import signal
@@ -21,13 +22,34 @@ import httpx
 import rich
 import rich.progress
 import stamina
+from appdirs import user_cache_dir
 from keke import kev, TraceOutput
 
 from py_wtf.__about__ import __version__
 from py_wtf.indexer import index_dir, index_file, index_project
-from py_wtf.indexer.pypi import parse_deps, parse_upload_time
+from py_wtf.indexer.http import ClientConfig, ClientMetrics, make_client
+from py_wtf.indexer.pypi import is_unchanged, parse_deps, parse_upload_time
+from py_wtf.indexer.scheduler import Scheduler, Stage, StageLimits, STAGES
+from py_wtf.indexer.throttle import AdaptiveLimiter, ThrottleConfig
 from py_wtf.logging import setup_logging
-from py_wtf.repository import converter, METADATA_FILENAME, ProjectRepository
+from py_wtf.repository import (
+    AGGREGATE_FILENAME,
+    converter,
+    MANIFEST_FILENAME,
+    METADATA_FILENAME,
+    ProjectRepository,
+    read_versions,
+    VERSIONS_FILENAME,
+)
+from py_wtf.repository.columnar import ColumnarExport
+from py_wtf.repository.compression import Compression
+from py_wtf.repository.encoding import ConverterBackend, make_converter
+from py_wtf.repository.failures import FailureCache, FAILURES_FILENAME, KnownFailure
+from py_wtf.repository.http_cache import HTTPCache
+from py_wtf.repository.layout import FLAT, LAYOUT_FILENAME, SHARDED
+from py_wtf.repository.search import SEARCH_DIRECTORY, SPLITS_FILENAME
+from py_wtf.repository.sqlite import SQLiteBackend
+from py_wtf.repository.usages import SOURCES_FILENAME, USAGES_DIRECTORY
 from py_wtf.types import (
     Documentation,
     FQName,
@@ -60,44 +82,321 @@ def py_wtf(ctx: click.Context, log_level: int | None) -> None:
     setup_logging(log_level)
 
 
+cache_size_option = click.option(
+    "--max-cached-projects",
+    type=int,
+    help="Evict finished projects from memory beyond this many",
+)
+
+
+compression_option = click.option(
+    "--compress",
+    "compression",
+    type=click.Choice(["gzip", "zstd"]),
+    multiple=True,
+    help="Write compressed project files instead of plain JSON",
+)
+
+
+write_behind_option = click.option(
+    "--write-behind",
+    type=int,
+    default=64,
+    show_default=True,
+    help="Queue up to this many project saves to write in the background",
+)
+
+
+split_modules_option = click.option(
+    "--split-modules",
+    is_flag=True,
+    help="Write each project as a manifest and a file per module",
+)
+
+
+compact_option = click.option(
+    "--compact",
+    is_flag=True,
+    help="Write project files in the compact encoding, which the site can't read yet",
+)
+
+
+http_cache_option = click.option(
+    "--http-cache/--no-http-cache",
+    default=True,
+    show_default=True,
+    help="Revalidate projects fetched from py.wtf against a local cache",
+)
+
+
+def make_http_cache(enabled: bool) -> HTTPCache | None:
+    if not enabled:
+        return None
+    return HTTPCache(Path(user_cache_dir("py.wtf")) / "http")
+
+
+def http_client_options[F: Callable[..., object]](f: F) -> F:
+    defaults = ClientConfig()
+    for option in reversed(
+        [
+            click.option(
+                "--max-connections",
+                type=int,
+                default=defaults.max_connections,
+                show_default=True,
+                help="Open at most this many HTTP connections at a time",
+            ),
+            click.option(
+                "--max-keepalive-connections",
+                type=int,
+                default=defaults.max_keepalive_connections,
+                show_default=True,
+                help="Keep up to this many idle HTTP connections open",
+            ),
+            click.option(
+                "--keepalive-expiry",
+                type=float,
+                default=defaults.keepalive_expiry,
+                show_default=True,
+                help="Close idle HTTP connections after this many seconds",
+            ),
+            click.option(
+                "--http2",
+                is_flag=True,
+                help="Multiplex requests over HTTP/2 connections where supported",
+            ),
+            click.option(
+                "--rate-limit",
+                type=float,
+                default=ThrottleConfig().rate,
+                show_default=True,
+                help="Send at most this many requests per second to each host",
+            ),
+        ]
+    ):
+        f = option(f)
+    return f
+
+
+stage_limit_option = click.option(
+    "--stage-limit",
+    "stage_limits",
+    type=(click.Choice(STAGES), int),
+    multiple=True,
+    metavar="STAGE N",
+    help="Work on up to N projects at a time in STAGE (fetch, download, parse, link or save)",
+)
+
+two_phase_option = click.option(
+    "--two-phase",
+    is_flag=True,
+    help="Parse projects without waiting for their dependencies, and link them afterwards",
+)
+
+
+def make_stage_limits(stage_limits: tuple[tuple[Stage, int], ...]) -> StageLimits:
+    return StageLimits(**dict(stage_limits))
+
+
+def make_limiter(rate_limit: float) -> AdaptiveLimiter:
+    return AdaptiveLimiter(ThrottleConfig(rate=rate_limit))
+
+
+def make_client_config(
+    max_connections: int,
+    max_keepalive_connections: int,
+    keepalive_expiry: float,
+    http2: bool,
+) -> ClientConfig:
+    return ClientConfig(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+        http2=http2,
+    )
+
+
+json_backend_option = click.option(
+    "--json-backend",
+    type=click.Choice(["json", "orjson"]),
+    default="json",
+    show_default=True,
+    help="Encode and decode project files with this JSON library",
+)
+
+
+hydration_workers_option = click.option(
+    "--hydration-workers",
+    type=int,
+    default=os.process_cpu_count(),
+    show_default=True,
+    help="Read the metadata of indexed projects on this many processes",
+)
+
+
+def make_progress() -> rich.progress.Progress:
+    return rich.progress.Progress(
+        rich.progress.TimeElapsedColumn(),
+        rich.progress.TextColumn("{task.fields[action]} {task.description}"),
+        rich.progress.BarColumn(),
+    )
+
+
+sqlite_option = click.option(
+    "--sqlite",
+    "database",
+    type=click.Path(dir_okay=False),
+    help="Store projects in this SQLite database instead of the index directory",
+)
+
+
+def make_backend(database: str | None) -> SQLiteBackend | None:
+    if database is None:
+        return None
+    return SQLiteBackend(Path(database))
+
+
 @py_wtf.command()
 @click.argument("directory")
 @click.option("--project-name", required=True)
 @click.option("--pretty", is_flag=True)
 @click.option("--force", is_flag=True, help="Blow away index repository and reindex")
+@compression_option
+@write_behind_option
+@split_modules_option
+@compact_option
+@json_backend_option
+@http_cache_option
+@http_client_options
+@two_phase_option
+@sqlite_option
+@hydration_workers_option
 @coroutine
-async def index(project_name: str, directory: str, pretty: bool, force: bool) -> None:
+async def index(
+    project_name: str,
+    directory: str,
+    pretty: bool,
+    force: bool,
+    compression: tuple[Compression, ...],
+    write_behind: int,
+    split_modules: bool,
+    compact: bool,
+    json_backend: ConverterBackend,
+    http_cache: bool,
+    max_connections: int,
+    max_keepalive_connections: int,
+    keepalive_expiry: float,
+    http2: bool,
+    rate_limit: float,
+    two_phase: bool,
+    database: str | None,
+    hydration_workers: int,
+) -> None:
     out_dir = Path(directory)
     if force:
         shutil.rmtree(out_dir, ignore_errors=True)
     out_dir.mkdir(parents=True, exist_ok=True)
-    repo = ProjectRepository(out_dir)
+    repo = ProjectRepository(
+        out_dir,
+        compression=compression,
+        write_behind=write_behind,
+        split_modules=split_modules,
+        compact=compact,
+        converter=make_converter(json_backend),
+        http_cache=make_http_cache(http_cache),
+        backend=make_backend(database),
+    )
 
-    proj = await repo.get(
-        ProjectName(project_name),
-        partial(index_project, repo=repo, skip_existing=force),
+    metrics = ClientMetrics()
+    limiter = make_limiter(rate_limit)
+    config = make_client_config(
+        max_connections, max_keepalive_connections, keepalive_expiry, http2
     )
+    async with make_client(config, metrics, limiter) as client:
+        proj = await repo.get(
+            ProjectName(project_name),
+            partial(
+                index_project,
+                repo=repo,
+                skip_existing=force,
+                client=client,
+                two_phase=two_phase,
+            ),
+        )
+    metrics.log()
+    limiter.log()
 
     if pretty:
         rich.print(proj)
 
-    repo.write_index()
+    await repo.flush()
+    with make_progress() as progress:
+        await repo.run_io(
+            repo.write_index, workers=hydration_workers, progress=progress
+        )
+    await repo.aclose()
 
 
 @py_wtf.command()
 @click.argument("directory")
 @click.option("--top", type=int, default=50)
+@cache_size_option
+@compression_option
+@write_behind_option
+@split_modules_option
+@compact_option
+@json_backend_option
+@http_cache_option
+@http_client_options
+@stage_limit_option
+@two_phase_option
+@sqlite_option
+@hydration_workers_option
 @coroutine
-async def index_top_pypi(directory: str, top: int) -> None:
+async def index_top_pypi(
+    directory: str,
+    top: int,
+    max_cached_projects: int | None,
+    compression: tuple[Compression, ...],
+    write_behind: int,
+    split_modules: bool,
+    compact: bool,
+    json_backend: ConverterBackend,
+    http_cache: bool,
+    max_connections: int,
+    max_keepalive_connections: int,
+    keepalive_expiry: float,
+    http2: bool,
+    rate_limit: float,
+    stage_limits: tuple[tuple[Stage, int], ...],
+    two_phase: bool,
+    database: str | None,
+    hydration_workers: int,
+) -> None:
     out_dir = Path(directory)
     out_dir.mkdir(parents=True, exist_ok=True)
-    repo = ProjectRepository(out_dir)
+    repo = ProjectRepository(
+        out_dir,
+        max_cached_projects=max_cached_projects,
+        compression=compression,
+        write_behind=write_behind,
+        split_modules=split_modules,
+        compact=compact,
+        converter=make_converter(json_backend),
+        http_cache=make_http_cache(http_cache),
+        backend=make_backend(database),
+    )
     if hasattr(signal, "SIGUSR1"):
         signal.signal(signal.SIGUSR1, lambda *_: repo.pending_items())
     loop = asyncio.get_running_loop()
     loop.call_later(60 * 10, schedule_pending_item_printer, repo)
     top_pkgs = {}
-    async with httpx.AsyncClient() as client:
+    metrics = ClientMetrics()
+    limiter = make_limiter(rate_limit)
+    config = make_client_config(
+        max_connections, max_keepalive_connections, keepalive_expiry, http2
+    )
+    async with make_client(config, metrics, limiter) as client:
         async for attempt in stamina.retry_context(on=httpx.RequestError, attempts=3):
             with attempt:
                 top_pkgs = (
@@ -107,27 +406,24 @@ async def index_top_pypi(directory: str, top: int) -> None:
                 ).json()
         projects: Iterable[str] = (row["project"] for row in top_pkgs["rows"][:top])
 
-    with rich.progress.Progress(
-        rich.progress.TimeElapsedColumn(),
-        rich.progress.TextColumn("{task.fields[action]} {task.description}"),
-        rich.progress.BarColumn(),
-    ) as progress:
-        progress.console.height = max(2, progress.console.height // 2)
-        rets = await asyncio.gather(
-            *[
-                repo.get(
-                    ProjectName(name),
-                    partial(index_project, repo=repo, progress=progress),
-                )
-                for name in projects
-            ],
-            return_exceptions=True,
-        )
-        for ret in rets:
-            if isinstance(ret, Exception):
-                logger.exception(ret)
+        with make_progress() as progress:
+            progress.console.height = max(2, progress.console.height // 2)
+            scheduler = Scheduler(
+                repo,
+                client,
+                make_stage_limits(stage_limits),
+                progress=progress,
+                two_phase=two_phase,
+            )
+            await scheduler.run(ProjectName(name) for name in projects)
 
-        repo.write_index()
+            await repo.flush()
+            await repo.run_io(
+                repo.write_index, workers=hydration_workers, progress=progress
+            )
+            await repo.aclose()
+    metrics.log()
+    limiter.log()
 
 
 @py_wtf.command(name="index-file")
@@ -156,68 +452,340 @@ def schedule_pending_item_printer(repo: ProjectRepository) -> None:
     repo.pending_items()
 
 
+async def fetch_prod_index_file(
+    client: httpx.AsyncClient, out_dir: Path, filename: str
+) -> None:
+    async for attempt in stamina.retry_context(on=httpx.RequestError, attempts=3):
+        with attempt:
+            resp = await client.get(
+                f"https://py.wtf/_index/{filename}", follow_redirects=True
+            )
+            resp.raise_for_status()
+            path = out_dir / filename
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(resp.content)
+
+
+async def fetch_shard(client: httpx.AsyncClient, out_dir: Path, path: str) -> None:
+    try:
+        await fetch_prod_index_file(client, out_dir, path)
+    except httpx.HTTPStatusError as e:
+        # New shards don't exist yet
+        if e.response.status_code != 404:
+            raise
+
+
 @py_wtf.command(name="index-since")
 @click.option("--since", type=click.DateTime(), required=True)
 @click.option("--trace", type=click.File(mode="w"))
+@cache_size_option
+@compression_option
+@write_behind_option
+@split_modules_option
+@json_backend_option
+@http_cache_option
+@http_client_options
+@stage_limit_option
+@two_phase_option
 @click.argument("directory")
 @coroutine
-async def index_since(directory: str, since: datetime, trace: IO[str] | None) -> None:
+async def index_since(
+    directory: str,
+    since: datetime,
+    trace: IO[str] | None,
+    max_cached_projects: int | None,
+    compression: tuple[Compression, ...],
+    write_behind: int,
+    split_modules: bool,
+    json_backend: ConverterBackend,
+    http_cache: bool,
+    max_connections: int,
+    max_keepalive_connections: int,
+    keepalive_expiry: float,
+    http2: bool,
+    rate_limit: float,
+    stage_limits: tuple[tuple[Stage, int], ...],
+    two_phase: bool,
+) -> None:
     with TraceOutput(file=trace):  # type: ignore
         from google.cloud import bigquery
 
         with kev("bigquery"):
-            client = bigquery.Client()
+            bigquery_client = bigquery.Client()
             time_format = "%Y-%m-%d %H:%M:%S"
             threadpool = ThreadPoolExecutor()
             rows = await asyncio.get_running_loop().run_in_executor(
                 threadpool,
-                client.query_and_wait,
+                bigquery_client.query_and_wait,
                 f"""
-                SELECT distinct name
+                SELECT distinct name, version
                 FROM
                     `bigquery-public-data.pypi.distribution_metadata`
                 WHERE
                     TIMESTAMP(upload_time) >= TIMESTAMP("{since.strftime(time_format)}")
                 """,
             )
-            rows = list(rows)
-        logger.info(f"Found {len(rows)} new projects to index")
+            uploads: dict[ProjectName, list[str]] = {}
+            for row in rows:
+                uploads.setdefault(ProjectName(row.name), []).append(row.version)
+        logger.info(f"Found {len(uploads)} new projects to index")
         out_dir = Path(directory)
         out_dir.mkdir(parents=True, exist_ok=True)
-        with kev("fetch prod index"):
-            async with httpx.AsyncClient() as client:
-                async for attempt in stamina.retry_context(
-                    on=httpx.RequestError, attempts=3
-                ):
-                    with attempt:
-                        resp = await client.get(
-                            f"https://py.wtf/_index/{METADATA_FILENAME}",
-                            follow_redirects=True,
-                        )
-                        resp.raise_for_status()
-                        (out_dir / METADATA_FILENAME).write_bytes(resp.content)
-
-        logger.info("Fetched prod index")
-        repo = ProjectRepository(out_dir)
-        if hasattr(signal, "SIGUSR1"):
-            signal.signal(signal.SIGUSR1, lambda *_: repo.pending_items())
-        loop = asyncio.get_running_loop()
-        loop.call_later(60 * 10, schedule_pending_item_printer, repo)
-        with kev("index projects"):
-            rets = await asyncio.gather(
-                *[
-                    repo.get(ProjectName(row.name), partial(index_project, repo=repo))
-                    for row in rows
-                ],
-                return_exceptions=True,
+        metrics = ClientMetrics()
+        limiter = make_limiter(rate_limit)
+        config = make_client_config(
+            max_connections, max_keepalive_connections, keepalive_expiry, http2
+        )
+        async with make_client(config, metrics, limiter) as client:
+            with kev("fetch prod index"):
+                # update_index can't do without these
+                await fetch_prod_index_file(client, out_dir, METADATA_FILENAME)
+                try:
+                    # Where fetch_from_remote finds project files
+                    await fetch_prod_index_file(client, out_dir, LAYOUT_FILENAME)
+                except httpx.HTTPStatusError as e:
+                    # There's none when they're all in the top directory
+                    if e.response.status_code != 404:
+                        raise
+                try:
+                    await fetch_prod_index_file(client, out_dir, AGGREGATE_FILENAME)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code != 404:
+                        raise
+                    raise click.ClickException(
+                        f"There's no {AGGREGATE_FILENAME} in the prod index yet, "
+                        "bootstrap it with a full write-index first"
+                    ) from e
+                for filename in [
+                    MANIFEST_FILENAME,
+                    VERSIONS_FILENAME,
+                    FAILURES_FILENAME,
+                    f"{SEARCH_DIRECTORY}/{SPLITS_FILENAME}",
+                    f"{USAGES_DIRECTORY}/{SOURCES_FILENAME}",
+                ]:
+                    try:
+                        await fetch_prod_index_file(client, out_dir, filename)
+                    except httpx.HTTPStatusError as e:
+                        logger.warning(f"Unable to fetch {filename}: {e}")
+
+            logger.info("Fetched prod index")
+            remote_versions = None
+            if (out_dir / VERSIONS_FILENAME).exists():
+                remote_versions = read_versions(out_dir)
+                names = [
+                    name
+                    for name, versions in uploads.items()
+                    if not is_unchanged(remote_versions.get(name), versions)
+                ]
+                logger.info(
+                    f"{len(uploads) - len(names)} projects are unchanged since last indexed"
+                )
+            else:
+                names = list(uploads)
+            repo = ProjectRepository(
+                out_dir,
+                max_cached_projects=max_cached_projects,
+                compression=compression,
+                write_behind=write_behind,
+                split_modules=split_modules,
+                converter=make_converter(json_backend),
+                http_cache=make_http_cache(http_cache),
+                remote_versions=remote_versions,
             )
-        for ret in rets:
-            if isinstance(ret, Exception):
-                logger.error(ret, exc_info=ret)
-        logger.info("Done indexing")
+            repo.retry_updated(uploads)
+            if hasattr(signal, "SIGUSR1"):
+                signal.signal(signal.SIGUSR1, lambda *_: repo.pending_items())
+            loop = asyncio.get_running_loop()
+            loop.call_later(60 * 10, schedule_pending_item_printer, repo)
+            with kev("index projects"):
+                scheduler = Scheduler(
+                    repo, client, make_stage_limits(stage_limits), two_phase=two_phase
+                )
+                errors = await scheduler.run(names)
+            with kev("flush saves"):
+                await repo.flush()
+            logger.info("Done indexing")
+            with kev("fetch shards"):
+                # Shard lists of projects first, then the shards they're in
+                fetched: set[str] = set()
+                while missing := [
+                    path
+                    for path in await repo.run_io(repo.shards_missing)
+                    if path not in fetched
+                ]:
+                    fetched.update(missing)
+                    await asyncio.gather(
+                        *[fetch_shard(client, out_dir, path) for path in missing]
+                    )
         with kev("update index"):
-            repo.update_index()
+            await repo.run_io(repo.update_index)
+        await repo.aclose()
+        metrics.log()
+        limiter.log()
         logger.info("Wrote new index")
+        # Known failures were reported when they happened
+        failed = sorted(
+            name for name, e in errors.items() if not isinstance(e, KnownFailure)
+        )
+        if failed:
+            # The index has every project that didn't fail, but it's incomplete
+            logger.error(f"{len(failed)} projects failed to index: {', '.join(failed)}")
+            raise click.exceptions.Exit(1)
+
+
+@py_wtf.command()
+@click.argument("directory")
+@click.option(
+    "--sharded/--flat",
+    default=True,
+    help="Move project files into hash prefixed subdirectories, or back out",
+)
+def migrate_layout(directory: str, sharded: bool) -> None:
+    repo = ProjectRepository(Path(directory))
+    repo.migrate(SHARDED if sharded else FLAT)
+
+
+@py_wtf.command(name="write-index")
+@click.argument("directory")
+@hydration_workers_option
+@coroutine
+async def write_index_cmd(directory: str, hydration_workers: int) -> None:
+    """
+    Rebuild the index files of DIRECTORY from every project in it. This
+    bootstraps what index-since only updates incrementally.
+    """
+
+    repo = ProjectRepository(Path(directory))
+    with make_progress() as progress:
+        await repo.run_io(
+            repo.write_index, workers=hydration_workers, progress=progress
+        )
+    await repo.aclose()
+    logger.info("Wrote new index")
+
+
+@py_wtf.command()
+@click.argument("database", type=click.Path(exists=True, dir_okay=False))
+@click.argument("directory")
+@click.option(
+    "--sharded/--flat",
+    default=None,
+    help="Layout of the project files, defaults to the directory's current one",
+)
+@compression_option
+@write_behind_option
+@split_modules_option
+@compact_option
+@json_backend_option
+@coroutine
+async def export_json(
+    database: str,
+    directory: str,
+    sharded: bool | None,
+    compression: tuple[Compression, ...],
+    write_behind: int,
+    split_modules: bool,
+    compact: bool,
+    json_backend: ConverterBackend,
+) -> None:
+    """Write the projects of an SQLite database out as an index directory."""
+
+    out_dir = Path(directory)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    repo = ProjectRepository(
+        out_dir,
+        # Projects only pass through on their way to disk
+        max_cached_projects=0,
+        layout=None if sharded is None else SHARDED if sharded else FLAT,
+        compression=compression,
+        write_behind=write_behind,
+        split_modules=split_modules,
+        compact=compact,
+        converter=make_converter(json_backend),
+    )
+    backend = SQLiteBackend(Path(database))
+    await repo.export(backend)
+    await repo.flush()
+    await repo.run_io(repo.write_index)
+    await repo.aclose()
+    backend.close()
+
+
+@py_wtf.command()
+@click.argument("database", type=click.Path(exists=True, dir_okay=False))
+@click.argument("query")
+@click.option("--limit", type=int, default=20, show_default=True)
+def search(database: str, query: str, limit: int) -> None:
+    """Full text search the symbols of an SQLite database."""
+
+    backend = SQLiteBackend(Path(database))
+    for project, fqname, kind in backend.search(query, limit):
+        rich.print(f"[bold]{fqname}[/bold] ({kind}) in {project}")
+    backend.close()
+
+
+@py_wtf.command()
+@click.argument("directory")
+@click.argument("output")
+@json_backend_option
+@sqlite_option
+@hydration_workers_option
+@coroutine
+async def export(
+    directory: str,
+    output: str,
+    json_backend: ConverterBackend,
+    database: str | None,
+    hydration_workers: int,
+) -> None:
+    """
+    Write every indexed project into Parquet tables of projects, modules,
+    classes, functions, parameters and xrefs. Only projects that changed since
+    the last export into OUTPUT are written again.
+    """
+
+    repo = ProjectRepository(
+        Path(directory),
+        converter=make_converter(json_backend),
+        backend=make_backend(database),
+    )
+    with make_progress() as progress:
+        written, removed = await repo.run_io(
+            ColumnarExport(Path(output)).export,
+            repo,
+            workers=hydration_workers,
+            progress=progress,
+        )
+    await repo.aclose()
+    logger.info(f"Exported {written} projects, removed {removed}")
+
+
+@py_wtf.command()
+@click.argument("directory")
+def failures(directory: str) -> None:
+    """List the projects that recently failed to index."""
+
+    for name, failure in (
+        FailureCache(Path(directory) / FAILURES_FILENAME).entries().items()
+    ):
+        expires = datetime.fromtimestamp(failure.expires_at)
+        version = f" {failure.version}" if failure.version else ""
+        rich.print(
+            f"[bold]{name}[/bold]{version}: {failure.reason}, "
+            f"retrying after {expires:%Y-%m-%d %H:%M}"
+        )
+
+
+@py_wtf.command()
+@click.argument("directory")
+@click.argument("names", nargs=-1)
+def clear_failures(directory: str, names: tuple[str, ...]) -> None:
+    """Forget failures of NAMES, or of every project, so they're retried."""
+
+    cache = FailureCache(Path(directory) / FAILURES_FILENAME)
+    forgotten = cache.forget([ProjectName(name) for name in names] or None)
+    cache.write()
+    logger.info(f"Forgot {len(forgotten)} failures")
 
 
 @py_wtf.command()
@@ -252,7 +820,7 @@ async def generate_test_index(dir: str | None) -> None:
             modules=mods,
             documentation=[Documentation(proj_info.summary or "")],
         )
-        (out_dir / f"{proj.name}.json").write_text(converter.dumps(_sort(proj)))
+        (out_dir / f"{proj.name}.json").write_bytes(converter.dumpb(_sort(proj)))
     repo = ProjectRepository(out_dir)
     repo.write_index(1662219954)
 
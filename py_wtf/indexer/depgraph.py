@@ -0,0 +1,123 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+from py_wtf.types import ProjectName
+
+
+@dataclass(slots=True)
+class DependencyGraph:
+    """
+    Edges from projects to their dependencies, kept free of cycles.
+
+    Nodes are kept in topological order as edges are added (Pearce and
+    Kelly's dynamic topological sort). An edge that agrees with the order
+    can't close a cycle. For one that doesn't, only the nodes between its
+    ends in the order are searched and reordered, not the whole graph.
+    """
+
+    # Every dependency comes after the projects depending on it
+    _position: dict[ProjectName, int] = field(default_factory=dict)
+    _dependencies: defaultdict[ProjectName, set[ProjectName]] = field(
+        default_factory=lambda: defaultdict(set)
+    )
+    _dependents: defaultdict[ProjectName, set[ProjectName]] = field(
+        default_factory=lambda: defaultdict(set)
+    )
+
+    def __contains__(self, name: ProjectName) -> bool:
+        return name in self._position
+
+    def __len__(self) -> int:
+        return len(self._position)
+
+    def add_node(self, name: ProjectName) -> int:
+        if (position := self._position.get(name)) is None:
+            # Reordering only swaps positions around, so they stay 0..n-1
+            position = self._position[name] = len(self._position)
+        return position
+
+    def add_edge(self, project: ProjectName, dependency: ProjectName) -> bool:
+        """
+        Add an edge from ``project`` to ``dependency``, unless it would close a
+        cycle. Returns whether it was added.
+        """
+
+        upper = self.add_node(project)
+        lower = self.add_node(dependency)
+        if dependency in self._dependencies[project]:
+            return True
+        if project == dependency:
+            return False
+        if lower < upper:
+            forward = self._reachable(dependency, upper, self._dependencies)
+            if project in forward:
+                return False
+            backward = self._reachable(project, lower, self._dependents)
+            self._reorder(backward, forward)
+        self._dependencies[project].add(dependency)
+        self._dependents[dependency].add(project)
+        return True
+
+    def _reachable(
+        self,
+        start: ProjectName,
+        bound: int,
+        edges: dict[ProjectName, set[ProjectName]],
+    ) -> set[ProjectName]:
+        # Nodes reachable from start without leaving the positions between
+        # start and bound. Nodes outside of them are on the right side already.
+        low, high = sorted((self._position[start], bound))
+        seen = {start}
+        stack = [start]
+        while stack:
+            for node in edges.get(stack.pop(), ()):
+                if node not in seen and low <= self._position[node] <= high:
+                    seen.add(node)
+                    stack.append(node)
+        return seen
+
+    def _reorder(self, before: set[ProjectName], after: set[ProjectName]) -> None:
+        # Move everything that depends on the new edge's project ahead of
+        # everything its dependency depends on, reusing their positions
+        nodes = sorted(before, key=self._position.__getitem__) + sorted(
+            after, key=self._position.__getitem__
+        )
+        positions = sorted(self._position[node] for node in nodes)
+        for node, position in zip(nodes, positions):
+            self._position[node] = position
+
+    def has_edge(self, project: ProjectName, dependency: ProjectName) -> bool:
+        return dependency in self._dependencies.get(project, ())
+
+    def dependencies(self, name: ProjectName) -> set[ProjectName]:
+        return self._dependencies.get(name, set())
+
+    def dependents(self, name: ProjectName) -> set[ProjectName]:
+        return self._dependents.get(name, set())
+
+    def edges(self) -> Iterator[tuple[ProjectName, ProjectName]]:
+        for project, dependencies in self._dependencies.items():
+            for dependency in dependencies:
+                yield project, dependency
+
+    def waves(self, names: Iterable[ProjectName]) -> list[list[ProjectName]]:
+        """
+        ``names`` grouped so that each group only depends on earlier ones,
+        considering edges between ``names`` only.
+        """
+
+        subset = set(names)
+        if not subset:
+            return []
+        wave: dict[ProjectName, int] = {}
+        # Dependencies come later in the order, so go backwards
+        for name in sorted(subset, key=self._position.__getitem__, reverse=True):
+            wave[name] = 1 + max(
+                (wave[dep] for dep in self.dependencies(name) if dep in subset),
+                default=-1,
+            )
+        ret: list[list[ProjectName]] = [[] for _ in range(max(wave.values()) + 1)]
+        for name, n in wave.items():
+            ret[n].append(name)
+        return [sorted(names) for names in ret]
@@ -68,7 +68,7 @@ def index_file(
     path: Path,
     symbol_table: SymbolTable | None = None,
 ) -> Module:
-    if not symbol_table:
+    if symbol_table is None:
         symbol_table = SymbolTable()
     name_parts = path.relative_to(base_dir).with_suffix("").parts
     is_pkg = False
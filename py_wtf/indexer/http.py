@@ -0,0 +1,102 @@
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from importlib.util import find_spec
+from typing import Any
+
+import httpx
+
+from py_wtf.indexer.throttle import AdaptiveLimiter, ThrottledTransport
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class HostStats:
+    requests: int = 0
+    # Connections opened to the host, every other request reused a kept-alive
+    # one (or shared one, with HTTP/2)
+    connections: int = 0
+    errors: int = 0
+    http2: int = 0
+
+
+@dataclass(slots=True)
+class ClientMetrics:
+    """Per-host request and connection counts of a client, via its event hooks."""
+
+    hosts: defaultdict[str, HostStats] = field(
+        default_factory=lambda: defaultdict(HostStats)
+    )
+
+    async def on_request(self, request: httpx.Request) -> None:
+        stats = self.hosts[request.url.host]
+        stats.requests += 1
+        previous = request.extensions.get("trace")
+
+        async def trace(event: str, info: dict[str, Any]) -> None:
+            if event == "connection.connect_tcp.complete":
+                stats.connections += 1
+            if previous is not None:
+                await previous(event, info)
+
+        request.extensions["trace"] = trace
+
+    async def on_response(self, response: httpx.Response) -> None:
+        stats = self.hosts[response.request.url.host]
+        if response.is_error:
+            stats.errors += 1
+        if response.http_version == "HTTP/2":
+            stats.http2 += 1
+
+    def log(self) -> None:
+        for host, stats in sorted(self.hosts.items()):
+            logger.info(
+                f"{host}: {stats.requests} requests over {stats.connections} "
+                f"connections ({stats.http2} over HTTP/2), {stats.errors} errors"
+            )
+
+
+@dataclass(slots=True, frozen=True)
+class ClientConfig:
+    max_connections: int = 64
+    max_keepalive_connections: int = 32
+    # Seconds an idle connection is kept open for
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+
+
+def make_client(
+    config: ClientConfig = ClientConfig(),
+    metrics: ClientMetrics | None = None,
+    limiter: AdaptiveLimiter | None = None,
+) -> httpx.AsyncClient:
+    """
+    A client to share between every request of an indexing run, so that
+    connections to PyPI, its file host and py.wtf are pooled and kept alive
+    across projects, and requests to each of them stay within ``limiter``'s
+    limits.
+    """
+
+    if config.http2 and find_spec("h2") is None:
+        raise ValueError("HTTP/2 needs the h2 package, install py-wtf[http2]")
+    hooks: dict[str, list[Any]] = {}
+    if metrics is not None:
+        hooks = {"request": [metrics.on_request], "response": [metrics.on_response]}
+    transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        http2=config.http2,
+    )
+    if limiter is not None:
+        transport = ThrottledTransport(transport, limiter)
+    return httpx.AsyncClient(
+        transport=transport,
+        # Requests queue up for a connection from the shared pool for as long
+        # as it takes, the other timeouts still apply once they have one
+        timeout=httpx.Timeout(5.0, pool=None),
+        event_hooks=hooks,
+    )
@@ -0,0 +1,161 @@
+from dataclasses import dataclass, field, replace
+from typing import Callable
+
+from py_wtf.repository.symbols import project_symbols
+from py_wtf.types import (
+    Class,
+    Export,
+    FQName,
+    Function,
+    Module,
+    Parameter,
+    Project,
+    ProjectName,
+    stdlib_project,
+    SymbolTable,
+    Type,
+    Variable,
+    XRef,
+)
+
+
+def link(project: Project, symbols: SymbolTable) -> Project:
+    """
+    Resolve which project every xref of ``project`` points to, in ``symbols``
+    (the symbols of its dependencies). Projects parsed without their
+    dependencies' symbols are linked this way once those are available, and
+    linking again when a dependency gains symbols is cheap: ``project`` is
+    returned as is when nothing changed, and unchanged parts are shared.
+    """
+
+    return Linker(symbols).project(project)
+
+
+def _each[T](items: list[T], fn: Callable[[T], T]) -> list[T]:
+    ret = [fn(item) for item in items]
+    if all(new is old for new, old in zip(ret, items)):
+        return items
+    return ret
+
+
+@dataclass(slots=True)
+class Linker:
+    symbols: SymbolTable
+    # How many xrefs pointed to a different project after linking
+    changed: int = 0
+
+    _own: set[str] = field(default_factory=set)
+    _resolved: dict[FQName, ProjectName | None] = field(default_factory=dict)
+
+    def resolve(self, fqname: FQName) -> ProjectName | None:
+        if fqname in self._resolved:
+            return self._resolved[fqname]
+        project = None
+        name = str(fqname)
+        while True:
+            try:
+                project = self.symbols[FQName(name)]
+                break
+            except KeyError:
+                pass
+            # Attribute annotations like ``mod.Thing`` are attributed to where
+            # ``mod`` comes from when parsing, so fall back to the innermost
+            # symbol around fqname, unless that's the project's own
+            name, dot, _ = name.rpartition(".")
+            if not dot or name in self._own:
+                break
+        self._resolved[fqname] = project
+        return project
+
+    def xref(self, xref: XRef, project: ProjectName | None) -> XRef:
+        if project == xref.project:
+            return xref
+        self.changed += 1
+        return replace(xref, project=project)
+
+    def type_xref(self, xref: XRef) -> XRef:
+        # Builtins are attributed to the stdlib when parsing, by their name
+        # rather than their fqname, so they can't be looked up again
+        if xref.project == stdlib_project:
+            return xref
+        return self.xref(xref, self.resolve(xref.fqname))
+
+    def type(self, ty: Type) -> Type:
+        xref = ty.xref and self.type_xref(ty.xref)
+        params = ty.params and _each(ty.params, self.type)
+        if xref is ty.xref and params is ty.params:
+            return ty
+        return replace(ty, xref=xref, params=params)
+
+    def optional_type(self, ty: Type | None) -> Type | None:
+        return ty and self.type(ty)
+
+    def variable(self, var: Variable) -> Variable:
+        if (ty := self.optional_type(var.type)) is var.type:
+            return var
+        return replace(var, type=ty)
+
+    def parameter(self, param: Parameter) -> Parameter:
+        if (ty := self.optional_type(param.type)) is param.type:
+            return param
+        return replace(param, type=ty)
+
+    def function(self, func: Function) -> Function:
+        params = _each(func.params, self.parameter)
+        returns = self.optional_type(func.returns)
+        if params is func.params and returns is func.returns:
+            return func
+        return replace(func, params=params, returns=returns)
+
+    def cls(self, cls: Class) -> Class:
+        methods = _each(cls.methods, self.function)
+        class_variables = _each(cls.class_variables, self.variable)
+        instance_variables = _each(cls.instance_variables, self.variable)
+        inner_classes = _each(cls.inner_classes, self.cls)
+        if (
+            methods is cls.methods
+            and class_variables is cls.class_variables
+            and instance_variables is cls.instance_variables
+            and inner_classes is cls.inner_classes
+        ):
+            return cls
+        return replace(
+            cls,
+            methods=methods,
+            class_variables=class_variables,
+            instance_variables=instance_variables,
+            inner_classes=inner_classes,
+        )
+
+    def export(self, export: Export) -> Export:
+        # Like when parsing, exports are only looked up as they are
+        project = self.symbols.get(export.xref.fqname)
+        if (xref := self.xref(export.xref, project)) is export.xref:
+            return export
+        return replace(export, xref=xref)
+
+    def module(self, mod: Module) -> Module:
+        functions = _each(mod.functions, self.function)
+        variables = _each(mod.variables, self.variable)
+        classes = _each(mod.classes, self.cls)
+        exports = _each(mod.exports, self.export)
+        if (
+            functions is mod.functions
+            and variables is mod.variables
+            and classes is mod.classes
+            and exports is mod.exports
+        ):
+            return mod
+        return replace(
+            mod,
+            functions=functions,
+            variables=variables,
+            classes=classes,
+            exports=exports,
+        )
+
+    def project(self, project: Project) -> Project:
+        self._own = set(project_symbols(project))
+        if (modules := _each(project.modules, self.module)) is project.modules:
+            return project
+        return replace(project, modules=modules)
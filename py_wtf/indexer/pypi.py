@@ -5,7 +5,8 @@ import logging
 import multiprocessing
 import os
 from concurrent.futures import ProcessPoolExecutor
-from dataclasses import replace
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
 from functools import partial
 from pathlib import Path
@@ -19,54 +20,35 @@ import httpx
 import stamina
 
 from keke import ktrace
-from networkx import DiGraph, find_cycle, NetworkXNoCycle
 from packaging.requirements import Requirement
+from packaging.version import InvalidVersion, Version
 from rich.progress import Progress, TaskID
 
+from py_wtf.indexer.depgraph import DependencyGraph
 from py_wtf.indexer.documentation import convert_to_myst
+from py_wtf.indexer.http import make_client
+from py_wtf.indexer.link import link
+from py_wtf.indexer.throttle import AdaptiveLimiter
 
 from py_wtf.logging import setup_logging
 
 from py_wtf.repository import ProjectRepository
+from py_wtf.repository.failures import KnownFailure
 
 from py_wtf.types import (
     Documentation,
-    FQName,
     Project,
     ProjectDescription,
     ProjectMetadata,
     ProjectName,
     SymbolTable,
+    VersionEntry,
 )
 from .file import index_dir
 
 logger = logging.getLogger(__name__)
 
 
-def _build_symbol_table(projects: Iterable[Project]) -> SymbolTable:
-    ret = SymbolTable()
-    for project in projects:
-        pname = project.name
-        for mod in project.modules:
-            ret[FQName(mod.name)] = pname
-            for exp in mod.exports:
-                ret[exp.name] = pname
-            for func in mod.functions:
-                ret[FQName(func.name)] = pname
-            for var in mod.variables:
-                ret[FQName(var.name)] = pname
-            for cls in mod.classes:
-                ret[FQName(cls.name)] = pname
-                for func in cls.methods:
-                    ret[FQName(func.name)] = pname
-                for var in cls.class_variables:
-                    ret[FQName(var.name)] = pname
-                for var in cls.instance_variables:
-                    ret[FQName(var.name)] = pname
-                # TODO: inner classes and more
-    return ret
-
-
 executor = ProcessPoolExecutor(
     initializer=setup_logging,
     initargs=(
@@ -76,6 +58,9 @@ executor = ProcessPoolExecutor(
     mp_context=multiprocessing.get_context("spawn"),
 )
 PROJECT_BLOCKLIST = frozenset({})
+# Projects downloaded (and not parsed yet) at a time, so unpacked releases
+# don't pile up on disk
+MAX_UNPACKED = 20
 
 
 def blocklisted_project_factory(project_name: ProjectName) -> Project:
@@ -97,18 +82,140 @@ def blocklisted_project_factory(project_name: ProjectName) -> Project:
     )
 
 
-depgraph: DiGraph[ProjectName] = DiGraph()
+@dataclass(slots=True, frozen=True)
+class Release:
+    """The latest release of a project on PyPI, which needs to be indexed."""
+
+    metadata: ProjectMetadata
+    description: Documentation
+    artifact: Artifact
 
 
-def _check_for_cycles(a: ProjectName, b: ProjectName) -> bool:
-    global depgraph
-    depgraph.add_edge(a, b)
+async def fetch_release(
+    project_name: ProjectName,
+    repo: ProjectRepository,
+    client: httpx.AsyncClient,
+    skip_existing: bool = False,
+) -> Project | Release:
+    """
+    Find out what indexing ``project_name`` takes: either it's done already,
+    because py.wtf has its latest version or there's nothing to index, or its
+    release needs to be downloaded and indexed.
+    """
+
+    # Without a version manifest there's no telling whether py.wtf's copy
+    # is usable, so fetch it alongside the PyPI metadata
+    existing_project_fut = None
     try:
-        find_cycle(depgraph, source=a, orientation="original")  # type: ignore
-    except NetworkXNoCycle:
-        return False
-    depgraph.remove_edge(a, b)
-    return True
+        async with asyncio.TaskGroup() as tasks:
+            if not skip_existing and repo.remote_versions is None:
+                existing_project_fut = tasks.create_task(
+                    repo.fetch_from_remote(client, project_name)
+                )
+            pypi_metadata_fut = tasks.create_task(
+                fetch_pypi_metadata(client, project_name)
+            )
+    except* ProjectNotFound:
+        repo.record_failure(project_name, "not-found")
+        raise
+
+    pypi_metadata, doc, artifact = await pypi_metadata_fut
+    existing_project = None
+    if existing_project_fut is not None:
+        existing_project = await existing_project_fut
+    elif not skip_existing and repo.remote_versions is not None:
+        known = repo.remote_versions.get(project_name)
+        if known and (not artifact or known.version == pypi_metadata.version):
+            existing_project = await repo.fetch_from_remote(client, project_name)
+        elif known:
+            logger.debug(
+                f"Version mismatch for {project_name}: py.wtf has {known.version}, pypi has {pypi_metadata.version}"
+            )
+
+    if existing_project:
+        if not artifact or existing_project.metadata.version == pypi_metadata.version:
+            logger.debug(f"Using cached version of {project_name} from py.wtf")
+            return existing_project
+
+        logger.debug(
+            f"Version mismatch for {project_name}: py.wtf has {existing_project.metadata.version}, pypi has {pypi_metadata.version}"
+        )
+
+    try:
+        description = convert_to_myst(doc)
+    except Exception as e:
+        msg = f"Error while parsing description for {project_name}"
+        logger.exception(msg)
+        description = Documentation("\n".join([msg, str(e)]))
+
+    if not artifact:
+        error = f"Couldn't find suitable artifact for {project_name}=={pypi_metadata.version}"
+        logger.warning(error)
+        # Not a failure: the stub is saved, and reused until there's a new
+        # version
+        return Project(
+            project_name,
+            replace(pypi_metadata, summary=error),
+            [description],
+            [],
+        )
+
+    return Release(pypi_metadata, description, artifact)
+
+
+async def break_cycles(
+    project_name: ProjectName,
+    repo: ProjectRepository,
+    depgraph: DependencyGraph,
+    deps: Iterable[ProjectName],
+) -> tuple[list[ProjectName], list[ProjectName]]:
+    """
+    Split ``deps`` into the ones ``project_name`` has to wait for, and the
+    ones that would make a dependency cycle but are indexed already, whose
+    old version is used instead. Other deps that would make a cycle are
+    left out.
+    """
+
+    waits: list[ProjectName] = []
+    old: list[ProjectName] = []
+    for dep in deps:
+        if depgraph.add_edge(project_name, dep):
+            waits.append(dep)
+        elif await repo.contains(dep):
+            logger.warning(f"Dep cycle! Indexing {project_name} with old {dep}")
+            old.append(dep)
+        else:
+            logger.warning(f"Dep cycle! Indexing {project_name} without {dep}")
+    return waits, old
+
+
+async def index_release(
+    project_name: ProjectName,
+    release: Release,
+    src_dir: Path,
+    symbols: SymbolTable,
+) -> Project:
+    documentation: list[Documentation] = []
+    total_size = sum(f.stat().st_size for f in src_dir.rglob("*") if f.is_file())
+    if total_size > 50_000_000:  # 50 MB
+        msg = f"Project {project_name} is too large (>50MB), contents not indexed"
+        logger.warning(msg)
+        modules = []
+        documentation.append(Documentation(msg))
+    else:
+        logger.info(f"Starting indexing of {project_name}")
+        modules = [
+            mod async for mod in index_dir(project_name, src_dir, symbols, executor)
+        ]
+    documentation.append(release.description)
+
+    logger.info(f"Done indexing of {project_name}")
+    return Project(
+        project_name,
+        metadata=release.metadata,
+        modules=modules,
+        documentation=documentation,
+    )
 
 
 @ktrace("project_name")
@@ -117,136 +224,157 @@ async def index_project(
     repo: ProjectRepository,
     progress: Progress | None = None,
     skip_existing: bool = False,
+    client: httpx.AsyncClient | None = None,
+    depgraph: DependencyGraph | None = None,
+    two_phase: bool = False,
+    unpacking: asyncio.Semaphore | None = None,
 ) -> AsyncIterable[Project]:
+    """
+    Index ``project_name`` and the dependencies it needs. With ``two_phase``,
+    its sources are parsed while its dependencies are indexed, and linked to
+    their symbols afterwards, rather than parsed once they're all done.
+
+    At most ``MAX_UNPACKED`` projects (sharing ``unpacking``) are downloaded
+    and parsed at a time. Nothing waits for its dependencies while it holds
+    one of those slots, so dependencies can't starve out their dependents.
+    """
+
+    if unpacking is None:
+        unpacking = asyncio.BoundedSemaphore(MAX_UNPACKED)
+    if client is None:
+        # Dependencies share the client, so they're within the same limits
+        async with make_client(limiter=AdaptiveLimiter()) as client:
+            async for project in index_project(
+                project_name,
+                repo,
+                progress,
+                skip_existing,
+                client,
+                depgraph,
+                two_phase,
+                unpacking,
+            ):
+                yield project
+        return
     if project_name in PROJECT_BLOCKLIST:
         yield blocklisted_project_factory(project_name)
         return
     task_id = TaskID(0)
     if progress:
         task_id = progress.add_task(project_name, action="Fetching", total=3)
-    deps: list[Project] = []
-
-    with TemporaryDirectory() as tmpdir:
-        async with sem, httpx.AsyncClient() as client:
-            # Fetch both existing project and PyPI metadata concurrently
-            async with asyncio.TaskGroup() as tasks:
-                if skip_existing:
-                    existing_project_fut = asyncio.Future()
-                    existing_project_fut.set_result(None)
-                else:
-                    existing_project_fut = tasks.create_task(
-                        repo.fetch_from_remote(client, project_name)
-                    )
-                pypi_metadata_fut = tasks.create_task(
-                    fetch_pypi_metadata(client, project_name)
-                )
 
-            # Wait for both to complete
-            existing_project = await existing_project_fut
-            pypi_metadata, doc, artifact = await pypi_metadata_fut
-
-            if existing_project:
-                if (
-                    not artifact
-                    or existing_project.metadata.version == pypi_metadata.version
-                ):
-                    logger.debug(f"Using cached version of {project_name} from py.wtf")
-                    if progress:
-                        progress.update(task_id, visible=False)
-                    yield existing_project
-                    return
+    release = await fetch_release(project_name, repo, client, skip_existing)
+    if isinstance(release, Project):
+        if progress:
+            progress.update(task_id, visible=False)
+        yield release
+        return
 
-                logger.debug(
-                    f"Version mismatch for {project_name}: py.wtf has {existing_project.metadata.version}, pypi has {pypi_metadata.version}"
-                )
+    async with AsyncExitStack() as unpacked:
 
+        async def unpack() -> Path | None:
+            # Holds a slot until ``unpacked`` is closed
+            await unpacked.enter_async_context(unpacking)
+            tmpdir = unpacked.enter_context(TemporaryDirectory())
             try:
-                description = convert_to_myst(doc)
-            except Exception as e:
-                msg = f"Error while parsing description for {project_name}"
-                logger.exception(msg)
-                description = Documentation("\n".join([msg, str(e)]))
-
-            if not artifact:
-                error = f"Couldn't find suitable artifact for {project_name}=={pypi_metadata.version}"
-                logger.warning(error)
-                yield Project(
-                    project_name,
-                    replace(pypi_metadata, summary=error),
-                    [description],
-                    [],
+                return await download(
+                    client, project_name, Path(tmpdir), release.artifact
                 )
-                return
-
-            try:
-                src_dir = await download(client, project_name, Path(tmpdir), artifact)
             except Exception as err:
                 logger.error(
-                    f"Unable to download project {project_name}, skipping", exc_info=err
+                    f"Unable to download project {project_name}, skipping",
+                    exc_info=err,
                 )
+                repo.record_failure(project_name, "download", release.metadata.version)
+                return None
+
+        parsing = None
+        if two_phase:
+            if (src_dir := await unpack()) is None:
                 return
+
+            async def parse(src_dir: Path) -> Project:
+                try:
+                    return await index_release(
+                        project_name, release, src_dir, SymbolTable()
+                    )
+                finally:
+                    # The slot is free once the sources aren't needed anymore
+                    await unpacked.aclose()
+
+            parsing = asyncio.create_task(parse(src_dir))
+
         if progress:
             progress.update(
                 task_id, action="Gathering deps for", visible=True, advance=1
             )
-        dep_project_names = [ProjectName(dep) for dep in pypi_metadata.dependencies]
+        dep_project_names = [ProjectName(dep) for dep in release.metadata.dependencies]
         logger.debug(
             f"Found {project_name}'s dependencies ({len(dep_project_names)}): {dep_project_names}"
         )
-        for dep in list(dep_project_names):
-            if _check_for_cycles(project_name, dep):
-                if dep in repo:
-                    logger.warning(f"Dep cycle! Indexing {project_name} with old {dep}")
-                else:
-                    logger.warning(f"Dep cycle! Indexing {project_name} without {dep}")
-                    dep_project_names.remove(dep)
-
-        dep_projects = await asyncio.gather(
-            *[
-                repo.get(name, partial(index_project, repo=repo, progress=progress))
-                for name in dep_project_names
-            ],
-            return_exceptions=True,
-        )
-
-        for i, proj in enumerate(dep_projects):
-            if isinstance(proj, BaseException):
-                logger.error(f"Error in {dep_project_names[i]}", exc_info=proj)
-                continue
-            deps.append(proj)
+        if depgraph is None:
+            depgraph = DependencyGraph()
 
-        symbols = _build_symbol_table(deps)
+        try:
+            waits, old = await break_cycles(
+                project_name, repo, depgraph, dep_project_names
+            )
+            dep_project_names = waits + old
+            # Dependencies only need to be in the symbol index, there's no need to
+            # load them
+            results = await asyncio.gather(
+                *[
+                    repo.ensure(
+                        name,
+                        partial(
+                            index_project,
+                            repo=repo,
+                            progress=progress,
+                            client=client,
+                            depgraph=depgraph,
+                            two_phase=two_phase,
+                            unpacking=unpacking,
+                        ),
+                    )
+                    for name in dep_project_names
+                ],
+                return_exceptions=True,
+            )
 
-        if progress:
-            progress.update(task_id, action="Indexing", visible=True, advance=1)
-
-        documentation: list[Documentation] = []
-        total_size = sum(f.stat().st_size for f in src_dir.rglob("*") if f.is_file())
-        if total_size > 50_000_000:  # 50 MB
-            msg = f"Project {project_name} is too large (>50MB), contents not indexed"
-            logger.warning(msg)
-            modules = []
-            documentation.append(Documentation(msg))
-        else:
-            logger.info(f"Starting indexing of {project_name}")
-            modules = [
-                mod async for mod in index_dir(project_name, src_dir, symbols, executor)
-            ]
+            deps: list[ProjectName] = []
+            for name, result in zip(dep_project_names, results):
+                if isinstance(result, KnownFailure):
+                    logger.debug(str(result))
+                    continue
+                if isinstance(result, BaseException):
+                    logger.error(f"Error in {name}", exc_info=result)
+                    continue
+                deps.append(name)
+
+            symbols = repo.symbol_table(deps)
+
+            if progress:
+                progress.update(task_id, action="Indexing", visible=True, advance=1)
+
+            if parsing is not None:
+                proj = await repo.run_io(link, await parsing, symbols)
+            else:
+                # Only now, so the sources aren't on disk while waiting
+                if (src_dir := await unpack()) is None:
+                    return
+                proj = await index_release(project_name, release, src_dir, symbols)
+        finally:
+            if parsing is not None:
+                # In case something failed before the sources were needed,
+                # they're about to be deleted
+                parsing.cancel()
+                await asyncio.gather(parsing, return_exceptions=True)
 
         if progress:
             progress.advance(task_id)
 
-    documentation.append(description)
-
-    proj = Project(
-        project_name,
-        metadata=pypi_metadata,
-        modules=modules,
-        documentation=documentation,
-    )
     if progress:
         progress.update(task_id, visible=False)
-    logger.info(f"Done indexing of {project_name}")
     yield proj
 
 
@@ -296,6 +424,21 @@ def parse_deps(maybe_deps: None | Sequence[str]) -> list[str]:
     )
 
 
+def is_unchanged(known: VersionEntry | None, uploaded: Iterable[str]) -> bool:
+    """
+    Whether the version py.wtf indexed is still the latest after ``uploaded``
+    were released.
+    """
+
+    if known is None:
+        return False
+    try:
+        indexed = Version(known.version)
+        return all(Version(version) <= indexed for version in uploaded)
+    except InvalidVersion:
+        return all(version == known.version for version in uploaded)
+
+
 def parse_upload_time(time: str) -> int:
     try:
         dt = datetime.strptime(time, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
@@ -331,7 +474,8 @@ def pick_artifact(artifacts: list[Artifact]) -> Artifact | None:
     return candidate
 
 
-sem = asyncio.BoundedSemaphore(value=20)
+class ProjectNotFound(ValueError):
+    pass
 
 
 async def fetch_pypi_metadata(
@@ -347,6 +491,8 @@ async def fetch_pypi_metadata(
                 proj_data = resp.json()
             except httpx.HTTPStatusError as e:
                 error = f"Unable to find project {project_name} on pypi, got HTTP {e.response.status_code}"
+                if e.response.status_code == 404:
+                    raise ProjectNotFound(error) from e
                 raise ValueError(error) from e
 
     pypi_info = proj_data["info"]
@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Awaitable, Callable, Iterable, Literal
+
+import httpx
+from rich.progress import Progress, TaskID
+
+from py_wtf.indexer.depgraph import DependencyGraph
+from py_wtf.indexer.link import link
+from py_wtf.indexer.pypi import (
+    blocklisted_project_factory,
+    break_cycles,
+    download,
+    fetch_release,
+    index_release,
+    MAX_UNPACKED,
+    PROJECT_BLOCKLIST,
+    Release,
+)
+from py_wtf.repository import ProjectRepository
+from py_wtf.repository.failures import KnownFailure
+from py_wtf.types import Project, ProjectName, SymbolTable
+
+logger = logging.getLogger(__name__)
+
+Stage = Literal["fetch", "download", "parse", "link", "save"]
+STAGES: tuple[Stage, ...] = ("fetch", "download", "parse", "link", "save")
+_ACTIONS: dict[Stage, str] = {
+    "fetch": "Resolving",
+    "download": "Downloading",
+    "parse": "Parsing",
+    "link": "Linking",
+    "save": "Saving",
+}
+
+
+@dataclass(slots=True, frozen=True)
+class StageLimits:
+    """How many projects each stage works on at a time."""
+
+    fetch: int = 20
+    download: int = MAX_UNPACKED
+    parse: int = os.process_cpu_count() or 1
+    link: int = 2
+    save: int = 4
+
+
+@dataclass(slots=True)
+class _Job:
+    name: ProjectName
+    # A release to index, until it's parsed into a project
+    result: Project | Release
+    # What the project's symbols are looked up in
+    deps: list[ProjectName] = field(default_factory=list)
+    tmpdir: TemporaryDirectory[str] | None = None
+    src_dir: Path | None = None
+    # Parsed without the symbols of its dependencies, which it needs linking to
+    unlinked: bool = False
+
+    def cleanup(self) -> None:
+        if self.tmpdir is not None:
+            self.tmpdir.cleanup()
+            self.tmpdir = None
+
+
+@dataclass(slots=True)
+class Scheduler:
+    """
+    Indexes projects and their dependencies in two phases. First the whole
+    dependency graph is resolved from PyPI metadata, then projects are
+    downloaded, parsed and saved in topological order: a project only starts
+    downloading once every dependency it waits for is saved. Every stage has
+    its own queue and concurrency limit.
+
+    With ``two_phase``, projects are downloaded and parsed without waiting
+    for their dependencies, and only linking their xrefs to the symbols of
+    their dependencies waits for those to be saved.
+
+    Either way, only as many projects as the download and parse stages work
+    on at a time are between starting to download and being saved, so
+    unpacked releases and parsed projects don't pile up.
+    """
+
+    repo: ProjectRepository
+    client: httpx.AsyncClient
+    limits: StageLimits = StageLimits()
+    progress: Progress | None = None
+    # Log the depth of every queue this often, in seconds
+    report_every: float | None = 60
+    two_phase: bool = False
+
+    # Edges go from projects to the dependencies they wait for
+    graph: DependencyGraph = field(init=False)
+    errors: dict[ProjectName, BaseException] = field(init=False)
+    _queues: dict[Stage, asyncio.Queue[ProjectName]] = field(init=False)
+    _tasks: dict[Stage, TaskID] = field(init=False)
+    _totals: dict[Stage, int] = field(init=False)
+    _seen: set[ProjectName] = field(init=False)
+    _jobs: dict[ProjectName, _Job] = field(init=False)
+    # Dependencies of pending projects that aren't saved yet
+    _blocked: dict[ProjectName, set[ProjectName]] = field(init=False)
+    _pending: set[ProjectName] = field(init=False)
+    # Releases waiting to start downloading, and ones that did and aren't saved
+    _backlog: deque[ProjectName] = field(init=False)
+    _admitted: set[ProjectName] = field(init=False)
+    _done: asyncio.Event = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.graph = DependencyGraph()
+        self.errors = {}
+        self._queues = {stage: asyncio.Queue() for stage in STAGES}
+        self._tasks = {}
+        self._totals = dict.fromkeys(STAGES, 0)
+        if self.progress:
+            self._tasks = {
+                stage: self.progress.add_task(
+                    "projects", action=_ACTIONS[stage], total=0
+                )
+                for stage in STAGES
+            }
+        self._seen = set()
+        self._jobs = {}
+        self._blocked = {}
+        self._pending = set()
+        self._backlog = deque()
+        self._admitted = set()
+        self._done = asyncio.Event()
+
+    def queue_depths(self) -> dict[str, int]:
+        """
+        Projects waiting in each stage's queue, and ones waiting for their
+        dependencies.
+        """
+
+        depths: dict[str, int] = {
+            stage: queue.qsize() for stage, queue in self._queues.items()
+        }
+        depths["blocked"] = sum(1 for deps in self._blocked.values() if deps)
+        return depths
+
+    def log_queue_depths(self) -> None:
+        depths = ", ".join(f"{name}: {n}" for name, n in self.queue_depths().items())
+        logger.info(f"Queued projects: {depths}")
+
+    async def run(
+        self, names: Iterable[ProjectName]
+    ) -> dict[ProjectName, BaseException]:
+        """
+        Index ``names`` and their dependencies, unless they're indexed
+        already. Returns why the projects that failed did.
+        """
+
+        reporter = None
+        if self.report_every is not None:
+            reporter = asyncio.create_task(self._report(self.report_every))
+        for name in names:
+            self._resolve(name)
+        try:
+            await self._work({"fetch": self._fetch}, self._queues["fetch"].join)
+            self._schedule()
+            await self._work(
+                {
+                    "download": self._download,
+                    "parse": self._parse,
+                    "link": self._link,
+                    "save": self._save,
+                },
+                self._done.wait,
+            )
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            for job in self._jobs.values():
+                job.cleanup()
+        return self.errors
+
+    async def _report(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.log_queue_depths()
+
+    async def _work(
+        self,
+        handlers: dict[Stage, Callable[[ProjectName], Awaitable[None]]],
+        until: Callable[[], Awaitable[object]],
+    ) -> None:
+        workers = [
+            asyncio.create_task(self._worker(stage, handler))
+            for stage, handler in handlers.items()
+            for _ in range(getattr(self.limits, stage))
+        ]
+        try:
+            await until()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def _worker(
+        self, stage: Stage, handler: Callable[[ProjectName], Awaitable[None]]
+    ) -> None:
+        queue = self._queues[stage]
+        while True:
+            name = await queue.get()
+            try:
+                await handler(name)
+            except Exception as e:
+                self._fail(name, e)
+            finally:
+                queue.task_done()
+                if self.progress:
+                    self.progress.advance(self._tasks[stage])
+
+    def _put(self, stage: Stage, name: ProjectName) -> None:
+        self._queues[stage].put_nowait(name)
+        self._totals[stage] += 1
+        if self.progress:
+            self.progress.update(self._tasks[stage], total=self._totals[stage])
+
+    def _resolve(self, name: ProjectName) -> None:
+        if name not in self._seen:
+            self._seen.add(name)
+            self._put("fetch", name)
+
+    async def _fetch(self, name: ProjectName) -> None:
+        if await self.repo.indexed(name):
+            return
+        if (failure := self.repo.failure(name)) is not None:
+            raise KnownFailure(name, failure)
+        if name in PROJECT_BLOCKLIST:
+            result: Project | Release = blocklisted_project_factory(name)
+        else:
+            result = await fetch_release(name, self.repo, self.client)
+        job = self._jobs[name] = _Job(name, result)
+        self.graph.add_node(name)
+        if isinstance(result, Project):
+            return
+        deps = [ProjectName(dep) for dep in result.metadata.dependencies]
+        waits, old = await break_cycles(name, self.repo, self.graph, deps)
+        job.deps = waits + old
+        for dep in job.deps:
+            self._resolve(dep)
+
+    def _schedule(self) -> None:
+        self._pending = set(self._jobs)
+        self._blocked = {
+            name: {dep for dep in self.graph.dependencies(name) if dep in self._pending}
+            for name in self._pending
+        }
+        # Dependencies come first, so each wave only waits for earlier ones
+        waves = self.graph.waves(self._pending)
+        logger.info(
+            f"Indexing {len(self._pending)} projects in {len(waves)} waves, "
+            f"{len(self.errors)} failed to resolve"
+        )
+        if not self._pending:
+            self._done.set()
+        for wave in waves:
+            for name in wave:
+                if self.two_phase and isinstance(self._jobs[name].result, Release):
+                    self._backlog.append(name)
+                elif not self._blocked[name]:
+                    self._ready(name)
+        self._admit()
+
+    def _admit(self) -> None:
+        # In the order they were ready, so two phase jobs' dependencies (in
+        # earlier waves) are never stuck behind them
+        window = self.limits.download + self.limits.parse
+        while self._backlog and len(self._admitted) < window:
+            name = self._backlog.popleft()
+            self._admitted.add(name)
+            self._put("download", name)
+
+    def _ready(self, name: ProjectName) -> None:
+        # Every dependency name waits for is saved
+        job = self._jobs[name]
+        if isinstance(job.result, Release):
+            # Two phase jobs are on their way already, and link once parsed
+            if not self.two_phase:
+                self._backlog.append(name)
+                self._admit()
+        elif job.unlinked:
+            self._put("link", name)
+        else:
+            self._put("save", name)
+
+    def _symbols(self, job: _Job) -> SymbolTable:
+        return self.repo.symbol_table(dep for dep in job.deps if dep not in self.errors)
+
+    async def _download(self, name: ProjectName) -> None:
+        job = self._jobs[name]
+        assert isinstance(job.result, Release)
+        job.tmpdir = TemporaryDirectory()
+        try:
+            job.src_dir = await download(
+                self.client, name, Path(job.tmpdir.name), job.result.artifact
+            )
+        except Exception:
+            self.repo.record_failure(name, "download", job.result.metadata.version)
+            raise
+        self._put("parse", name)
+
+    async def _parse(self, name: ProjectName) -> None:
+        job = self._jobs[name]
+        assert isinstance(job.result, Release) and job.src_dir is not None
+        symbols = SymbolTable() if self.two_phase else self._symbols(job)
+        try:
+            job.result = await index_release(name, job.result, job.src_dir, symbols)
+        finally:
+            job.cleanup()
+        job.unlinked = self.two_phase
+        if not self._blocked.get(name):
+            self._ready(name)
+
+    async def _link(self, name: ProjectName) -> None:
+        job = self._jobs[name]
+        assert isinstance(job.result, Project)
+        job.result = await self.repo.run_io(link, job.result, self._symbols(job))
+        job.unlinked = False
+        self._put("save", name)
+
+    async def _save(self, name: ProjectName) -> None:
+        job = self._jobs[name]
+        assert isinstance(job.result, Project)
+        await self.repo.save(job.result)
+        self._finish(name)
+
+    def _fail(self, name: ProjectName, error: BaseException) -> None:
+        if isinstance(error, KnownFailure):
+            logger.debug(str(error))
+        else:
+            logger.error(f"Error in {name}", exc_info=error)
+        self.errors[name] = error
+        if (job := self._jobs.pop(name, None)) is not None:
+            job.cleanup()
+        if name in self._pending:
+            self._finish(name)
+        else:
+            self._release(name)
+
+    def _finish(self, name: ProjectName) -> None:
+        self._pending.discard(name)
+        self._blocked.pop(name, None)
+        # Let go of the project, the repository has it now
+        self._jobs.pop(name, None)
+        self._release(name)
+        for dependent in self.graph.dependents(name):
+            blocked = self._blocked.get(dependent)
+            if blocked is None or name not in blocked:
+                continue
+            blocked.remove(name)
+            if not blocked and dependent in self._pending:
+                self._ready(dependent)
+        if not self._pending:
+            self._done.set()
+
+    def _release(self, name: ProjectName) -> None:
+        if name in self._admitted:
+            self._admitted.remove(name)
+            self._admit()
@@ -0,0 +1,288 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from itertools import count
+from time import monotonic, time
+from typing import AsyncIterator, Awaitable, Callable
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean the host wants fewer requests, which are retried
+THROTTLED = frozenset({429, 503})
+_IDEMPOTENT = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+@dataclass(slots=True, frozen=True)
+class ThrottleConfig:
+    # Concurrent requests to each host start at initial_limit and are kept
+    # between min_limit and max_limit
+    initial_limit: int = 8
+    min_limit: int = 1
+    max_limit: int = 64
+    # Requests per second to each host, and how many can go out at once after
+    # a quiet period. None doesn't pace requests.
+    rate: float | None = 50.0
+    burst: int = 20
+    # Responses this many times slower than the fastest ones seen recently
+    # mean the host is getting congested
+    latency_tolerance: float = 2.0
+    # Throttled requests are retried this many times, after waiting for as
+    # long as their Retry-After says, or backoff seconds doubling each time
+    max_retries: int = 5
+    backoff: float = 1.0
+    max_retry_after: float = 120.0
+
+
+@dataclass(slots=True, frozen=True)
+class HostLimits:
+    limit: int
+    in_flight: int
+    rate: float | None
+    # Seconds until requests to the host resume, after it asked to wait
+    paused_for: float
+    # Moving average of response times, in seconds
+    latency: float | None
+    requests: int
+    throttled: int
+    errors: int
+
+
+@dataclass(slots=True)
+class TokenBucket:
+    rate: float
+    burst: int
+
+    _tokens: float = field(init=False)
+    _updated: float = field(init=False)
+
+    def __post_init__(self) -> None:
+        self._tokens = self.burst
+        self._updated = monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass(slots=True)
+class HostLimiter:
+    """
+    Additive increase, multiplicative decrease of the concurrent requests to
+    a host. The limit grows by about one for every limit's worth of fast
+    responses, and shrinks when responses slow down, fail or are throttled,
+    at most once per response time so one burst only counts once.
+    """
+
+    config: ThrottleConfig
+
+    limit: float = field(init=False)
+    in_flight: int = field(init=False, default=0)
+    paused_until: float = field(init=False, default=0.0)
+    latency: float | None = field(init=False, default=None)
+    requests: int = field(init=False, default=0)
+    throttled: int = field(init=False, default=0)
+    errors: int = field(init=False, default=0)
+    _baseline: float | None = field(init=False, default=None)
+    _decreased_at: float = field(init=False, default=0.0)
+    _bucket: TokenBucket | None = field(init=False)
+    _slots: asyncio.Condition = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.limit = self.config.initial_limit
+        self._bucket = None
+        if self.config.rate is not None:
+            self._bucket = TokenBucket(self.config.rate, self.config.burst)
+        self._slots = asyncio.Condition()
+
+    def snapshot(self) -> HostLimits:
+        return HostLimits(
+            limit=int(self.limit),
+            in_flight=self.in_flight,
+            rate=self.config.rate,
+            paused_for=max(0.0, self.paused_until - monotonic()),
+            latency=self.latency,
+            requests=self.requests,
+            throttled=self.throttled,
+            errors=self.errors,
+        )
+
+    async def acquire(self) -> None:
+        async with self._slots:
+            await self._slots.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            while (delay := self.paused_until - monotonic()) > 0:
+                await asyncio.sleep(delay)
+            if self._bucket is not None:
+                await self._bucket.acquire()
+        except asyncio.CancelledError:
+            await self.release()
+            raise
+        self.requests += 1
+
+    async def release(self) -> None:
+        async with self._slots:
+            self.in_flight -= 1
+            self._slots.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, monotonic() + seconds)
+
+    def _decrease(self, factor: float, latency: float) -> None:
+        now = monotonic()
+        if now - self._decreased_at < latency:
+            return
+        self._decreased_at = now
+        self.limit = max(self.config.min_limit, self.limit * factor)
+
+    def responded(self, status_code: int, latency: float) -> None:
+        self.latency = (
+            latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        )
+        if status_code in THROTTLED:
+            self.throttled += 1
+            self._decrease(0.5, latency)
+            return
+        if status_code >= 500:
+            self.errors += 1
+            self._decrease(0.75, latency)
+            return
+        # The fastest recent response, drifting up slowly so that one lucky
+        # response doesn't make every other one look slow forever
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        else:
+            self._baseline += (latency - self._baseline) * 0.01
+        if latency > self._baseline * self.config.latency_tolerance:
+            self._decrease(0.9, latency)
+        else:
+            self.limit = min(self.config.max_limit, self.limit + 1 / self.limit)
+
+    def failed(self, latency: float) -> None:
+        self.errors += 1
+        self._decrease(0.75, latency)
+
+
+def retry_after(
+    response: httpx.Response, config: ThrottleConfig, attempt: int
+) -> float:
+    """How long ``response`` asks to wait, or how long to back off without it."""
+
+    delay = config.backoff * 2**attempt
+    if (value := response.headers.get("retry-after")) is not None:
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time()
+            except (TypeError, ValueError):
+                pass
+    return min(max(delay, 0.0), config.max_retry_after)
+
+
+@dataclass(slots=True)
+class AdaptiveLimiter:
+    """Limits requests to every host separately, see HostLimiter."""
+
+    config: ThrottleConfig = ThrottleConfig()
+    hosts: dict[str, HostLimiter] = field(default_factory=dict)
+
+    def host(self, name: str) -> HostLimiter:
+        if (limiter := self.hosts.get(name)) is None:
+            limiter = self.hosts[name] = HostLimiter(self.config)
+        return limiter
+
+    def limits(self) -> dict[str, HostLimits]:
+        """The current limits of every host, for monitoring."""
+
+        return {name: host.snapshot() for name, host in sorted(self.hosts.items())}
+
+    def log(self) -> None:
+        for name, limits in self.limits().items():
+            logger.info(f"{name}: {limits}")
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    # Holds on to the request's slot until the body is read, so streamed
+    # downloads count against the host's limit too
+    def __init__(
+        self, stream: httpx.AsyncByteStream, release: Callable[[], Awaitable[None]]
+    ) -> None:
+        self._stream = stream
+        self._release: Callable[[], Awaitable[None]] | None = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                release, self._release = self._release, None
+                await release()
+
+
+class ThrottledTransport(httpx.AsyncBaseTransport):
+    """
+    Sends requests through ``transport`` within ``limiter``'s limits, and
+    retries throttled ones once the host's Retry-After has passed.
+    """
+
+    def __init__(
+        self, transport: httpx.AsyncBaseTransport, limiter: AdaptiveLimiter
+    ) -> None:
+        self._transport = transport
+        self._limiter = limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = self._limiter.host(request.url.host)
+        config = self._limiter.config
+        for attempt in count():
+            await host.acquire()
+            start = monotonic()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except Exception:
+                host.failed(monotonic() - start)
+                await host.release()
+                raise
+            except BaseException:
+                # Cancelled, which says nothing about the host
+                await host.release()
+                raise
+            host.responded(response.status_code, monotonic() - start)
+            if (
+                response.status_code not in THROTTLED
+                or request.method not in _IDEMPOTENT
+                or attempt >= config.max_retries
+            ):
+                assert isinstance(response.stream, httpx.AsyncByteStream)
+                response.stream = _ReleasingStream(response.stream, host.release)
+                return response
+            delay = retry_after(response, config, attempt)
+            logger.debug(
+                f"{request.url.host} throttled {request.url} "
+                f"(HTTP {response.status_code}), retrying in {delay:.1f}s"
+            )
+            host.pause(delay)
+            try:
+                await response.aclose()
+            finally:
+                await host.release()
+        raise AssertionError("unreachable")
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
@@ -0,0 +1,1246 @@
+import asyncio
+import hashlib
+import heapq
+import logging
+import multiprocessing
+import os
+from asyncio import Future
+from collections import defaultdict, OrderedDict
+from concurrent.futures import as_completed, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from time import time
+from typing import (
+    AsyncIterable,
+    Callable,
+    Collection,
+    Generator,
+    IO,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Tuple,
+)
+
+import httpx
+import stamina
+
+from keke import ktrace
+from rich.progress import Progress
+
+from py_wtf.logging import setup_logging
+
+from py_wtf.repository.backend import StorageBackend
+from py_wtf.repository.compact import COMPACT_PREFIX, decode_project, encode_compact
+from py_wtf.repository.compression import (
+    compressing,
+    Compression,
+    decompress,
+    HashingWriter,
+    SUFFIXES,
+    Writer,
+)
+from py_wtf.repository.encoding import (
+    Converter,
+    converter,
+    ConverterBackend,
+    encode_project,
+    make_converter,
+)
+from py_wtf.repository.failures import FailureCache, FAILURES_FILENAME, KnownFailure
+from py_wtf.repository.http_cache import HTTPCache
+from py_wtf.repository.layout import (
+    FLAT,
+    Layout,
+    LAYOUT_FILENAME,
+    project_files,
+    SHARDED,
+    split_project_file,
+)
+from py_wtf.repository.names import NameIndex, NAMES_DIRECTORY, page_for
+from py_wtf.repository.search import (
+    SEARCH_DIRECTORY,
+    search_entries,
+    SearchEntry,
+    SearchIndex,
+)
+from py_wtf.repository.symbols import SymbolIndex, SYMBOLS_FILENAME
+from py_wtf.repository.usages import (
+    Usage,
+    usage_shards,
+    UsageIndex,
+    usages,
+    USAGES_DIRECTORY,
+)
+from py_wtf.types import (
+    Failure,
+    FailureReason,
+    FQName,
+    Index,
+    IndexAggregate,
+    IndexMetadata,
+    ManifestEntry,
+    Module,
+    ModuleEntry,
+    Project,
+    ProjectManifest,
+    ProjectMetadata,
+    ProjectName,
+    ProjectRecord,
+    SymbolTable,
+    VersionEntry,
+)
+
+logger = logging.getLogger(__name__)
+
+METADATA_FILENAME = ".metadata"
+AGGREGATE_FILENAME = ".aggregate"
+# Version and content hash of every indexed project
+VERSIONS_FILENAME = ".versions"
+# Content hashes of every published project file, and the ones that changed
+MANIFEST_FILENAME = ".manifest"
+CHANGED_FILENAME = ".changed"
+RECORD_SUFFIX = ".meta"
+# Projects written with split_modules have a manifest with this suffix, and
+# their modules in a directory of the same name next to it
+MODULES_SUFFIX = ".modules"
+PROJECT_SUFFIXES = frozenset(
+    f"{split}.json{suffix}"
+    for split in ["", MODULES_SUFFIX]
+    for suffix in ["", *SUFFIXES.values()]
+)
+
+
+# Projects whose records a hydration worker reads at a time
+HYDRATION_CHUNK_SIZE = 256
+
+
+def read_versions(directory: Path) -> dict[ProjectName, VersionEntry]:
+    return converter.loads(
+        (directory / VERSIONS_FILENAME).read_bytes(), dict[ProjectName, VersionEntry]
+    )
+
+
+def _project_suffix(compression: Compression | None) -> str:
+    if compression is None:
+        return ".json"
+    return f".json{SUFFIXES[compression]}"
+
+
+@contextmanager
+def _atomic_open(path: Path) -> Generator[IO[bytes]]:
+    """
+    Open a temporary file next to ``path`` that replaces it once everything has
+    been written. The temporary file is hidden so directory scans skip it.
+    """
+
+    tmp = NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.", delete=False)
+    try:
+        with tmp:
+            yield tmp
+        os.replace(tmp.name, path)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+
+
+# The repository hydration workers read records through
+_hydration_repo: "ProjectRepository | None" = None
+
+
+def _hydrated[T](
+    read: Callable[["ProjectRepository", list[ProjectName]], T],
+    keys: list[ProjectName],
+) -> T:
+    # Runs in a hydration worker, on the repository _init_hydration made
+    assert _hydration_repo is not None
+    return read(_hydration_repo, keys)
+
+
+def _init_hydration(
+    directory: Path,
+    compression: tuple[Compression, ...],
+    split_modules: bool,
+    converter_backend: ConverterBackend,
+    log_level: int,
+) -> None:
+    global _hydration_repo
+    setup_logging(log_level, True)
+    _hydration_repo = ProjectRepository(
+        directory,
+        compression=compression,
+        io_workers=1,
+        split_modules=split_modules,
+        converter=make_converter(converter_backend),
+    )
+
+
+class _ShardRows(NamedTuple):
+    # What a project has in the search and usage indexes, by shard
+    search: list[SearchEntry]
+    usages: dict[str, dict[FQName, set[Usage]]]
+
+
+@dataclass(slots=True, frozen=True)
+class _Persisted:
+    record: ProjectRecord
+    size: int
+    files: list[tuple[Path, ManifestEntry]]
+    removed: list[Path] = field(default_factory=list)
+    search_shards: frozenset[str] = frozenset()
+    usage_shards: frozenset[str] = frozenset()
+
+
+@dataclass(slots=True)
+class ProjectRepository:
+    directory: Path
+    # Budgets for keeping finished projects in memory. Projects over budget are
+    # evicted least recently used first and transparently reloaded from disk.
+    # Sizes are approximated by the length of the encoded project.
+    max_cached_projects: int | None = None
+    max_cached_bytes: int | None = None
+    # Where project files go. Defaults to what the directory's layout manifest
+    # says, reads fall back to the other layout.
+    layout: Layout | None = None
+    # Write project files only in these compressed formats instead of plain JSON
+    compression: tuple[Compression, ...] = ()
+    # Disk I/O and (de)serialization for get() run on this many threads. Saves
+    # are queued up to write_behind deep and written in the background, call
+    # flush() or aclose() to wait for them. 0 waits for every save.
+    io_workers: int = 4
+    write_behind: int = 0
+    # Write a manifest and a file per module instead of a single file for each
+    # project, so readers can load just the modules they need
+    split_modules: bool = False
+    # Write project files in the compact encoding, see encode_compact. Reads
+    # take either encoding.
+    compact: bool = False
+    # Revalidate projects fetched from py.wtf against copies cached here
+    http_cache: HTTPCache | None = None
+    # What py.wtf has, if known. Projects missing from here, or present with a
+    # different version aren't fetched from py.wtf.
+    remote_versions: dict[ProjectName, VersionEntry] | None = None
+    # Encodes and decodes the repository's files. Every backend reads and
+    # writes the same bytes, see make_converter.
+    converter: Converter = converter
+    # Keep projects here instead of in files. The directory then only gets
+    # the index metadata and the symbol index, use export() for the files.
+    backend: StorageBackend | None = None
+
+    _layout: Layout = field(init=False)
+    _cache: dict[ProjectName, Future[Project]] = field(init=False)
+    _records: dict[ProjectName, ProjectRecord] = field(init=False)
+    # Only finished projects that are persisted on disk are evictable, in-flight
+    # futures must stay in _cache so concurrent gets keep sharing them.
+    _evictable: OrderedDict[ProjectName, int] = field(init=False)
+    _evictable_bytes: int = field(init=False)
+    _manifest: dict[str, ManifestEntry] = field(init=False)
+    _changed: set[str] = field(init=False)
+    _search: SearchIndex = field(init=False)
+    # Search shards of the projects saved by this repository
+    _search_shards: dict[ProjectName, frozenset[str]] = field(init=False)
+    _usages: UsageIndex = field(init=False)
+    # Usage shards of the projects saved by this repository
+    _usage_shards: dict[ProjectName, frozenset[str]] = field(init=False)
+    _names: NameIndex = field(init=False)
+    _symbols: SymbolIndex = field(init=False)
+    _failures: FailureCache = field(init=False)
+    _executor: ThreadPoolExecutor = field(init=False)
+    _queue: asyncio.Queue[tuple[ProjectName, Project]] = field(init=False)
+    _writers: list[asyncio.Task[None]] = field(init=False)
+
+    def __post_init__(self) -> None:
+        if self.compact and self.split_modules:
+            raise ValueError("Compact projects can't be split into modules")
+        self._cache = defaultdict(
+            lambda: Future(loop=asyncio.get_event_loop_policy().get_event_loop())
+        )
+        self._records = {}
+        self._evictable = OrderedDict()
+        self._evictable_bytes = 0
+        self._manifest = self._read_manifest()
+        self._changed = set()
+        self._search = SearchIndex(self.directory / SEARCH_DIRECTORY)
+        self._search_shards = {}
+        self._usages = UsageIndex(self.directory / USAGES_DIRECTORY)
+        self._usage_shards = {}
+        self._names = NameIndex(self.directory / NAMES_DIRECTORY)
+        self._symbols = SymbolIndex(self.directory / SYMBOLS_FILENAME)
+        self._failures = FailureCache(self.directory / FAILURES_FILENAME)
+        self._executor = ThreadPoolExecutor(
+            self.io_workers, thread_name_prefix="repository-io"
+        )
+        self._queue = asyncio.Queue(self.write_behind)
+        self._writers = []
+        if self.layout is None:
+            self._layout = self._read_layout()
+        else:
+            self._write_layout(self.layout)
+
+    def _read_layout(self) -> Layout:
+        try:
+            return self.converter.loads(
+                (self.directory / LAYOUT_FILENAME).read_bytes(), Layout
+            )
+        except FileNotFoundError:
+            return FLAT
+
+    def _write_layout(self, layout: Layout) -> None:
+        self._layout = layout
+        manifest = self.directory / LAYOUT_FILENAME
+        if layout == FLAT:
+            manifest.unlink(missing_ok=True)
+        else:
+            manifest.write_bytes(self.converter.dumpb(layout))
+
+    def _record_file(self, key: ProjectName) -> Path:
+        return self._layout.path(self.directory, key, RECORD_SUFFIX)
+
+    def _read(self, key: ProjectName, suffix: str) -> bytes:
+        try:
+            return self._layout.path(self.directory, key, suffix).read_bytes()
+        except FileNotFoundError:
+            fallback = SHARDED if self._layout == FLAT else FLAT
+            return fallback.path(self.directory, key, suffix).read_bytes()
+
+    def _write(self, path: Path, contents: bytes) -> None:
+        if self._layout != FLAT:
+            path.parent.mkdir(exist_ok=True)
+        with _atomic_open(path) as f:
+            f.write(contents)
+
+    def _read_compressed(self, base: Path) -> bytes:
+        # Formats this repository writes come first, they are the freshest
+        candidates: list[Compression | None] = [*self.compression, None, *SUFFIXES]
+        for compression in dict.fromkeys(candidates):
+            path = base.with_name(f"{base.name}{_project_suffix(compression)}")
+            try:
+                contents = path.read_bytes()
+            except FileNotFoundError:
+                continue
+            if compression is None:
+                return contents
+            return decompress(contents, compression)
+        raise FileNotFoundError(f"{base} is not in {self.directory}")
+
+    def _find_project(self, key: ProjectName, suffix: str = "") -> tuple[Path, bytes]:
+        fallback = SHARDED if self._layout == FLAT else FLAT
+        for layout in [self._layout, fallback]:
+            base = layout.path(self.directory, key, suffix)
+            try:
+                return base, self._read_compressed(base)
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundError(f"{key} is not in {self.directory}")
+
+    def _project_exists(self, key: ProjectName) -> bool:
+        fallback = SHARDED if self._layout == FLAT else FLAT
+        splits = ["", MODULES_SUFFIX]
+        if self.split_modules:
+            splits.reverse()
+        compressions: list[Compression | None] = [*self.compression, None, *SUFFIXES]
+        return any(
+            layout.path(
+                self.directory, key, f"{split}{_project_suffix(compression)}"
+            ).exists()
+            for layout in [self._layout, fallback]
+            for split in splits
+            for compression in dict.fromkeys(compressions)
+        )
+
+    def _read_project(self, key: ProjectName) -> bytes:
+        _, contents = self._find_project(key)
+        return contents
+
+    def _write_files(
+        self, base: Path, chunks: Iterable[bytes]
+    ) -> tuple[HashingWriter, list[tuple[Path, ManifestEntry]]]:
+        """
+        Write the chunks of an encoded project or module to each of its files as
+        they are produced. Returns the hash and size of the uncompressed
+        contents, and the manifest entries of the files.
+        """
+
+        compressions: list[Compression | None] = [*self.compression] or [None]
+        files: list[tuple[Path, HashingWriter]] = []
+        total = HashingWriter()
+        with ExitStack() as stack:
+            outputs: list[Writer] = []
+            for compression in compressions:
+                path = base.with_name(f"{base.name}{_project_suffix(compression)}")
+                if path.parent != self.directory:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                out = HashingWriter(stack.enter_context(_atomic_open(path)))
+                files.append((path, out))
+                if compression is not None:
+                    outputs.append(stack.enter_context(compressing(out, compression)))
+                else:
+                    outputs.append(out)
+            for chunk in chunks:
+                total.write(chunk)
+                for output in outputs:
+                    output.write(chunk)
+        return total, [
+            (path, ManifestEntry(out.sha256.hexdigest(), out.size))
+            for path, out in files
+        ]
+
+    def _write_split_project(
+        self, key: ProjectName, project: Project
+    ) -> tuple[HashingWriter, list[tuple[Path, ManifestEntry]], list[Path]]:
+        """
+        Write a file for each module of ``project``, then its manifest. Returns
+        the same as _write_files for the project encoded as a single file,
+        along with the files of modules the project no longer has.
+        """
+
+        base = self._layout.path(self.directory, key, MODULES_SUFFIX)
+        files: list[tuple[Path, ManifestEntry]] = []
+        modules: list[ModuleEntry] = []
+
+        def write_module(module: Module, encoded: bytes) -> None:
+            written, module_files = self._write_files(base / module.name, [encoded])
+            files.extend(module_files)
+            modules.append(
+                ModuleEntry(module.name, written.sha256.hexdigest(), written.size)
+            )
+
+        total = HashingWriter()
+        for chunk in encode_project(project, write_module, self.converter):
+            total.write(chunk)
+        manifest = ProjectManifest(
+            project.name,
+            project.metadata,
+            project.documentation,
+            modules,
+            total.sha256.hexdigest(),
+        )
+        _, manifest_files = self._write_files(base, [self.converter.dumpb(manifest)])
+
+        written = {path for path, _ in files}
+        removed = []
+        if base.is_dir():
+            removed = [path for path in base.iterdir() if path not in written]
+        for path in removed:
+            path.unlink()
+        return total, [*manifest_files, *files], removed
+
+    def _publish(self, path: Path, entry: ManifestEntry) -> None:
+        relpath = path.relative_to(self.directory).as_posix()
+        if self._manifest.get(relpath) != entry:
+            self._manifest[relpath] = entry
+            self._changed.add(relpath)
+
+    def _unpublish(self, path: Path) -> None:
+        self._manifest.pop(path.relative_to(self.directory).as_posix(), None)
+
+    def _read_manifest(self) -> dict[str, ManifestEntry]:
+        try:
+            return self.converter.loads(
+                (self.directory / MANIFEST_FILENAME).read_bytes(),
+                dict[str, ManifestEntry],
+            )
+        except FileNotFoundError:
+            return {}
+
+    def write_manifest(self) -> None:
+        """
+        Write the content hashes of all published project files, and the paths
+        of the ones whose contents changed since the manifest was last loaded.
+        """
+
+        (self.directory / MANIFEST_FILENAME).write_bytes(
+            self.converter.dumpb(dict(sorted(self._manifest.items())))
+        )
+        (self.directory / CHANGED_FILENAME).write_text(
+            "".join(f"{path}\n" for path in sorted(self._changed))
+        )
+
+    def migrate(self, layout: Layout) -> None:
+        """
+        Move every project file into its place in ``layout``, then switch to it.
+        Published files are published again at their new paths.
+        """
+
+        for path in list(project_files(self.directory)):
+            key, suffix = split_project_file(path)
+            target = layout.path(self.directory, key, suffix)
+            if target != path:
+                target.parent.mkdir(exist_ok=True)
+                self._move(path, target)
+                modules = path.with_name(f"{key}{MODULES_SUFFIX}")
+                if modules.is_dir():
+                    target_modules = target.with_name(modules.name)
+                    target_modules.mkdir()
+                    for module in sorted(modules.iterdir()):
+                        self._move(module, target_modules / module.name)
+                    modules.rmdir()
+        for item in self.directory.iterdir():
+            if item.is_dir() and not any(item.iterdir()):
+                item.rmdir()
+        self._write_layout(layout)
+        self.write_manifest()
+
+    def _move(self, path: Path, target: Path) -> None:
+        path.replace(target)
+        entry = self._manifest.get(path.relative_to(self.directory).as_posix())
+        if entry is not None:
+            self._unpublish(path)
+            self._publish(target, entry)
+
+    async def run_io[T, **P](
+        self, f: Callable[P, T], *args: P.args, **kwargs: P.kwargs
+    ) -> T:
+        """Run ``f`` on the repository's I/O threads."""
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(f, *args, **kwargs)
+        )
+
+    def _load_from_disk(self, key: ProjectName) -> tuple[Project, ProjectRecord, int]:
+        # Runs on an I/O thread, so it must not touch any repository state
+        if self.backend is not None:
+            return self.backend.load(key)
+        loaders = [self._load_project, self._load_split_project]
+        if self.split_modules:
+            loaders.reverse()
+        for load in loaders:
+            try:
+                return load(key)
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundError(f"{key} is not in {self.directory}")
+
+    def _load_indexed(self, key: ProjectName) -> tuple[Project, ProjectRecord, int]:
+        # Like _load_from_disk, but makes sure the project's symbols are current
+        proj, record, size = self._load_from_disk(key)
+        if self._symbols.content_hash(key) != record.content_hash:
+            self._symbols.update(proj)
+            self._symbols.set_content_hash(key, record.content_hash)
+        return proj, record, size
+
+    def _load_project(self, key: ProjectName) -> tuple[Project, ProjectRecord, int]:
+        index_contents = self._read_project(key)
+        proj = decode_project(index_contents, self.converter)
+        if index_contents.startswith(COMPACT_PREFIX):
+            record = ProjectRecord(proj.metadata, self._content_hash(proj))
+        else:
+            record = self._make_record(proj.metadata, index_contents)
+        return proj, record, len(index_contents)
+
+    def _load_split_project(
+        self, key: ProjectName
+    ) -> tuple[Project, ProjectRecord, int]:
+        base, contents = self._find_project(key, MODULES_SUFFIX)
+        manifest = self.converter.loads(contents, ProjectManifest)
+        modules = [
+            self.converter.loads(self._read_compressed(base / entry.name), Module)
+            for entry in manifest.modules
+        ]
+        proj = Project(
+            manifest.name, manifest.metadata, manifest.documentation, modules
+        )
+        record = ProjectRecord(manifest.metadata, manifest.content_hash)
+        return proj, record, len(contents) + sum(m.size for m in manifest.modules)
+
+    def _track(self, key: ProjectName, size: int) -> None:
+        self._evictable[key] = size
+        self._evictable_bytes += size
+        self._evict()
+
+    def _touch(self, key: ProjectName) -> None:
+        if key in self._evictable:
+            self._evictable.move_to_end(key)
+
+    def _evict(self) -> None:
+        while self._evictable and (
+            (
+                self.max_cached_projects is not None
+                and len(self._evictable) > self.max_cached_projects
+            )
+            or (
+                self.max_cached_bytes is not None
+                and self._evictable_bytes > self.max_cached_bytes
+            )
+        ):
+            name, size = self._evictable.popitem(last=False)
+            self._evictable_bytes -= size
+            del self._cache[name]
+
+    def _make_record(self, metadata: ProjectMetadata, contents: bytes) -> ProjectRecord:
+        return ProjectRecord(metadata, hashlib.sha256(contents).hexdigest())
+
+    def _content_hash(self, project: Project) -> str:
+        # Of the plain encoding whatever the project is written in, so hashes
+        # don't change with the output mode
+        sha256 = hashlib.sha256()
+        for chunk in encode_project(project, converter=self.converter):
+            sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def _write_record(self, name: ProjectName, record: ProjectRecord) -> None:
+        self._write(self._record_file(name), self.converter.dumpb(record))
+
+    def _read_record(self, key: ProjectName) -> ProjectRecord:
+        """
+        Read just the metadata of an indexed project, without decoding its
+        modules. Indexes written before records existed get one backfilled.
+        """
+
+        if self.backend is not None:
+            return self.backend.record(key)
+        try:
+            record = self.converter.loads(self._read(key, RECORD_SUFFIX), ProjectRecord)
+        except FileNotFoundError:
+            _, record, _ = self._load_from_disk(key)
+            self._write_record(key, record)
+            return record
+        # Records outlive their project when only project files are deleted
+        if not self._project_exists(key):
+            raise FileNotFoundError(f"{key} is not in {self.directory}")
+        return record
+
+    def _load_record(self, key: ProjectName) -> ProjectRecord:
+        if (record := self._records.get(key)) is None:
+            record = self._records[key] = self._read_record(key)
+        return record
+
+    @ktrace("project.name")
+    def _save(self, project: Project) -> None:
+        name = ProjectName(project.name)
+        if self._cache[name].done():
+            return
+
+        self._symbols.update(project)
+        self._cache[name].set_result(project)
+        self._persisted(name, self._persist(name, project))
+
+    async def _save_async(self, project: Project) -> None:
+        name = ProjectName(project.name)
+        if self._cache[name].done():
+            return
+
+        # Symbols go in first, anyone waiting for the project may look them up
+        await self.run_io(self._symbols.update, project)
+        if self._cache[name].done():
+            return
+        self._cache[name].set_result(project)
+        if not self.write_behind:
+            self._persisted(name, await self.run_io(self._persist, name, project))
+            return
+        if not self._writers:
+            self._writers = [
+                asyncio.create_task(self._write_behind())
+                for _ in range(self.io_workers)
+            ]
+        await self._queue.put((name, project))
+
+    async def _write_behind(self) -> None:
+        while True:
+            name, project = await self._queue.get()
+            try:
+                self._persisted(name, await self.run_io(self._persist, name, project))
+            except Exception:
+                logger.exception(f"Unable to save {name}")
+            finally:
+                self._queue.task_done()
+
+    def _persist(self, name: ProjectName, project: Project) -> _Persisted:
+        # Runs on an I/O thread, so it must not touch any repository state
+        if self.backend is not None:
+            record, size = self.backend.save(project)
+            self._symbols.set_content_hash(name, record.content_hash)
+            return _Persisted(record, size, [])
+        removed: list[Path] = []
+        if self.split_modules:
+            contents, files, removed = self._write_split_project(name, project)
+        else:
+            contents, files = self._write_files(
+                self._layout.path(self.directory, name, ""),
+                (encode_compact if self.compact else encode_project)(
+                    project, converter=self.converter
+                ),
+            )
+        content_hash = (
+            self._content_hash(project) if self.compact else contents.sha256.hexdigest()
+        )
+        record = ProjectRecord(project.metadata, content_hash)
+        self._write_record(name, record)
+        self._symbols.set_content_hash(name, record.content_hash)
+        return _Persisted(
+            record,
+            contents.size,
+            files,
+            removed,
+            self._search.shards_of(search_entries(project)),
+            usage_shards(project),
+        )
+
+    def _persisted(self, name: ProjectName, persisted: _Persisted) -> None:
+        self._records[name] = persisted.record
+        # It's indexed now, whatever failed before
+        self._failures.forget([name])
+        for path, entry in persisted.files:
+            self._publish(path, entry)
+        for path in persisted.removed:
+            self._unpublish(path)
+        self._search_shards[name] = persisted.search_shards
+        self._usage_shards[name] = persisted.usage_shards
+        # Only now that it's on disk can the project be evicted
+        self._track(name, persisted.size)
+
+    async def flush(self) -> None:
+        """Wait until every queued save is written to disk."""
+
+        await self._queue.join()
+
+    async def aclose(self) -> None:
+        await self.flush()
+        for writer in self._writers:
+            writer.cancel()
+        self._writers = []
+        self._executor.shutdown()
+        self._symbols.close()
+        self._failures.write()
+        if self.backend is not None:
+            self.backend.close()
+        if self.http_cache is not None:
+            logger.info(f"HTTP cache: {self.http_cache.stats}")
+            await asyncio.to_thread(self.http_cache.prune)
+
+    def __contains__(self, key: ProjectName) -> bool:
+        if key in self._cache:
+            return self._cache[key].done()
+
+        try:
+            self._load_record(key)
+            return True
+        except OSError:
+            return False
+
+    async def contains(self, key: ProjectName) -> bool:
+        if key in self._cache:
+            return self._cache[key].done()
+        if key in self._records:
+            return True
+
+        try:
+            self._records[key] = await self.run_io(self._read_record, key)
+            return True
+        except OSError:
+            return False
+
+    async def fetch_from_remote(
+        self, client: httpx.AsyncClient, key: ProjectName
+    ) -> Project | None:
+        async for attempt in stamina.retry_context(on=httpx.RequestError, attempts=3):
+            with attempt:
+                try:
+                    url = f"https://py.wtf/_index/{self._layout.relpath(key)}"
+                    if self.http_cache is not None:
+                        content = await self.http_cache.get(client, url)
+                    else:
+                        resp = await client.get(url, follow_redirects=True)
+                        resp.raise_for_status()
+                        content = resp.content
+                    project = self.converter.loads(content, Project)
+                    return project
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code != 404:
+                        logger.debug(
+                            f"Unexpected error fetching {key} from py.wtf: {e}"
+                        )
+                except Exception:
+                    logger.debug(
+                        f"Exception while fetching {key} from py.wtf", exc_info=True
+                    )
+        return None
+
+    @ktrace("key")
+    async def get(
+        self,
+        key: ProjectName,
+        factory: Callable[[ProjectName], AsyncIterable[Project]],
+    ) -> Project:
+        if key in self._cache:
+            self._touch(key)
+            return await self._cache[key]
+
+        # It's important to force the creation of this future before we await
+        # to make sure everyone awaits on the same future and so avoid duplicating work
+        fut = self._cache[key]
+        try:
+            return await self._get(key, fut, factory)
+        except BaseException as e:
+            if not fut.done():
+                # Everyone else waiting for the project fails the same way
+                if isinstance(e, asyncio.CancelledError):
+                    fut.cancel()
+                else:
+                    fut.set_exception(e)
+            # Failed projects aren't cached, so they don't count as indexed and
+            # the next get() tries again (or raises KnownFailure). Checking
+            # also marks the exception retrieved, it's raised right here.
+            failed = fut.cancelled() or fut.exception() is not None
+            if failed and self._cache.get(key) is fut:
+                del self._cache[key]
+            raise
+
+    async def _get(
+        self,
+        key: ProjectName,
+        fut: Future[Project],
+        factory: Callable[[ProjectName], AsyncIterable[Project]],
+    ) -> Project:
+        try:
+            proj, record, size = await self.run_io(self._load_indexed, key)
+        except OSError:
+            pass  # continued below
+        else:
+            self._records.setdefault(key, record)
+            fut.set_result(proj)
+            self._track(key, size)
+            return proj
+
+        if (failure := self._failures.get(key)) is not None:
+            raise KnownFailure(key, failure)
+
+        async for project in factory(key):
+            await self._save_async(project)
+
+        if not fut.done():
+            raise ValueError(f"{key} was never yielded by factory")
+        return fut.result()
+
+    def record_failure(
+        self, key: ProjectName, reason: FailureReason, version: str | None = None
+    ) -> None:
+        """
+        Remember that ``key`` failed to index, so get() doesn't try again until
+        the failure expires or ``key`` is saved.
+        """
+
+        self._failures.record(key, reason, version)
+
+    def failure(self, key: ProjectName) -> Failure | None:
+        """Why ``key`` failed to index recently, if it did."""
+
+        return self._failures.get(key)
+
+    def retry_updated(self, uploads: dict[ProjectName, list[str]]) -> None:
+        """Retry failed projects that have new versions in ``uploads``."""
+
+        if retried := self._failures.retry_updated(uploads):
+            logger.info(f"Retrying {len(retried)} failed projects with new versions")
+
+    async def ensure(
+        self,
+        key: ProjectName,
+        factory: Callable[[ProjectName], AsyncIterable[Project]],
+    ) -> None:
+        """
+        Like get(), but without loading the project if it's already on disk and
+        its symbols are in the symbol index.
+        """
+
+        if key not in self._cache and await self.indexed(key):
+            return
+        await self.get(key, factory)
+
+    async def indexed(self, key: ProjectName) -> bool:
+        """
+        Whether ``key`` is done, or on disk with its symbols in the symbol
+        index, so it can be used as a dependency without indexing it again.
+        """
+
+        if key in self._cache:
+            return self._cache[key].done()
+        try:
+            record = self._records.get(key) or await self.run_io(self._read_record, key)
+        except OSError:
+            # Its files may have been deleted, leaving its symbols behind
+            await self.run_io(self._symbols.remove, key)
+            return False
+        content_hash = await self.run_io(self._symbols.content_hash, key)
+        if content_hash != record.content_hash:
+            return False
+        self._records.setdefault(key, record)
+        return True
+
+    async def save(self, project: Project) -> None:
+        """Save a project that was indexed without get(), like get() would."""
+
+        await self._save_async(project)
+
+    async def export(self, backend: StorageBackend) -> None:
+        """Save every project of ``backend`` into this repository."""
+
+        for name in await self.run_io(backend.names):
+            project, _, _ = await self.run_io(backend.load, name)
+            await self._save_async(project)
+
+    def records(
+        self, workers: int = 1, progress: Progress | None = None
+    ) -> dict[ProjectName, ProjectRecord]:
+        """The records of every indexed project, by name."""
+
+        if self.backend is not None:
+            return {name: self.backend.record(name) for name in self.backend.names()}
+        self._hydrate(workers, progress)
+        return dict(sorted(self._records.items()))
+
+    def load(self, key: ProjectName) -> Project:
+        """Read an indexed project, without keeping it in the repository's cache."""
+
+        project, _, _ = self._load_from_disk(key)
+        return project
+
+    def symbol_table(self, projects: Iterable[ProjectName]) -> SymbolTable:
+        """The symbols of ``projects``, which must have been ensure()d."""
+
+        return self._symbols.table(projects)
+
+    def generate_index(
+        self,
+        timestamp: int | None,
+        skip_hydration: bool = False,
+        workers: int = 1,
+        progress: Progress | None = None,
+    ) -> Index:
+        if self.backend is not None:
+            self._aggregate(IndexAggregate())
+            return self.backend.index(int(time()) if timestamp is None else timestamp)
+        index, _ = self._generate_index(timestamp, skip_hydration, workers, progress)
+        return index
+
+    def _project_keys(self) -> list[ProjectName]:
+        return list(
+            dict.fromkeys(
+                key
+                for key, suffix in map(
+                    split_project_file, project_files(self.directory)
+                )
+                if suffix in PROJECT_SUFFIXES
+            )
+        )
+
+    def _map_chunks[T](
+        self,
+        keys: list[ProjectName],
+        read: Callable[
+            ["ProjectRepository", list[ProjectName]], list[tuple[ProjectName, T]]
+        ],
+        workers: int,
+        progress: Progress | None,
+        action: str,
+    ) -> Iterator[list[tuple[ProjectName, T]]]:
+        """
+        Run ``read`` on chunks of ``keys``, on up to ``workers`` hydration
+        processes, and yield what it returns for each chunk as they finish.
+        """
+
+        chunks = [
+            keys[i : i + HYDRATION_CHUNK_SIZE]
+            for i in range(0, len(keys), HYDRATION_CHUNK_SIZE)
+        ]
+        task_id = None
+        if progress:
+            task_id = progress.add_task("projects", action=action, total=len(keys))
+
+        def done(chunk: list[tuple[ProjectName, T]]) -> list[tuple[ProjectName, T]]:
+            if progress and task_id is not None:
+                progress.advance(task_id, len(chunk))
+            return chunk
+
+        if workers <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                yield done(read(self, chunk))
+            return
+        with ProcessPoolExecutor(
+            min(workers, len(chunks)),
+            initializer=_init_hydration,
+            initargs=(
+                self.directory,
+                self.compression,
+                self.split_modules,
+                self.converter.backend,
+                logging.getLogger().level,
+            ),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as pool:
+            futures = [pool.submit(_hydrated, read, chunk) for chunk in chunks]
+            for fut in as_completed(futures):
+                yield done(fut.result())
+
+    def _hydrate(self, workers: int, progress: Progress | None) -> None:
+        """
+        Read the records of every project on disk, on up to ``workers``
+        processes. Workers only send back records, not whole projects.
+        """
+
+        keys = [key for key in self._project_keys() if key not in self._records]
+        records: dict[ProjectName, ProjectRecord] = {}
+        for chunk in self._map_chunks(
+            keys, ProjectRepository._read_records, workers, progress, "Hydrating"
+        ):
+            records.update(chunk)
+        # In directory order regardless of which worker finished first, so
+        # ties in the index are broken the same way every time
+        for key in keys:
+            self._records.setdefault(key, records[key])
+
+    @staticmethod
+    def _read_records(
+        repo: "ProjectRepository", keys: list[ProjectName]
+    ) -> list[tuple[ProjectName, ProjectRecord]]:
+        return [(key, repo._read_record(key)) for key in keys]
+
+    @staticmethod
+    def _read_shard_rows(
+        repo: "ProjectRepository", keys: list[ProjectName]
+    ) -> list[tuple[ProjectName, _ShardRows]]:
+        ret = []
+        for key in keys:
+            project, _, _ = repo._load_from_disk(key)
+            ret.append(
+                (key, _ShardRows(list(search_entries(project)), usages(project)))
+            )
+        return ret
+
+    def _generate_index(
+        self,
+        timestamp: int | None,
+        skip_hydration: bool,
+        workers: int = 1,
+        progress: Progress | None = None,
+    ) -> Tuple[Index, IndexAggregate]:
+        if not skip_hydration:
+            self._hydrate(workers, progress)
+
+        aggregate = self._aggregate(IndexAggregate())
+        return self._index_from_aggregate(aggregate, timestamp), aggregate
+
+    def _aggregate(self, aggregate: IndexAggregate) -> IndexAggregate:
+        for name, proj_fut in self._cache.items():
+            try:
+                proj_fut.result()
+            except Exception:
+                logger.error(f"Project {name} hasn't finished indexing")
+
+        for name, record in self._records.items():
+            aggregate.update(name, record.metadata)
+        return aggregate
+
+    def _index_from_aggregate(
+        self,
+        aggregate: IndexAggregate,
+        timestamp: int | None,
+        previous: IndexMetadata | None = None,
+    ) -> Index:
+        max_counts = 5
+        # Every project saved or loaded is in there, see _aggregate
+        all_project_names = set(aggregate.projects)
+        known_metadata: dict[ProjectName, ProjectMetadata] = {}
+        if previous is not None:
+            for m in [*previous.latest_projects, *previous.top_projects]:
+                known_metadata[ProjectName(m.name)] = m
+        for name, record in self._records.items():
+            known_metadata[name] = record.metadata
+
+        def metadata_for(names: Iterable[ProjectName]) -> list[ProjectMetadata]:
+            ret: list[ProjectMetadata] = []
+            for name in names:
+                if name in known_metadata:
+                    ret.append(known_metadata[name])
+                    continue
+                try:
+                    ret.append(self._load_record(name).metadata)
+                except OSError:
+                    logger.error(f"Top-{max_counts} project '{name}' not indexed.")
+            return ret
+
+        return Index(
+            generated_at=int(time()) if timestamp is None else timestamp,
+            latest_projects=metadata_for(
+                heapq.nlargest(
+                    max_counts,
+                    aggregate.projects,
+                    key=lambda name: aggregate.projects[name].upload_time,
+                )
+            ),
+            top_projects=metadata_for(
+                heapq.nlargest(
+                    max_counts,
+                    aggregate.dependency_counts,
+                    key=aggregate.dependency_counts.__getitem__,
+                )
+            ),
+            all_project_names=sorted(all_project_names),
+        )
+
+    def _versions(
+        self, versions: dict[ProjectName, VersionEntry]
+    ) -> dict[ProjectName, VersionEntry]:
+        for name, record in self._records.items():
+            versions[name] = VersionEntry(record.metadata.version, record.content_hash)
+        return versions
+
+    def shards_missing(self) -> list[str]:
+        """
+        Paths of the search and usage shards update_index will rewrite that
+        aren't in the directory, so they can be fetched first. Which search
+        shards a project had entries in is only known once its shard list is
+        fetched, so call this again until nothing new is missing.
+        """
+
+        search = self._search.shards_to_update(self._search_shards)
+        usages = self._usages.shards_to_update(self._usage_shards)
+        paths = [
+            *(self._search.projects_path(name) for name in sorted(self._search_shards)),
+            *(self._search.shard_path(shard) for shard in sorted(search)),
+            *(self._usages.shard_path(shard) for shard in sorted(usages)),
+        ]
+        return [
+            path.relative_to(self.directory).as_posix()
+            for path in paths
+            if not path.exists()
+        ]
+
+    def _publish_shards(
+        self, result: tuple[list[tuple[Path, ManifestEntry]], list[Path]]
+    ) -> None:
+        written, removed = result
+        for path, entry in written:
+            self._publish(path, entry)
+        for path in removed:
+            self._unpublish(path)
+
+    def _update_shards(self, names: Iterable[ProjectName]) -> None:
+        # Only for the projects of a run, the shards they touch are read and
+        # merged into
+        for name in names:
+            # One project at a time, to keep memory use flat
+            project, _, _ = self._load_from_disk(name)
+            self._publish_shards(self._search.update(project))
+            self._publish_shards(self._usages.update(project))
+        self._publish_shards(self._search.write())
+        self._publish_shards(self._usages.write())
+
+    def write_index(
+        self,
+        timestamp: int | None = None,
+        workers: int = 1,
+        progress: Progress | None = None,
+    ) -> None:
+        if self.backend is not None:
+            # The backend has the whole index, there's nothing to fold in
+            self._write_metadata(self.generate_index(timestamp))
+            self.write_manifest()
+            return
+        index, aggregate = self._generate_index(
+            timestamp, skip_hydration=False, workers=workers, progress=progress
+        )
+        # Every project is on disk and in the records now
+        rows = [
+            row
+            for chunk in self._map_chunks(
+                list(self._records),
+                ProjectRepository._read_shard_rows,
+                workers,
+                progress,
+                "Searching",
+            )
+            for row in chunk
+        ]
+        self._publish_shards(
+            self._search.rebuild((name, row.search) for name, row in rows)
+        )
+        self._publish_shards(
+            self._usages.rebuild((name, row.usages) for name, row in rows)
+        )
+        self._write_index(index, aggregate, self._versions({}))
+
+    def _write_index(
+        self,
+        index: Index,
+        aggregate: IndexAggregate,
+        versions: dict[ProjectName, VersionEntry],
+        pages: Collection[str] | None = None,
+    ) -> None:
+        (self.directory / AGGREGATE_FILENAME).write_bytes(
+            self.converter.dumpb(aggregate)
+        )
+        (self.directory / VERSIONS_FILENAME).write_bytes(
+            self.converter.dumpb(dict(sorted(versions.items())))
+        )
+        self._write_metadata(index, pages)
+        self.write_manifest()
+
+    def _write_metadata(
+        self, index: Index, pages: Collection[str] | None = None
+    ) -> None:
+        # Project names go in their own pages, only the pages in ``pages`` (or
+        # all of them) are rewritten
+        written, removed = self._names.write(index.all_project_names, pages)
+        for path, entry in written:
+            self._publish(path, entry)
+        for path in removed:
+            self._unpublish(path)
+        metadata = IndexMetadata(
+            index.generated_at,
+            index.latest_projects,
+            index.top_projects,
+            len(index.all_project_names),
+        )
+        (self.directory / METADATA_FILENAME).write_bytes(self.converter.dumpb(metadata))
+
+    def update_index(self) -> None:
+        """
+        Fold the projects indexed in this run into the existing index. Only
+        their entries in the persisted aggregate are replaced, so this doesn't
+        need to look at any other project.
+        """
+
+        if self.backend is not None:
+            self.write_index()
+            return
+        metadata = self.directory / METADATA_FILENAME
+        index = self.converter.loads(metadata.read_bytes(), IndexMetadata)
+        try:
+            aggregate = self.converter.loads(
+                (self.directory / AGGREGATE_FILENAME).read_bytes(), IndexAggregate
+            )
+        except FileNotFoundError:
+            # Without it, the index (and the name pages rewritten) would only
+            # have the projects of this run
+            raise FileNotFoundError(
+                f"No {AGGREGATE_FILENAME} in {self.directory} to update, "
+                "use write_index() to rebuild the index from every project"
+            ) from None
+        try:
+            versions = read_versions(self.directory)
+        except FileNotFoundError:
+            logger.warning(f"No {VERSIONS_FILENAME} found, starting a new one")
+            versions = {}
+        aggregate = self._aggregate(aggregate)
+        self._update_shards(self._search_shards)
+        self._write_index(
+            self._index_from_aggregate(aggregate, int(time()), previous=index),
+            aggregate,
+            self._versions(versions),
+            # Not the projects in the cache, which may have been evicted
+            {page_for(name) for name in self._records},
+        )
+
+    def pending_items(self) -> None:
+        pending = []
+        for name, fut in self._cache.items():
+            if not fut.done():
+                pending.append(name)
+        if pending:
+            logger.warning(f"{len(pending)} projects are pending: {pending}")
+        else:
+            logger.info("No projects pending")
@@ -0,0 +1,29 @@
+from typing import Protocol
+
+from py_wtf.types import Index, Project, ProjectName, ProjectRecord
+
+
+class StorageBackend(Protocol):
+    """
+    Somewhere other than its directory for a ProjectRepository to keep its
+    projects. Methods are called from the repository's I/O threads.
+    """
+
+    def load(self, key: ProjectName) -> tuple[Project, ProjectRecord, int]:
+        """
+        Load a project, its record and its encoded size. Raises
+        FileNotFoundError for unknown projects, like a missing project file.
+        """
+        ...
+
+    def save(self, project: Project) -> tuple[ProjectRecord, int]: ...
+
+    def record(self, key: ProjectName) -> ProjectRecord:
+        """Like load(), but without loading the modules of the project."""
+        ...
+
+    def names(self) -> list[ProjectName]: ...
+
+    def index(self, timestamp: int) -> Index: ...
+
+    def close(self) -> None: ...
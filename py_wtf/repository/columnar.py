@@ -0,0 +1,311 @@
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+from rich.progress import Progress
+
+from py_wtf.repository import ProjectRepository
+from py_wtf.repository.encoding import converter
+from py_wtf.repository.layout import SHARDED
+from py_wtf.repository.usages import xrefs
+from py_wtf.types import (
+    Class,
+    Documentation,
+    FQName,
+    Function,
+    Project,
+    ProjectName,
+    Type,
+)
+
+logger = logging.getLogger(__name__)
+
+# Content hashes of the exported projects
+STATE_FILENAME = ".exported"
+
+# Columns of each table, as (name, type) pairs of pyarrow type names
+_STRING = "string"
+_NULLABLE = "string?"
+_STRINGS = "list<string>"
+TABLES: dict[str, list[tuple[str, str]]] = {
+    "projects": [
+        ("project", _STRING),
+        ("version", _STRING),
+        ("upload_time", "int64"),
+        ("summary", _NULLABLE),
+        ("home_page", _NULLABLE),
+        ("license", _NULLABLE),
+        ("documentation_url", _NULLABLE),
+        ("classifiers", _STRINGS),
+        ("dependencies", _STRINGS),
+        ("documentation", _STRING),
+        ("content_hash", _STRING),
+    ],
+    "modules": [
+        ("project", _STRING),
+        ("module", _STRING),
+        ("documentation", _STRING),
+    ],
+    "classes": [
+        ("project", _STRING),
+        ("module", _STRING),
+        ("class", _STRING),
+        # The class this one is defined in, if any
+        ("outer", _NULLABLE),
+        ("bases", _STRINGS),
+        ("documentation", _STRING),
+    ],
+    "functions": [
+        ("project", _STRING),
+        ("module", _STRING),
+        ("function", _STRING),
+        # The class of methods
+        ("class", _NULLABLE),
+        ("asynchronous", "bool"),
+        ("returns", _NULLABLE),
+        ("documentation", _STRING),
+    ],
+    "parameters": [
+        ("project", _STRING),
+        ("function", _STRING),
+        ("position", "int32"),
+        ("name", _STRING),
+        ("type", _NULLABLE),
+        ("default", _NULLABLE),
+    ],
+    # Every cross reference, from the symbol whose export, parameter, return
+    # or variable type it's in
+    "xrefs": [
+        ("project", _STRING),
+        ("module", _STRING),
+        ("source", _STRING),
+        ("kind", _STRING),
+        ("target", _STRING),
+        ("target_project", _STRING),
+    ],
+}
+
+
+def _arrow() -> tuple[ModuleType, ModuleType, ModuleType]:
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ValueError(
+            "Columnar exports need the pyarrow package, install py-wtf[arrow]"
+        ) from e
+    return pyarrow, pyarrow.compute, pyarrow.parquet
+
+
+def _schema(pa: ModuleType, table: str) -> Any:
+    types = {
+        _STRING: pa.string(),
+        _NULLABLE: pa.string(),
+        _STRINGS: pa.list_(pa.string()),
+        "int64": pa.int64(),
+        "int32": pa.int32(),
+        "bool": pa.bool_(),
+    }
+    return pa.schema(
+        [
+            pa.field(name, types[typ], nullable=typ == _NULLABLE)
+            for name, typ in TABLES[table]
+        ]
+    )
+
+
+def type_name(typ: Type) -> str:
+    if typ.params is None:
+        return typ.name
+    return f"{typ.name}[{', '.join(type_name(param) for param in typ.params)}]"
+
+
+def _docs(documentation: list[Documentation]) -> str:
+    return "\n".join(documentation)
+
+
+@dataclass(slots=True)
+class _Rows:
+    """Rows of every table, column by column."""
+
+    columns: dict[str, dict[str, list[Any]]] = field(
+        default_factory=lambda: defaultdict(lambda: defaultdict(list))
+    )
+
+    def add(self, table: str, *values: Any) -> None:
+        columns = self.columns[table]
+        for (name, _), value in zip(TABLES[table], values, strict=True):
+            columns[name].append(value)
+
+    def add_project(self, project: Project, content_hash: str) -> None:
+        name = project.name
+        meta = project.metadata
+        self.add(
+            "projects",
+            name,
+            meta.version,
+            meta.upload_time,
+            meta.summary,
+            meta.home_page,
+            meta.license,
+            meta.documentation_url,
+            meta.classifiers or [],
+            meta.dependencies,
+            _docs(project.documentation),
+            content_hash,
+        )
+        for mod in project.modules:
+            self.add("modules", name, mod.name, _docs(mod.documentation))
+            for func in mod.functions:
+                self.add_function(name, mod.name, func, None)
+            for cls in mod.classes:
+                self.add_class(name, mod.name, cls, None)
+        for module, source, kind, xref in xrefs(project):
+            # Unlike in project files, xrefs within the project name it too
+            target_project = name if xref.project is None else xref.project
+            self.add("xrefs", name, module, source, kind, xref.fqname, target_project)
+
+    def add_class(
+        self, project: str, module: str, cls: Class, outer: FQName | None
+    ) -> None:
+        self.add(
+            "classes",
+            project,
+            module,
+            cls.name,
+            outer,
+            cls.bases,
+            _docs(cls.documentation),
+        )
+        for func in cls.methods:
+            self.add_function(project, module, func, cls.name)
+        for inner in cls.inner_classes:
+            self.add_class(project, module, inner, cls.name)
+
+    def add_function(
+        self, project: str, module: str, func: Function, cls: FQName | None
+    ) -> None:
+        self.add(
+            "functions",
+            project,
+            module,
+            func.name,
+            cls,
+            func.asynchronous,
+            None if func.returns is None else type_name(func.returns),
+            _docs(func.documentation),
+        )
+        for position, param in enumerate(func.params):
+            self.add(
+                "parameters",
+                project,
+                func.name,
+                position,
+                param.name,
+                None if param.type is None else type_name(param.type),
+                param.default,
+            )
+
+
+@dataclass(slots=True)
+class ColumnarExport:
+    """
+    Every indexed project as Parquet tables, one directory of files per table.
+    Projects are split into files by the same hash prefixes as the sharded
+    layout, so exporting again only rewrites the files of projects that
+    changed since, and only one file of each table is in memory at a time.
+    """
+
+    directory: Path
+
+    def table_path(self, table: str, bucket: str) -> Path:
+        return self.directory / table / f"{bucket}.parquet"
+
+    def _read_state(self) -> dict[ProjectName, str]:
+        try:
+            return converter.loads(
+                (self.directory / STATE_FILENAME).read_bytes(), dict[ProjectName, str]
+            )
+        except FileNotFoundError:
+            return {}
+
+    def _write_state(self, state: dict[ProjectName, str]) -> None:
+        (self.directory / STATE_FILENAME).write_bytes(
+            converter.dumpb(dict(sorted(state.items())))
+        )
+
+    def export(
+        self,
+        repo: ProjectRepository,
+        workers: int = 1,
+        progress: Progress | None = None,
+    ) -> tuple[int, int]:
+        """
+        Bring the tables up to date with ``repo``. Returns the number of
+        projects written and removed.
+        """
+
+        pa, pc, pq = _arrow()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        state = self._read_state()
+        records = repo.records(workers, progress)
+        changed = {
+            name: record.content_hash
+            for name, record in records.items()
+            if state.get(name) != record.content_hash
+        }
+        removed = state.keys() - records.keys()
+
+        buckets: dict[str, list[ProjectName]] = defaultdict(list)
+        for name in [*changed, *removed]:
+            buckets[SHARDED.shard(name)].append(name)
+        logger.info(
+            f"Exporting {len(changed)} projects, removing {len(removed)}, "
+            f"in {len(buckets)} files per table"
+        )
+
+        task_id = None
+        if progress:
+            task_id = progress.add_task(
+                "tables", action="Exporting", total=len(buckets)
+            )
+        for bucket, names in sorted(buckets.items()):
+            rows = _Rows()
+            for name in names:
+                if name in changed:
+                    rows.add_project(repo.load(name), changed[name])
+            stale = pa.array(names, pa.string())
+            for table in TABLES:
+                schema = _schema(pa, table)
+                new = pa.Table.from_pydict(
+                    {
+                        column: rows.columns[table][column]
+                        for column, _ in TABLES[table]
+                    },
+                    schema=schema,
+                )
+                path = self.table_path(table, bucket)
+                if path.exists():
+                    old = pq.read_table(path, schema=schema)
+                    keep = pc.invert(pc.is_in(old["project"], value_set=stale))
+                    new = pa.concat_tables([old.filter(keep), new])
+                if new.num_rows:
+                    path.parent.mkdir(exist_ok=True)
+                    tmp = path.with_suffix(".tmp")
+                    pq.write_table(new, tmp)
+                    tmp.replace(path)
+                else:
+                    path.unlink(missing_ok=True)
+            for name in names:
+                if name in changed:
+                    state[name] = changed[name]
+                else:
+                    del state[name]
+            if progress and task_id is not None:
+                progress.advance(task_id)
+        self._write_state(state)
+        return len(changed), len(removed)
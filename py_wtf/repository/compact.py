@@ -0,0 +1,262 @@
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+from py_wtf.repository.encoding import Converter, converter
+from py_wtf.types import (
+    Class,
+    Documentation,
+    Export,
+    FQName,
+    Function,
+    Module,
+    Parameter,
+    Project,
+    ProjectMetadata,
+    ProjectName,
+    Type,
+    Variable,
+    XRef,
+)
+
+COMPACT_VERSION = 2
+# Every compact project starts with this, and no plain JSON project does
+COMPACT_PREFIX = b'{"version":'
+
+# Compact objects use one or two letter keys and leave out empty lists, None
+# and False. Names, types and parameter defaults are indices into the
+# project's string table, with names starting with "." relative to the
+# enclosing module or class. Since version 2, absolute names that start with
+# "." or a backslash get a backslash in front, so they aren't taken for
+# relative ones.
+Compact = dict[str, Any]
+
+
+@dataclass(slots=True)
+class _Strings:
+    values: list[str] = field(default_factory=list)
+    _index: dict[str, int] = field(default_factory=dict)
+
+    def __call__(self, value: str) -> int:
+        if (i := self._index.get(value)) is None:
+            i = self._index[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+def _relative(name: str, scope: str) -> str:
+    if name.startswith(f"{scope}."):
+        return name[len(scope) :]
+    if name.startswith((".", "\\")):
+        return f"\\{name}"
+    return name
+
+
+def _absolute(name: str, scope: str, escaped: bool = True) -> FQName:
+    if escaped and name.startswith("\\"):
+        return FQName(name[1:])
+    return FQName(f"{scope}{name}" if name.startswith(".") else name)
+
+
+def _put(obj: Compact, key: str, value: Any) -> None:
+    if value:
+        obj[key] = value
+
+
+@dataclass(slots=True)
+class _Encoder:
+    strings: _Strings = field(default_factory=_Strings)
+
+    def name(self, name: str, scope: str) -> int:
+        return self.strings(_relative(name, scope))
+
+    def xref(self, xref: XRef, scope: str) -> list[int]:
+        ret = [self.name(xref.fqname, scope)]
+        if xref.project is not None:
+            ret.append(self.strings(xref.project))
+        return ret
+
+    def type(self, typ: Type | None, scope: str) -> Compact | None:
+        return None if typ is None else self._type(typ, scope)
+
+    def _type(self, typ: Type, scope: str) -> Compact:
+        ret: Compact = {"n": self.strings(typ.name)}
+        if typ.xref is not None:
+            ret["x"] = self.xref(typ.xref, scope)
+        if typ.params is not None:
+            ret["p"] = [self._type(param, scope) for param in typ.params]
+        return ret
+
+    def variable(self, var: Variable, scope: str, module: str) -> Compact:
+        ret: Compact = {"n": self.name(var.name, scope)}
+        _put(ret, "t", self.type(var.type, module))
+        _put(ret, "d", var.documentation)
+        return ret
+
+    def function(self, func: Function, scope: str, module: str) -> Compact:
+        ret: Compact = {"n": self.name(func.name, scope)}
+        _put(ret, "a", func.asynchronous)
+        params: list[Compact] = []
+        for param in func.params:
+            encoded: Compact = {"n": self.strings(param.name)}
+            _put(encoded, "t", self.type(param.type, module))
+            if param.default is not None:
+                encoded["df"] = self.strings(param.default)
+            params.append(encoded)
+        _put(ret, "p", params)
+        _put(ret, "r", self.type(func.returns, module))
+        _put(ret, "d", func.documentation)
+        return ret
+
+    def cls(self, cls: Class, scope: str, module: str) -> Compact:
+        ret: Compact = {"n": self.name(cls.name, scope)}
+        _put(ret, "b", [self.name(base, module) for base in cls.bases])
+        _put(ret, "m", [self.function(f, cls.name, module) for f in cls.methods])
+        _put(
+            ret,
+            "cv",
+            [self.variable(v, cls.name, module) for v in cls.class_variables],
+        )
+        _put(
+            ret,
+            "iv",
+            [self.variable(v, cls.name, module) for v in cls.instance_variables],
+        )
+        _put(ret, "ic", [self.cls(c, cls.name, module) for c in cls.inner_classes])
+        _put(ret, "d", cls.documentation)
+        return ret
+
+    def module(self, module: Module) -> Compact:
+        scope = module.name
+        ret: Compact = {"n": self.strings(scope)}
+        _put(ret, "d", module.documentation)
+        _put(ret, "f", [self.function(f, scope, scope) for f in module.functions])
+        _put(ret, "v", [self.variable(v, scope, scope) for v in module.variables])
+        _put(ret, "c", [self.cls(c, scope, scope) for c in module.classes])
+        _put(
+            ret,
+            "e",
+            [
+                {"n": self.name(e.name, scope), "x": self.xref(e.xref, scope)}
+                for e in module.exports
+            ],
+        )
+        return ret
+
+
+@dataclass(slots=True)
+class _Decoder:
+    strings: list[str]
+    # Version 1 didn't escape absolute names
+    escaped: bool = True
+
+    def name(self, i: int, scope: str) -> FQName:
+        return _absolute(self.strings[i], scope, self.escaped)
+
+    def xref(self, xref: list[int], scope: str) -> XRef:
+        project = ProjectName(self.strings[xref[1]]) if len(xref) > 1 else None
+        return XRef(self.name(xref[0], scope), project)
+
+    def type(self, typ: Compact | None, scope: str) -> Type | None:
+        return None if typ is None else self._type(typ, scope)
+
+    def _type(self, typ: Compact, scope: str) -> Type:
+        params = typ.get("p")
+        return Type(
+            self.strings[typ["n"]],
+            self.xref(typ["x"], scope) if "x" in typ else None,
+            None if params is None else [self._type(p, scope) for p in params],
+        )
+
+    def variable(self, var: Compact, scope: str, module: str) -> Variable:
+        return Variable(
+            self.name(var["n"], scope),
+            self.type(var.get("t"), module),
+            var.get("d", []),
+        )
+
+    def function(self, func: Compact, scope: str, module: str) -> Function:
+        return Function(
+            self.name(func["n"], scope),
+            func.get("a", False),
+            [
+                Parameter(
+                    self.strings[param["n"]],
+                    self.type(param.get("t"), module),
+                    self.strings[param["df"]] if "df" in param else None,
+                )
+                for param in func.get("p", [])
+            ],
+            self.type(func.get("r"), module),
+            func.get("d", []),
+        )
+
+    def cls(self, cls: Compact, scope: str, module: str) -> Class:
+        name = self.name(cls["n"], scope)
+        return Class(
+            name,
+            [self.name(base, module) for base in cls.get("b", [])],
+            [self.function(f, name, module) for f in cls.get("m", [])],
+            [self.variable(v, name, module) for v in cls.get("cv", [])],
+            [self.variable(v, name, module) for v in cls.get("iv", [])],
+            [self.cls(c, name, module) for c in cls.get("ic", [])],
+            cls.get("d", []),
+        )
+
+    def module(self, module: Compact) -> Module:
+        scope = self.strings[module["n"]]
+        return Module(
+            FQName(scope),
+            module.get("d", []),
+            [self.function(f, scope, scope) for f in module.get("f", [])],
+            [self.variable(v, scope, scope) for v in module.get("v", [])],
+            [self.cls(c, scope, scope) for c in module.get("c", [])],
+            [
+                Export(self.name(e["n"], scope), self.xref(e["x"], scope))
+                for e in module.get("e", [])
+            ],
+        )
+
+
+def encode_compact(
+    project: Project, converter: Converter = converter
+) -> Iterator[bytes]:
+    """
+    Encode ``project`` in the compact encoding, one module at a time like
+    encode_project. The string table goes last, so it's the only thing that
+    grows while encoding.
+    """
+
+    encoder = _Encoder()
+    head = {
+        "version": COMPACT_VERSION,
+        "name": project.name,
+        "metadata": converter.unstructure(project.metadata),
+        "documentation": project.documentation,
+    }
+    yield converter.dumpb(head)[:-1] + b',"modules":['
+    for i, module in enumerate(project.modules):
+        if i:
+            yield b","
+        yield converter.dumpb(encoder.module(module))
+    yield b'],"strings":' + converter.dumpb(encoder.strings.values) + b"}"
+
+
+def decode_compact(contents: bytes, converter: Converter = converter) -> Project:
+    data = converter.parse(contents)
+    if (version := data["version"]) not in (1, COMPACT_VERSION):
+        raise ValueError(f"Unsupported compact encoding version {version}")
+    decoder = _Decoder(data["strings"], escaped=version > 1)
+    return Project(
+        ProjectName(data["name"]),
+        converter.structure(data["metadata"], ProjectMetadata),
+        [Documentation(doc) for doc in data["documentation"]],
+        [decoder.module(module) for module in data["modules"]],
+    )
+
+
+def decode_project(contents: bytes, converter: Converter = converter) -> Project:
+    """Decode a project in either the plain or the compact encoding."""
+
+    if contents.startswith(COMPACT_PREFIX):
+        return decode_compact(contents, converter)
+    return converter.loads(contents, Project)
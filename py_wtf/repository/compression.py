@@ -0,0 +1,71 @@
+import gzip
+import hashlib
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Generator, Literal, Protocol
+
+Compression = Literal["gzip", "zstd"]
+
+SUFFIXES: dict[Compression, str] = {"gzip": ".gz", "zstd": ".zst"}
+
+
+class Writer(Protocol):
+    def write(self, data: bytes, /) -> object: ...
+
+    def flush(self) -> object: ...
+
+
+class HashingWriter:
+    """Passes writes through to ``out`` while hashing and counting them."""
+
+    def __init__(self, out: Writer | None = None) -> None:
+        self._out = out
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes, /) -> object:
+        self.sha256.update(data)
+        self.size += len(data)
+        if self._out is not None:
+            self._out.write(data)
+        return len(data)
+
+    def flush(self) -> None:
+        if self._out is not None:
+            self._out.flush()
+
+
+@contextmanager
+def compressing(out: Writer, compression: Compression) -> Generator[Writer]:
+    """
+    Compress everything written to the returned writer into ``out``. The output
+    is deterministic, so the same input always results in the same bytes (and
+    the same content hash).
+    """
+
+    if compression == "gzip":
+        with gzip.GzipFile(
+            filename="", mode="wb", fileobj=out, compresslevel=9, mtime=0
+        ) as f:
+            yield f
+    else:
+        with _zstd().ZstdCompressor(level=19).stream_writer(out, closefd=False) as f:
+            yield f
+
+
+def decompress(contents: bytes, compression: Compression) -> bytes:
+    if compression == "gzip":
+        return gzip.decompress(contents)
+    # Streamed frames don't record their size, which ZstdDecompressor.decompress
+    # needs
+    return _zstd().ZstdDecompressor().decompressobj().decompress(contents)
+
+
+def _zstd() -> ModuleType:
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ValueError(
+            "zstd compression needs the zstandard package, install py-wtf[zstd]"
+        ) from e
+    return zstandard
@@ -0,0 +1,111 @@
+import json
+from dataclasses import dataclass, replace
+from functools import partial
+from typing import Any, Callable, Iterator, Literal
+
+import cattrs
+from cattrs.cols import is_namedtuple, namedtuple_unstructure_factory
+from cattrs.preconf.json import make_converter as make_cattrs_converter
+
+from py_wtf.types import Module, Project
+
+ConverterBackend = Literal["json", "orjson"]
+
+
+@dataclass(slots=True, frozen=True)
+class Converter:
+    """
+    A cattrs converter that encodes with ``backend``. Every backend writes
+    compact JSON with non-ASCII text left as UTF-8, so they all produce the
+    same bytes and can read each other's output.
+    """
+
+    backend: ConverterBackend
+    _cattrs: cattrs.Converter
+    _dumps: Callable[[Any], str]
+    _dumpb: Callable[[Any], bytes]
+    _loads: Callable[[bytes | str], Any]
+
+    def dumps(self, obj: Any, unstructure_as: Any = None) -> str:
+        return self._dumps(self._cattrs.unstructure(obj, unstructure_as=unstructure_as))
+
+    def dumpb(self, obj: Any, unstructure_as: Any = None) -> bytes:
+        return self._dumpb(self._cattrs.unstructure(obj, unstructure_as=unstructure_as))
+
+    def loads[T](self, data: bytes | str, cl: type[T]) -> T:
+        return self._cattrs.structure(self._loads(data), cl)
+
+    def unstructure(self, obj: Any, unstructure_as: Any = None) -> Any:
+        return self._cattrs.unstructure(obj, unstructure_as=unstructure_as)
+
+    def structure[T](self, obj: Any, cl: type[T]) -> T:
+        return self._cattrs.structure(obj, cl)
+
+    def parse(self, data: bytes | str) -> Any:
+        """Decode JSON without structuring it."""
+
+        return self._loads(data)
+
+
+def make_converter(backend: ConverterBackend = "json") -> Converter:
+    # Both backends share the stdlib json converter's unstructuring, so only
+    # the JSON library differs. json encodes NamedTuples as lists on its own,
+    # orjson needs them as plain tuples.
+    unstructurer = make_cattrs_converter()
+    unstructurer.register_unstructure_hook_factory(
+        is_namedtuple, partial(namedtuple_unstructure_factory, unstructure_to=tuple)
+    )
+    if backend == "json":
+        dumps = partial(json.dumps, separators=(",", ":"), ensure_ascii=False)
+        return Converter(
+            backend,
+            unstructurer,
+            dumps,
+            # json.loads reads lone surrogates back from bytes the same way
+            lambda obj: dumps(obj).encode("utf-8", "surrogatepass"),
+            json.loads,
+        )
+
+    try:
+        import orjson
+    except ImportError as e:
+        raise ValueError(
+            "The orjson converter needs the orjson package, install py-wtf[orjson]"
+        ) from e
+    # ProjectNames are str subclasses, which orjson only takes as keys with this
+    dumpb = partial(orjson.dumps, option=orjson.OPT_NON_STR_KEYS)
+    return Converter(
+        backend,
+        unstructurer,
+        lambda obj: dumpb(obj).decode(),
+        dumpb,
+        orjson.loads,
+    )
+
+
+converter = make_converter()
+
+
+def encode_project(
+    project: Project,
+    on_module: Callable[[Module, bytes], None] | None = None,
+    converter: Converter = converter,
+) -> Iterator[bytes]:
+    """
+    Encode ``project`` one module at a time. The chunks add up to exactly
+    ``converter.dumpb(project)``, but only one module is encoded at any time.
+    ``on_module`` is called with each module's encoding as it's produced.
+    """
+
+    # modules is the last field of Project, so the encoding of a project with
+    # no modules ends with `[]}`
+    head = converter.dumpb(replace(project, modules=[]))
+    yield head[:-2]
+    for i, module in enumerate(project.modules):
+        if i:
+            yield b","
+        encoded = converter.dumpb(module)
+        if on_module is not None:
+            on_module(module, encoded)
+        yield encoded
+    yield head[-2:]
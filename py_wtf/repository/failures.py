@@ -0,0 +1,124 @@
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from time import time
+from typing import Iterable
+
+from py_wtf.repository.encoding import converter
+from py_wtf.types import Failure, FailureReason, ProjectName
+
+logger = logging.getLogger(__name__)
+
+FAILURES_FILENAME = ".failures"
+
+_DAY = 24 * 60 * 60
+# How long until a project that failed is tried again, unless PyPI gets a new
+# version of it first. Downloads mostly fail for transient reasons.
+FAILURE_TTLS: dict[FailureReason, int] = {
+    "not-found": 7 * _DAY,
+    "download": _DAY,
+}
+
+
+class KnownFailure(ValueError):
+    def __init__(self, name: ProjectName, failure: Failure) -> None:
+        expires = datetime.fromtimestamp(failure.expires_at, timezone.utc)
+        super().__init__(
+            f"{name} failed to index ({failure.reason}), "
+            f"not retrying until {expires:%Y-%m-%d %H:%M} UTC"
+        )
+        self.name = name
+        self.failure = failure
+
+
+@dataclass(slots=True)
+class FailureCache:
+    """
+    Projects that failed to index recently, so they aren't retried on every
+    run. Entries expire after their reason's TTL.
+    """
+
+    path: Path
+
+    _entries: dict[ProjectName, Failure] = field(init=False)
+    _changed: bool = field(init=False, default=False)
+
+    def __post_init__(self) -> None:
+        try:
+            entries = converter.parse(self.path.read_bytes())
+        except FileNotFoundError:
+            entries = {}
+        # Failures for reasons that aren't recorded anymore (projects without
+        # an artifact are saved with a stub now) are dropped
+        self._entries = converter.structure(
+            {
+                name: entry
+                for name, entry in entries.items()
+                if entry["reason"] in FAILURE_TTLS
+            },
+            dict[ProjectName, Failure],
+        )
+        self._changed = len(self._entries) != len(entries)
+
+    def get(self, name: ProjectName, now: int | None = None) -> Failure | None:
+        failure = self._entries.get(name)
+        if failure is None or failure.expires_at <= (
+            int(time()) if now is None else now
+        ):
+            return None
+        return failure
+
+    def entries(self, now: int | None = None) -> dict[ProjectName, Failure]:
+        """Every failure that hasn't expired yet."""
+
+        return {
+            name: failure
+            for name in sorted(self._entries)
+            if (failure := self.get(name, now)) is not None
+        }
+
+    def record(
+        self,
+        name: ProjectName,
+        reason: FailureReason,
+        version: str | None,
+        now: int | None = None,
+    ) -> Failure:
+        if now is None:
+            now = int(time())
+        failure = Failure(reason, version, now, now + FAILURE_TTLS[reason])
+        logger.debug(f"Recording failure of {name}: {failure}")
+        self._entries[name] = failure
+        self._changed = True
+        return failure
+
+    def forget(self, names: Iterable[ProjectName] | None = None) -> list[ProjectName]:
+        """Forget failures of ``names``, or all of them. Returns the ones forgotten."""
+
+        if names is None:
+            names = list(self._entries)
+        forgotten = [name for name in names if self._entries.pop(name, None)]
+        self._changed |= bool(forgotten)
+        return forgotten
+
+    def retry_updated(self, uploads: dict[ProjectName, list[str]]) -> list[ProjectName]:
+        """
+        Forget failures of projects that have had versions other than the one
+        that failed uploaded since.
+        """
+
+        return self.forget(
+            name
+            for name, versions in uploads.items()
+            if (failure := self._entries.get(name)) is not None
+            and any(version != failure.version for version in versions)
+        )
+
+    def write(self, now: int | None = None) -> None:
+        live = self.entries(now)
+        if not self._changed and len(live) == len(self._entries):
+            return
+        self._entries = live
+        self.path.write_bytes(converter.dumpb(live))
+        self._changed = False
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from time import time
+
+import httpx
+
+from py_wtf.repository.encoding import converter
+
+
+@dataclass(slots=True, frozen=True)
+class CacheEntry:
+    url: str
+    etag: str | None
+    last_modified: str | None
+    size: int
+    # Of the body, entries written before it was added have none and miss
+    sha256: str | None = None
+
+
+@dataclass(slots=True)
+class CacheStats:
+    # Requests answered with 304 Not Modified, and ones that downloaded a body
+    hits: int = 0
+    misses: int = 0
+    bytes_downloaded: int = 0
+    bytes_saved: int = 0
+
+
+@dataclass(slots=True)
+class HTTPCache:
+    """
+    An on-disk cache of GET responses that revalidates with ``If-None-Match``
+    and ``If-Modified-Since``, so unchanged files aren't downloaded again.
+    Responses not used for ``max_age`` seconds are evicted, and the least
+    recently used ones once the cache grows past ``max_bytes``.
+    """
+
+    directory: Path
+    stats: CacheStats = field(default_factory=CacheStats)
+    max_bytes: int = 1 << 30
+    max_age: int = 30 * 24 * 60 * 60
+
+    # Bytes on disk, counted by the first prune
+    _size: int | None = field(init=False, default=None)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.directory / f"{key}.json", self.directory / f"{key}.body"
+
+    def _load(self, url: str) -> tuple[CacheEntry, bytes] | None:
+        entry_path, body_path = self._paths(url)
+        try:
+            entry = converter.loads(entry_path.read_bytes(), CacheEntry)
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        if (
+            entry.url != url
+            or entry.size != len(body)
+            or entry.sha256 != hashlib.sha256(body).hexdigest()
+        ):
+            return None
+        # Entries' modification times are when they were last used
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return entry, body
+
+    def _store(self, url: str, resp: httpx.Response) -> None:
+        entry = CacheEntry(
+            url,
+            etag=resp.headers.get("etag"),
+            last_modified=resp.headers.get("last-modified"),
+            size=len(resp.content),
+            sha256=hashlib.sha256(resp.content).hexdigest(),
+        )
+        if entry.etag is None and entry.last_modified is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry_path, body_path = self._paths(url)
+        # Entries are checked against the body's hash on load, so a stale
+        # entry is never paired with a new body (or the other way around)
+        written = 0
+        for path, contents in [
+            (body_path, resp.content),
+            (entry_path, converter.dumpb(entry)),
+        ]:
+            with NamedTemporaryFile(
+                dir=self.directory, prefix=f".{path.name}.", delete=False
+            ) as tmp:
+                tmp.write(contents)
+            try:
+                os.replace(tmp.name, path)
+            except OSError:
+                os.unlink(tmp.name)
+                raise
+            written += len(contents)
+        with self._lock:
+            if self._size is not None:
+                self._size += written
+            if self._size is None or self._size > self.max_bytes:
+                self._prune()
+
+    def prune(self) -> None:
+        """Evict responses that are too old, or too many, see HTTPCache."""
+
+        with self._lock:
+            self._prune()
+
+    def _prune(self) -> None:
+        entries: list[tuple[float, int, Path, Path]] = []
+        for entry_path in self.directory.glob("*.json"):
+            body_path = entry_path.with_suffix(".body")
+            try:
+                stat = entry_path.stat()
+                size = stat.st_size + body_path.stat().st_size
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, size, entry_path, body_path))
+        entries.sort()
+        size = sum(entry[1] for entry in entries)
+        cutoff = time() - self.max_age
+        # Least recently used first
+        for used, entry_size, entry_path, body_path in entries:
+            if size <= self.max_bytes and used > cutoff:
+                break
+            entry_path.unlink(missing_ok=True)
+            body_path.unlink(missing_ok=True)
+            size -= entry_size
+        self._size = size
+
+    async def get(self, client: httpx.AsyncClient, url: str) -> bytes:
+        """
+        Fetch the body at ``url``, reusing the cached copy if the server says
+        it's still fresh. Raises ``httpx.HTTPStatusError`` for error responses.
+        """
+
+        cached = await asyncio.to_thread(self._load, url)
+        headers: dict[str, str] = {}
+        if cached is not None:
+            entry, _ = cached
+            if entry.etag is not None:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified is not None:
+                headers["If-Modified-Since"] = entry.last_modified
+        resp = await client.get(url, headers=headers, follow_redirects=True)
+        if resp.status_code == 304 and cached is not None:
+            _, body = cached
+            self.stats.hits += 1
+            self.stats.bytes_saved += len(body)
+            return body
+        resp.raise_for_status()
+        self.stats.misses += 1
+        self.stats.bytes_downloaded += len(resp.content)
+        await asyncio.to_thread(self._store, url, resp)
+        return resp.content
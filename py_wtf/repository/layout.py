@@ -0,0 +1,58 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+from py_wtf.types import ProjectName
+
+LAYOUT_FILENAME = ".layout"
+
+_SHARD_RE = re.compile("[0-9a-f]+")
+
+
+@dataclass(slots=True, frozen=True)
+class Layout:
+    # Number of leading hex digits of the sha256 of a project's name used as the
+    # name of its shard directory. 0 keeps every project in the top directory.
+    shard_width: int = 0
+
+    def shard(self, key: ProjectName) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()[: self.shard_width]
+
+    def path(self, directory: Path, key: ProjectName, suffix: str) -> Path:
+        if not self.shard_width:
+            return directory / f"{key}{suffix}"
+        return directory / self.shard(key) / f"{key}{suffix}"
+
+    def relpath(self, key: ProjectName, suffix: str = ".json") -> str:
+        """Where a project file is relative to the directory, as a URL path."""
+
+        if not self.shard_width:
+            return f"{key}{suffix}"
+        return f"{self.shard(key)}/{key}{suffix}"
+
+
+FLAT = Layout()
+SHARDED = Layout(shard_width=2)
+
+
+def project_files(directory: Path) -> Iterable[Path]:
+    """
+    Every per-project file in ``directory``, regardless of which layout it was
+    written with.
+    """
+
+    for item in directory.iterdir():
+        if item.name.startswith("."):
+            continue
+        if item.is_file():
+            yield item
+        elif item.is_dir() and _SHARD_RE.fullmatch(item.name):
+            yield from (f for f in item.iterdir() if f.is_file())
+
+
+def split_project_file(path: Path) -> tuple[ProjectName, str]:
+    # Normalized project names never contain dots
+    key, dot, suffix = path.name.partition(".")
+    return ProjectName(key), f"{dot}{suffix}"
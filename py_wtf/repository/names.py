@@ -0,0 +1,81 @@
+import hashlib
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Collection, Iterable
+
+from py_wtf.repository.encoding import converter
+from py_wtf.types import ManifestEntry, ProjectName
+
+NAMES_DIRECTORY = ".names"
+
+
+def page_for(name: ProjectName) -> str:
+    """
+    The page listing ``name``. Project names are normalized, so this is their
+    first letter or digit.
+    """
+
+    first = name[:1]
+    return first if first.isascii() and first.isalnum() else "_"
+
+
+@dataclass(slots=True)
+class NameIndex:
+    """
+    Names of every indexed project, in pages by their first character, so
+    adding a project only rewrites the page it's on.
+    """
+
+    directory: Path
+
+    def page_path(self, page: str) -> Path:
+        return self.directory / f"{page}.json"
+
+    def read(self, page: str) -> list[ProjectName]:
+        try:
+            return converter.loads(self.page_path(page).read_bytes(), list[ProjectName])
+        except FileNotFoundError:
+            return []
+
+    def write(
+        self, names: Iterable[ProjectName], pages: Collection[str] | None = None
+    ) -> tuple[list[tuple[Path, ManifestEntry]], list[Path]]:
+        """
+        Add ``names`` to the pages they're on. With ``pages``, only those are
+        written and names already on them are kept. Otherwise every page is
+        rewritten with just ``names``, and pages left empty are removed.
+
+        Returns the manifest entries of the pages written, and the pages removed.
+        """
+
+        by_page: dict[str, set[ProjectName]] = defaultdict(set)
+        for name in names:
+            by_page[page_for(name)].add(name)
+
+        removed: list[Path] = []
+        if pages is None:
+            pages = by_page.keys()
+            for path in sorted(self.directory.glob("*.json")):
+                if path.stem not in by_page:
+                    path.unlink()
+                    removed.append(path)
+        else:
+            for page in pages:
+                by_page[page].update(self.read(page))
+
+        written: list[tuple[Path, ManifestEntry]] = []
+        self.directory.mkdir(exist_ok=True)
+        for page in sorted(pages):
+            if not by_page[page]:
+                continue
+            path = self.page_path(page)
+            contents = converter.dumpb(sorted(by_page[page]))
+            path.write_bytes(contents)
+            written.append(
+                (
+                    path,
+                    ManifestEntry(hashlib.sha256(contents).hexdigest(), len(contents)),
+                )
+            )
+        return written, removed
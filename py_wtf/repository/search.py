@@ -0,0 +1,287 @@
+import hashlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Collection, Iterable, Literal, NamedTuple
+
+from py_wtf.repository.encoding import converter
+from py_wtf.types import FQName, ManifestEntry, Project, ProjectName
+
+SEARCH_DIRECTORY = ".search"
+# Shards that got too big and were split into shards one character longer
+SPLITS_FILENAME = ".splits"
+# Which shards each project has entries in, a file per project
+PROJECTS_DIRECTORY = ".projects"
+SHARD_WIDTH = 2
+# Characters names are normalized to, a split shard has a child for each
+SHARD_ALPHABET = "_0123456789abcdefghijklmnopqrstuvwxyz"
+
+SymbolKind = Literal["module", "function", "variable", "class"]
+
+
+class SearchEntry(NamedTuple):
+    # A tuple so that shards are encoded as lists of lists, without repeating
+    # field names for every symbol
+    name: str
+    fqname: FQName
+    kind: SymbolKind
+    project: ProjectName
+    url: str
+
+
+def shard_for(name: str, splits: Collection[str] = frozenset()) -> str:
+    """
+    The shard holding symbols called ``name``. Leading underscores are skipped
+    so private and dunder names don't all end up in the same shard. Names in a
+    shard that was split go in the shard one character longer, unless the
+    name is that short.
+    """
+
+    key = "".join(
+        c if c.isascii() and c.isalnum() else "_" for c in name.lstrip("_").lower()
+    )
+    width = SHARD_WIDTH
+    while key[:width] in splits and len(key) > width:
+        width += 1
+    return key[:width] or "_"
+
+
+def _short_name(fqname: str) -> str:
+    return fqname.rpartition(".")[2]
+
+
+def _without_prefix(prefix: str, fqname: str) -> str:
+    return fqname.removeprefix(f"{prefix}.")
+
+
+def search_entries(project: Project) -> Iterable[SearchEntry]:
+    for module in project.modules:
+        module_url = f"/{project.name}/{module.name}"
+        yield SearchEntry(
+            _short_name(module.name), module.name, "module", project.name, module_url
+        )
+        symbols: list[tuple[SymbolKind, Iterable[FQName]]] = [
+            ("function", (f.name for f in module.functions)),
+            ("variable", (v.name for v in module.variables)),
+            ("class", (c.name for c in module.classes)),
+        ]
+        for kind, names in symbols:
+            for name in names:
+                yield SearchEntry(
+                    _short_name(name),
+                    name,
+                    kind,
+                    project.name,
+                    f"{module_url}/{_without_prefix(module.name, name)}",
+                )
+
+
+@dataclass(slots=True)
+class SearchIndex:
+    """
+    Symbols of every project, sharded by the prefix of their names. Shards
+    with more than ``max_shard_rows`` entries are split by a longer prefix.
+    Updating a project only rewrites the shards it has (or had) entries in,
+    rebuilding writes every shard once.
+    """
+
+    directory: Path
+    # Pending updates are written out once this many projects have them
+    flush_every: int = 100
+    max_shard_rows: int = 10_000
+
+    _splits: set[str] = field(init=False)
+    _pending: dict[ProjectName, list[SearchEntry]] = field(init=False)
+
+    def __post_init__(self) -> None:
+        try:
+            self._splits = set(
+                converter.loads(
+                    (self.directory / SPLITS_FILENAME).read_bytes(), list[str]
+                )
+            )
+        except FileNotFoundError:
+            self._splits = set()
+        self._pending = {}
+
+    def shard_path(self, shard: str) -> Path:
+        return self.directory / f"{shard}.json"
+
+    def projects_path(self, name: ProjectName) -> Path:
+        return self.directory / PROJECTS_DIRECTORY / f"{name}.json"
+
+    def shards_of(self, entries: Iterable[SearchEntry]) -> frozenset[str]:
+        return frozenset(shard_for(entry.name, self._splits) for entry in entries)
+
+    def _previous_shards(self, name: ProjectName) -> set[str]:
+        """
+        Shards ``name`` had entries in when it was last written. Its entries in
+        shards that were split since can be in any shard under them.
+        """
+
+        try:
+            shards = converter.loads(self.projects_path(name).read_bytes(), list[str])
+        except FileNotFoundError:
+            return set()
+        ret: set[str] = set()
+        while shards:
+            shard = shards.pop()
+            ret.add(shard)
+            if shard in self._splits:
+                shards.extend(f"{shard}{c}" for c in SHARD_ALPHABET)
+        return ret
+
+    def shards_to_update(self, projects: dict[ProjectName, frozenset[str]]) -> set[str]:
+        """Shards that updating ``projects`` (with their new shards) touches."""
+
+        ret: set[str] = set()
+        for name, shards in projects.items():
+            ret.update(shards, self._previous_shards(name))
+        return ret
+
+    def update(
+        self, project: Project
+    ) -> tuple[list[tuple[Path, ManifestEntry]], list[Path]]:
+        self._pending[project.name] = list(search_entries(project))
+        if len(self._pending) >= self.flush_every:
+            return self.flush()
+        return [], []
+
+    def flush(self) -> tuple[list[tuple[Path, ManifestEntry]], list[Path]]:
+        """
+        Write out pending updates. Returns the manifest entries of the shards
+        (and shard lists of projects) written, and the shards that were
+        removed because they became empty or were split.
+        """
+
+        touched: dict[str, dict[ProjectName, list[SearchEntry]]] = defaultdict(dict)
+        for name, entries in self._pending.items():
+            for shard in self._previous_shards(name):
+                touched[shard][name] = []
+            for entry in entries:
+                shard = shard_for(entry.name, self._splits)
+                touched[shard].setdefault(name, []).append(entry)
+        pending, self._pending = self._pending, {}
+
+        written: list[tuple[Path, ManifestEntry]] = []
+        removed: list[Path] = []
+        self.directory.mkdir(exist_ok=True)
+        for shard, updates in sorted(touched.items()):
+            path = self.shard_path(shard)
+            try:
+                rows = converter.loads(path.read_bytes(), list[SearchEntry])
+            except FileNotFoundError:
+                rows = []
+            rows = [row for row in rows if row.project not in updates]
+            for shard_entries in updates.values():
+                rows.extend(shard_entries)
+            shards = self._split(shard, rows) if rows else {}
+            for child, child_rows in shards.items():
+                written.append(self._write_shard(self.shard_path(child), child_rows))
+            if shard not in shards and path.exists():
+                path.unlink()
+                removed.append(path)
+        # After splitting, so the lists have the shards entries ended up in
+        for name, entries in pending.items():
+            written.append(self._write_projects(name, entries))
+        return written, removed
+
+    def _split(
+        self, shard: str, rows: list[SearchEntry]
+    ) -> dict[str, list[SearchEntry]]:
+        """
+        ``rows`` of ``shard`` by the shard they go in, splitting it (and the
+        shards it's split into) while there are too many.
+        """
+
+        ret: dict[str, list[SearchEntry]] = {}
+        pending = [(shard, rows)]
+        while pending:
+            shard, rows = pending.pop()
+            if len(rows) <= self.max_shard_rows or shard in self._splits:
+                ret[shard] = rows
+                continue
+            self._splits.add(shard)
+            children: dict[str, list[SearchEntry]] = defaultdict(list)
+            for row in rows:
+                children[shard_for(row.name, self._splits)].append(row)
+            if list(children) == [shard]:
+                # Every name is exactly the prefix, there's nothing to split by
+                self._splits.remove(shard)
+                ret[shard] = rows
+                continue
+            pending.extend(children.items())
+        return ret
+
+    def _write_shard(
+        self, path: Path, rows: list[SearchEntry]
+    ) -> tuple[Path, ManifestEntry]:
+        rows.sort()
+        return _write(path, converter.dumpb(rows))
+
+    def _write_projects(
+        self, name: ProjectName, entries: list[SearchEntry]
+    ) -> tuple[Path, ManifestEntry]:
+        return _write(
+            self.projects_path(name), converter.dumpb(sorted(self.shards_of(entries)))
+        )
+
+    def rebuild(
+        self, projects: Iterable[tuple[ProjectName, list[SearchEntry]]]
+    ) -> tuple[list[tuple[Path, ManifestEntry]], list[Path]]:
+        """
+        Replace the whole index with the entries of ``projects``. Every shard
+        is written once, after all of them have been collected and the ones
+        that are too big split. Returns the same as flush, and writes the
+        splits.
+        """
+
+        entries = dict(projects)
+        rows: dict[str, list[SearchEntry]] = defaultdict(list)
+        self._splits = set()
+        self._pending = {}
+        for project_entries in entries.values():
+            for entry in project_entries:
+                rows[shard_for(entry.name)].append(entry)
+        shards: dict[str, list[SearchEntry]] = {}
+        for shard, shard_rows in rows.items():
+            shards.update(self._split(shard, shard_rows))
+
+        self.directory.mkdir(exist_ok=True)
+        written = [
+            self._write_shard(self.shard_path(shard), shard_rows)
+            for shard, shard_rows in sorted(shards.items())
+        ]
+        written.extend(
+            self._write_projects(name, project_entries)
+            for name, project_entries in sorted(entries.items())
+        )
+        removed = [
+            path
+            for path in sorted(self.directory.glob("*.json"))
+            if path.stem not in shards
+        ] + [
+            path
+            for path in sorted(self.directory.glob(f"{PROJECTS_DIRECTORY}/*.json"))
+            if path.stem not in entries
+        ]
+        for path in removed:
+            path.unlink()
+        self._write_splits()
+        return written, removed
+
+    def _write_splits(self) -> None:
+        (self.directory / SPLITS_FILENAME).write_bytes(
+            converter.dumpb(sorted(self._splits))
+        )
+
+    def write(self) -> tuple[list[tuple[Path, ManifestEntry]], list[Path]]:
+        ret = self.flush()
+        self._write_splits()
+        return ret
+
+
+def _write(path: Path, contents: bytes) -> tuple[Path, ManifestEntry]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(contents)
+    return path, ManifestEntry(hashlib.sha256(contents).hexdigest(), len(contents))
@@ -0,0 +1,262 @@
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+from py_wtf.repository.compression import HashingWriter
+from py_wtf.repository.encoding import converter, encode_project
+from py_wtf.types import (
+    Documentation,
+    FQName,
+    Index,
+    Module,
+    Project,
+    ProjectMetadata,
+    ProjectName,
+    ProjectRecord,
+)
+
+_SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS projects (
+    name TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    upload_time INTEGER NOT NULL,
+    metadata TEXT NOT NULL,
+    documentation TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS projects_by_upload_time ON projects (upload_time);
+CREATE TABLE IF NOT EXISTS modules (
+    project TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (project, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dependencies (
+    project TEXT NOT NULL,
+    dependency TEXT NOT NULL,
+    PRIMARY KEY (project, dependency)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS dependencies_by_dependency ON dependencies (dependency);
+CREATE TABLE IF NOT EXISTS symbols (
+    id INTEGER PRIMARY KEY,
+    project TEXT NOT NULL,
+    fqname TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    documentation TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS symbols_by_project ON symbols (project);
+CREATE INDEX IF NOT EXISTS symbols_by_fqname ON symbols (fqname);
+CREATE VIRTUAL TABLE IF NOT EXISTS symbols_fts USING fts5 (
+    name, fqname, documentation, content='symbols', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS symbols_insert AFTER INSERT ON symbols BEGIN
+    INSERT INTO symbols_fts (rowid, name, fqname, documentation)
+    VALUES (new.id, new.name, new.fqname, new.documentation);
+END;
+CREATE TRIGGER IF NOT EXISTS symbols_delete AFTER DELETE ON symbols BEGIN
+    INSERT INTO symbols_fts (symbols_fts, rowid, name, fqname, documentation)
+    VALUES ('delete', old.id, old.name, old.fqname, old.documentation);
+END;
+"""
+
+_MAX_COUNTS = 5
+
+
+def _symbols(project: Project) -> Iterator[tuple[FQName, str, list[Documentation]]]:
+    for mod in project.modules:
+        yield mod.name, "module", mod.documentation
+        for func in mod.functions:
+            yield func.name, "function", func.documentation
+        for var in mod.variables:
+            yield var.name, "variable", var.documentation
+        for cls in mod.classes:
+            yield cls.name, "class", cls.documentation
+            for func in cls.methods:
+                yield func.name, "function", func.documentation
+            for var in [*cls.class_variables, *cls.instance_variables]:
+                yield var.name, "variable", var.documentation
+
+
+@dataclass(slots=True)
+class SQLiteBackend:
+    """
+    Keeps projects in an SQLite database: metadata, modules, dependency edges
+    and symbols in indexed tables, with full text search over the names and
+    documentation of symbols.
+    """
+
+    path: Path
+
+    _conn: sqlite3.Connection | None = field(init=False, default=None)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def load(self, key: ProjectName) -> tuple[Project, ProjectRecord, int]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT metadata, documentation, content_hash, size "
+                "FROM projects WHERE name = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                raise FileNotFoundError(f"{key} is not in {self.path}")
+            modules = conn.execute(
+                "SELECT data FROM modules WHERE project = ? ORDER BY position",
+                (key,),
+            ).fetchall()
+        metadata, documentation, content_hash, size = row
+        project = Project(
+            key,
+            converter.loads(metadata, ProjectMetadata),
+            converter.loads(documentation, list[Documentation]),
+            [converter.loads(data, Module) for data, in modules],
+        )
+        return project, ProjectRecord(project.metadata, content_hash), size
+
+    def save(self, project: Project) -> tuple[ProjectRecord, int]:
+        name = ProjectName(project.name)
+        modules: list[tuple[ProjectName, int, str, str]] = []
+
+        def add_module(module: Module, encoded: bytes) -> None:
+            modules.append((name, len(modules), module.name, encoded.decode()))
+
+        # Hash the project like it would be in a file, so records don't depend
+        # on where it's stored
+        contents = HashingWriter()
+        for chunk in encode_project(project, add_module):
+            contents.write(chunk)
+        record = ProjectRecord(project.metadata, contents.sha256.hexdigest())
+        deps = sorted({ProjectName(dep) for dep in project.metadata.dependencies})
+        symbols = [
+            (name, fqname, fqname.rpartition(".")[2], kind, "\n".join(docs))
+            for fqname, kind, docs in _symbols(project)
+        ]
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN")
+            try:
+                for table in ["modules", "dependencies", "symbols"]:
+                    conn.execute(f"DELETE FROM {table} WHERE project = ?", (name,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO projects (name, version, upload_time, "
+                    "metadata, documentation, content_hash, size) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        name,
+                        project.metadata.version,
+                        project.metadata.upload_time,
+                        converter.dumps(project.metadata),
+                        converter.dumps(project.documentation),
+                        record.content_hash,
+                        contents.size,
+                    ),
+                )
+                conn.executemany(
+                    "INSERT INTO modules (project, position, name, data) "
+                    "VALUES (?, ?, ?, ?)",
+                    modules,
+                )
+                conn.executemany(
+                    "INSERT INTO dependencies (project, dependency) VALUES (?, ?)",
+                    [(name, dep) for dep in deps],
+                )
+                conn.executemany(
+                    "INSERT INTO symbols (project, fqname, name, kind, documentation) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    symbols,
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return record, contents.size
+
+    def record(self, key: ProjectName) -> ProjectRecord:
+        with self._lock:
+            row = (
+                self._connection()
+                .execute(
+                    "SELECT metadata, content_hash FROM projects WHERE name = ?",
+                    (key,),
+                )
+                .fetchone()
+            )
+        if row is None:
+            raise FileNotFoundError(f"{key} is not in {self.path}")
+        metadata, content_hash = row
+        return ProjectRecord(converter.loads(metadata, ProjectMetadata), content_hash)
+
+    def names(self) -> list[ProjectName]:
+        with self._lock:
+            rows = (
+                self._connection()
+                .execute("SELECT name FROM projects ORDER BY name")
+                .fetchall()
+            )
+        return [ProjectName(name) for name, in rows]
+
+    def index(self, timestamp: int) -> Index:
+        with self._lock:
+            conn = self._connection()
+            latest = conn.execute(
+                "SELECT metadata FROM projects "
+                "ORDER BY upload_time DESC, name LIMIT ?",
+                (_MAX_COUNTS,),
+            ).fetchall()
+            top = conn.execute(
+                "SELECT metadata FROM ("
+                "  SELECT dependency, COUNT(*) AS dependents FROM dependencies"
+                "  GROUP BY dependency ORDER BY dependents DESC, dependency LIMIT ?"
+                ") JOIN projects ON name = dependency "
+                "ORDER BY dependents DESC, dependency",
+                (_MAX_COUNTS,),
+            ).fetchall()
+            names = conn.execute("SELECT name FROM projects ORDER BY name").fetchall()
+        return Index(
+            generated_at=timestamp,
+            latest_projects=[converter.loads(m, ProjectMetadata) for m, in latest],
+            top_projects=[converter.loads(m, ProjectMetadata) for m, in top],
+            all_project_names=[ProjectName(name) for name, in names],
+        )
+
+    def search(
+        self, query: str, limit: int = 20
+    ) -> list[tuple[ProjectName, FQName, str]]:
+        """Symbols whose name or documentation match the FTS5 ``query``."""
+
+        with self._lock:
+            rows = (
+                self._connection()
+                .execute(
+                    "SELECT project, symbols.fqname, kind FROM symbols_fts "
+                    "JOIN symbols ON symbols.id = symbols_fts.rowid "
+                    "WHERE symbols_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (query, limit),
+                )
+                .fetchall()
+            )
+        return [
+            (ProjectName(project), FQName(fqname), kind)
+            for project, fqname, kind in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,210 @@
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from py_wtf.types import FQName, Project, ProjectName, SymbolTable
+
+SYMBOLS_FILENAME = ".symbols.db"
+
+_SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS projects (
+    name TEXT PRIMARY KEY,
+    content_hash TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS symbols (
+    fqname TEXT NOT NULL,
+    project TEXT NOT NULL,
+    PRIMARY KEY (fqname, project)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS symbols_by_project ON symbols (project);
+"""
+
+# Read-only connections of this process, shared by every table view
+_readers: dict[Path, sqlite3.Connection] = {}
+
+
+def project_symbols(project: Project) -> Iterator[FQName]:
+    for mod in project.modules:
+        yield FQName(mod.name)
+        for exp in mod.exports:
+            yield exp.name
+        for func in mod.functions:
+            yield FQName(func.name)
+        for var in mod.variables:
+            yield FQName(var.name)
+        for cls in mod.classes:
+            yield FQName(cls.name)
+            for func in cls.methods:
+                yield FQName(func.name)
+            for var in cls.class_variables:
+                yield FQName(var.name)
+            for var in cls.instance_variables:
+                yield FQName(var.name)
+            # TODO: inner classes and more
+
+
+@dataclass(slots=True)
+class SymbolIndex:
+    """
+    Which project defines each symbol, for every project in a repository. The
+    symbols of a project are stored along with the content hash of the
+    project they came from, so stale ones can be detected.
+    """
+
+    path: Path
+
+    _conn: sqlite3.Connection | None = field(init=False, default=None)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def content_hash(self, name: ProjectName) -> str | None:
+        with self._lock:
+            row = (
+                self._connection()
+                .execute("SELECT content_hash FROM projects WHERE name = ?", (name,))
+                .fetchone()
+            )
+        return None if row is None else row[0]
+
+    def update(self, project: Project) -> None:
+        """
+        Replace the symbols of ``project``. Its content hash is unknown until
+        set_content_hash is called.
+        """
+
+        name = ProjectName(project.name)
+        symbols = [(fqname, name) for fqname in project_symbols(project)]
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN")
+            try:
+                conn.execute("DELETE FROM symbols WHERE project = ?", (name,))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO symbols (fqname, project) VALUES (?, ?)",
+                    symbols,
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO projects (name, content_hash) "
+                    "VALUES (?, NULL)",
+                    (name,),
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def set_content_hash(self, name: ProjectName, content_hash: str) -> None:
+        with self._lock:
+            self._connection().execute(
+                "UPDATE projects SET content_hash = ? WHERE name = ?",
+                (content_hash, name),
+            )
+
+    def remove(self, name: ProjectName) -> None:
+        """Forget the symbols of ``name``, which isn't in the repository anymore."""
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN")
+            try:
+                conn.execute("DELETE FROM symbols WHERE project = ?", (name,))
+                conn.execute("DELETE FROM projects WHERE name = ?", (name,))
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def table(self, projects: Iterable[ProjectName]) -> "SymbolIndexTable":
+        return SymbolIndexTable(self.path, list(projects))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SymbolIndexTable(SymbolTable):
+    """
+    A read-only SymbolTable of the symbols of ``projects``, backed by a
+    SymbolIndex. Nothing is loaded up front, and pickling it (to send it to
+    another process) only copies the database path and the project names.
+    When several projects define a symbol, the one listed last wins.
+    """
+
+    def __init__(self, path: Path, projects: list[ProjectName]) -> None:
+        super().__init__()
+        self._path = path
+        self._projects = projects
+        self._order = {name: i for i, name in enumerate(projects)}
+        self._placeholders = ", ".join("?" * len(projects))
+
+    def __getstate__(self) -> tuple[Path, list[ProjectName]]:
+        return self._path, self._projects
+
+    def __setstate__(self, state: tuple[Path, list[ProjectName]]) -> None:
+        self.__init__(*state)
+
+    def _reader(self) -> sqlite3.Connection:
+        if (conn := _readers.get(self._path)) is None:
+            conn = _readers[self._path] = sqlite3.connect(
+                f"{self._path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA mmap_size = 268435456")
+        return conn
+
+    def _lookup(self, key: FQName) -> ProjectName | None:
+        # Found symbols are kept in self.data, so they're only looked up once
+        if key in self.data:
+            return self.data[key]
+        if not self._projects:
+            return None
+        rows = (
+            self._reader()
+            .execute(
+                f"SELECT project FROM symbols WHERE fqname = ? "
+                f"AND project IN ({self._placeholders})",
+                (key, *self._projects),
+            )
+            .fetchall()
+        )
+        if not rows:
+            return None
+        project = max(
+            (ProjectName(row[0]) for row in rows), key=self._order.__getitem__
+        )
+        self.data[key] = project
+        return project
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._lookup(FQName(key)) is not None
+
+    def __getitem__(self, key: FQName) -> ProjectName:
+        if (project := self._lookup(key)) is not None:
+            return project
+        return self.__missing__(key)
+
+    def __iter__(self) -> Iterator[FQName]:
+        if not self._projects:
+            return iter([])
+        rows = self._reader().execute(
+            f"SELECT DISTINCT fqname FROM symbols "
+            f"WHERE project IN ({self._placeholders})",
+            self._projects,
+        )
+        return (FQName(row[0]) for row in rows)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
@@ -0,0 +1,246 @@
+import hashlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Literal, NamedTuple
+
+from py_wtf.repository.encoding import converter
+from py_wtf.repository.search import shard_for
+from py_wtf.types import (
+    FQName,
+    ManifestEntry,
+    Project,
+    ProjectName,
+    stdlib_project,
+    Type,
+    XRef,
+)
+
+USAGES_DIRECTORY = ".usages"
+# Which shards every project has usages in
+SOURCES_FILENAME = ".sources"
+
+UsageKind = Literal["export", "parameter", "return", "variable"]
+
+
+class Usage(NamedTuple):
+    # A tuple so that shards are encoded as lists of lists, like search shards
+    project: ProjectName
+    # The symbol whose export, parameter, return or variable type has the xref
+    fqname: FQName
+    kind: UsageKind
+
+
+def _type_xrefs(
+    source: FQName, kind: UsageKind, typ: Type | None
+) -> Iterable[tuple[FQName, UsageKind, XRef]]:
+    if typ is None:
+        return
+    if typ.xref is not None:
+        yield source, kind, typ.xref
+    for param in typ.params or []:
+        yield from _type_xrefs(source, kind, param)
+
+
+def xrefs(project: Project) -> Iterable[tuple[FQName, FQName, UsageKind, XRef]]:
+    """
+    Every xref in ``project``, with the module and symbol it's in and how the
+    symbol uses it.
+    """
+
+    for module in project.modules:
+        for export in module.exports:
+            yield module.name, export.name, "export", export.xref
+        functions = list(module.functions)
+        variables = list(module.variables)
+        classes = list(module.classes)
+        while classes:
+            cls = classes.pop()
+            functions.extend(cls.methods)
+            variables.extend(cls.class_variables)
+            variables.extend(cls.instance_variables)
+            classes.extend(cls.inner_classes)
+        for func in functions:
+            for param in func.params:
+                for xref in _type_xrefs(func.name, "parameter", param.type):
+                    yield module.name, *xref
+            for xref in _type_xrefs(func.name, "return", func.returns):
+                yield module.name, *xref
+        for var in variables:
+            for xref in _type_xrefs(var.name, "variable", var.type):
+                yield module.name, *xref
+
+
+def usages(project: Project) -> dict[str, dict[FQName, set[Usage]]]:
+    """
+    Usages of symbols of other projects in ``project``, by the shard they go
+    in. Xrefs within the project itself and into the standard library aren't
+    usages.
+    """
+
+    ret: dict[str, dict[FQName, set[Usage]]] = defaultdict(lambda: defaultdict(set))
+    for _, source, kind, xref in xrefs(project):
+        target = xref.project
+        if target is None or target == project.name or target == stdlib_project:
+            continue
+        shard = f"{target}/{shard_for(xref.fqname.rpartition('.')[2])}"
+        ret[shard][xref.fqname].add(Usage(project.name, source, kind))
+    return {shard: dict(shard_usages) for shard, shard_usages in ret.items()}
+
+
+def usage_shards(project: Project) -> frozenset[str]:
+    return frozenset(usages(project))
+
+
+@dataclass(slots=True)
+class UsageIndex:
+    """
+    Reverse xrefs: which symbols of which projects use each symbol, in a
+    directory per used project sharded like the search index. Updating a
+    project replaces all of its usages, so usages it no longer has go away;
+    rebuilding writes every shard once.
+    """
+
+    directory: Path
+    # Pending updates are written out once this many projects have them
+    flush_every: int = 100
+
+    _shards: dict[ProjectName, list[str]] = field(init=False)
+    _pending: dict[ProjectName, dict[str, dict[FQName, set[Usage]]]] = field(init=False)
+
+    def __post_init__(self) -> None:
+        try:
+            self._shards = converter.loads(
+                (self.directory / SOURCES_FILENAME).read_bytes(),
+                dict[ProjectName, list[str]],
+            )
+        except FileNotFoundError:
+            self._shards = {}
+        self._pending = {}
+
+    def shard_path(self, shard: str) -> Path:
+        return self.directory / f"{shard}.json"
+
+    def read(self, shard: str) -> dict[FQName, list[Usage]]:
+        try:
+            return converter.loads(
+                self.shard_path(shard).read_bytes(), dict[FQName, list[Usage]]
+            )
+        except FileNotFoundError:
+            return {}
+
+    def shards_to_update(self, projects: dict[ProjectName, frozenset[str]]) -> set[str]:
+        """Shards that updating ``projects`` (with their new shards) touches."""
+
+        ret: set[str] = set()
+        for name, shards in projects.items():
+            ret.update(shards, self._shards.get(name, []))
+        return ret
+
+    def update(
+        self, project: Project
+    ) -> tuple[list[tuple[Path, ManifestEntry]], list[Path]]:
+        self._pending[project.name] = usages(project)
+        if len(self._pending) >= self.flush_every:
+            return self.flush()
+        return [], []
+
+    def flush(self) -> tuple[list[tuple[Path, ManifestEntry]], list[Path]]:
+        """
+        Write out pending updates. Returns the manifest entries of the shards
+        written, and the shards that were removed because they became empty.
+        """
+
+        touched: dict[str, dict[ProjectName, dict[FQName, set[Usage]]]] = defaultdict(
+            dict
+        )
+        for name, shards in self._pending.items():
+            for shard in self._shards.get(name, []):
+                touched[shard][name] = {}
+            for shard, shard_usages in shards.items():
+                touched[shard][name] = shard_usages
+            self._shards[name] = sorted(shards)
+        self._pending = {}
+
+        written: list[tuple[Path, ManifestEntry]] = []
+        removed: list[Path] = []
+        for shard, updates in sorted(touched.items()):
+            path = self.shard_path(shard)
+            rows: dict[FQName, set[Usage]] = defaultdict(set)
+            for fqname, shard_usages in self.read(shard).items():
+                rows[fqname].update(u for u in shard_usages if u.project not in updates)
+            for project_usages in updates.values():
+                for fqname, shard_usages in project_usages.items():
+                    rows[fqname].update(shard_usages)
+            entries = {
+                fqname: sorted(shard_usages)
+                for fqname, shard_usages in sorted(rows.items())
+                if shard_usages
+            }
+            if not entries:
+                if path.exists():
+                    path.unlink()
+                    removed.append(path)
+                continue
+            written.append(self._write_shard(path, entries))
+        return written, removed
+
+    def _write_shard(
+        self, path: Path, entries: dict[FQName, list[Usage]]
+    ) -> tuple[Path, ManifestEntry]:
+        contents = converter.dumpb(entries)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(contents)
+        return path, ManifestEntry(hashlib.sha256(contents).hexdigest(), len(contents))
+
+    def rebuild(
+        self,
+        projects: Iterable[tuple[ProjectName, dict[str, dict[FQName, set[Usage]]]]],
+    ) -> tuple[list[tuple[Path, ManifestEntry]], list[Path]]:
+        """
+        Replace the whole index with the usages of ``projects``, by shard (see
+        usages). Every shard is written once, after all of them have been
+        collected. Returns the same as flush, and writes the sources.
+        """
+
+        rows: dict[str, dict[FQName, set[Usage]]] = defaultdict(
+            lambda: defaultdict(set)
+        )
+        self._shards = {}
+        self._pending = {}
+        for name, shards in projects:
+            self._shards[name] = sorted(shards)
+            for shard, shard_usages in shards.items():
+                for fqname, fqname_usages in shard_usages.items():
+                    rows[shard][fqname].update(fqname_usages)
+
+        written = [
+            self._write_shard(
+                self.shard_path(shard),
+                {
+                    fqname: sorted(fqname_usages)
+                    for fqname, fqname_usages in sorted(shard_rows.items())
+                },
+            )
+            for shard, shard_rows in sorted(rows.items())
+        ]
+        removed = [
+            path
+            for path in sorted(self.directory.glob("*/*.json"))
+            if path.relative_to(self.directory).with_suffix("").as_posix() not in rows
+        ]
+        for path in removed:
+            path.unlink()
+        self._write_sources()
+        return written, removed
+
+    def _write_sources(self) -> None:
+        self.directory.mkdir(exist_ok=True)
+        (self.directory / SOURCES_FILENAME).write_bytes(
+            converter.dumpb(dict(sorted(self._shards.items())))
+        )
+
+    def write(self) -> tuple[list[tuple[Path, ManifestEntry]], list[Path]]:
+        ret = self.flush()
+        self._write_sources()
+        return ret
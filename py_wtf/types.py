@@ -3,8 +3,8 @@ from __future__ import annotations
 import sys
 from collections import UserDict
 
-from dataclasses import dataclass
-from typing import NewType, TYPE_CHECKING
+from dataclasses import dataclass, field
+from typing import Literal, NewType, TYPE_CHECKING
 
 if not TYPE_CHECKING:
     NewType = lambda _, ty: ty
@@ -108,6 +108,25 @@ class Project:
     modules: list[Module]
 
 
+@dataclass(slots=True, frozen=True)
+class ModuleEntry:
+    name: FQName
+    sha256: str
+    size: int
+
+
+@dataclass(slots=True, frozen=True)
+class ProjectManifest:
+    """A project with each of its modules stored in a separate file."""
+
+    name: ProjectName
+    metadata: ProjectMetadata
+    documentation: list[Documentation]
+    modules: list[ModuleEntry]
+    # Of the project encoded as a single file
+    content_hash: str
+
+
 Timestamp = int
 
 
@@ -119,6 +138,72 @@ class Index:
     all_project_names: list[ProjectName]
 
 
+@dataclass(slots=True, frozen=True)
+class IndexMetadata:
+    """What of the Index is published in .metadata, the names go in pages."""
+
+    generated_at: Timestamp
+    latest_projects: list[ProjectMetadata]
+    top_projects: list[ProjectMetadata]
+    project_count: int = 0
+
+
+@dataclass(slots=True, frozen=True)
+class ProjectRecord:
+    metadata: ProjectMetadata
+    content_hash: str
+
+
+@dataclass(slots=True, frozen=True)
+class ManifestEntry:
+    sha256: str
+    size: int
+
+
+@dataclass(slots=True, frozen=True)
+class VersionEntry:
+    version: str
+    content_hash: str
+
+
+FailureReason = Literal["not-found", "download"]
+
+
+@dataclass(slots=True, frozen=True)
+class Failure:
+    reason: FailureReason
+    # The latest version on PyPI when indexing failed, if it got that far
+    version: str | None
+    failed_at: Timestamp
+    expires_at: Timestamp
+
+
+@dataclass(slots=True, frozen=True)
+class AggregateEntry:
+    version: str
+    upload_time: Timestamp
+    dependencies: list[ProjectName]
+
+
+@dataclass(slots=True)
+class IndexAggregate:
+    projects: dict[ProjectName, AggregateEntry] = field(default_factory=dict)
+    dependency_counts: dict[ProjectName, int] = field(default_factory=dict)
+
+    def update(self, name: ProjectName, metadata: ProjectMetadata) -> None:
+        if (old := self.projects.get(name)) is not None:
+            for dep in old.dependencies:
+                self.dependency_counts[dep] -= 1
+                if not self.dependency_counts[dep]:
+                    del self.dependency_counts[dep]
+        deps = sorted({ProjectName(dep) for dep in metadata.dependencies})
+        self.projects[name] = AggregateEntry(
+            metadata.version, metadata.upload_time, deps
+        )
+        for dep in deps:
+            self.dependency_counts[dep] = self.dependency_counts.get(dep, 0) + 1
+
+
 stdlib_project = ProjectName("--std--")
 
 
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+"""
+Compare the plain and compact encodings of the projects in an index directory,
+e.g. one written by `python -m py_wtf index-top-pypi`.
+"""
+
+import gzip
+import logging
+import sys
+import time
+from pathlib import Path
+
+from py_wtf.repository.compact import decode_compact, encode_compact
+from py_wtf.repository.encoding import make_converter
+from py_wtf.types import Project
+
+log = logging.getLogger()
+
+
+def main(directory: Path, backend: str = "json") -> None:
+    converter = make_converter("orjson" if backend == "orjson" else "json")
+    totals = {"plain": [0, 0, 0.0, 0.0], "compact": [0, 0, 0.0, 0.0]}
+    count = 0
+    for path in sorted(directory.glob("**/*.json")):
+        if path.name.startswith(".") or path.parent.name.startswith("."):
+            continue
+        try:
+            project = converter.loads(path.read_bytes(), Project)
+        except Exception:
+            log.debug(f"Skipping {path}, it's not a plain project file")
+            continue
+        count += 1
+
+        start = time.perf_counter()
+        plain = converter.dumpb(project)
+        encoded = time.perf_counter()
+        converter.loads(plain, Project)
+        decoded = time.perf_counter()
+        stats = totals["plain"]
+        stats[0] += len(plain)
+        stats[1] += len(gzip.compress(plain))
+        stats[2] += encoded - start
+        stats[3] += decoded - encoded
+
+        start = time.perf_counter()
+        compact = b"".join(encode_compact(project, converter))
+        encoded = time.perf_counter()
+        roundtripped = decode_compact(compact, converter)
+        decoded = time.perf_counter()
+        if roundtripped != project:
+            log.error(f"{path} doesn't round trip through the compact encoding")
+        stats = totals["compact"]
+        stats[0] += len(compact)
+        stats[1] += len(gzip.compress(compact))
+        stats[2] += encoded - start
+        stats[3] += decoded - encoded
+
+    if not count:
+        log.error(f"No project files in {directory}")
+        return
+    log.info(f"{count} projects, encoded with {converter.backend}")
+    base_size, base_gzip = totals["plain"][0], totals["plain"][1]
+    for name, (size, gzipped, encode, decode) in totals.items():
+        log.info(
+            f"{name:>8}: {size:>12,} bytes ({size / base_size:.0%}), "
+            f"{gzipped:>12,} gzipped ({gzipped / base_gzip:.0%}), "
+            f"encode {encode:.3f}s, decode {decode:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if len(sys.argv) not in (2, 3):
+        sys.exit(f"Usage: {sys.argv[0]} DIRECTORY [json|orjson]")
+    main(Path(sys.argv[1]), *sys.argv[2:])
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""
+Compare cycle detection with networkx's find_cycle, which the indexer used to
+run for every dependency edge, against DependencyGraph, on a synthetic
+dependency graph shaped like PyPI's: a few projects that almost everything
+depends on, a long tail of projects few depend on, and the odd cycle.
+"""
+
+import logging
+import random
+import sys
+import time
+from bisect import bisect
+from itertools import accumulate
+from typing import Callable
+
+from networkx import DiGraph, find_cycle, NetworkXNoCycle
+
+from py_wtf.indexer.depgraph import DependencyGraph
+from py_wtf.types import ProjectName
+
+log = logging.getLogger()
+
+
+def synthetic_edges(
+    edges: int, projects: int, seed: int = 0
+) -> list[tuple[ProjectName, ProjectName]]:
+    rng = random.Random(seed)
+    names = [ProjectName(f"project-{i}") for i in range(projects)]
+    # Popularity falls off like a power law, and projects mostly depend on
+    # more popular ones that were released before them
+    cumulative = list(accumulate(1 / (i + 1) ** 1.1 for i in range(projects)))
+
+    def popular(below: int) -> int:
+        return bisect(cumulative, rng.random() * cumulative[below - 1])
+
+    ret: list[tuple[ProjectName, ProjectName]] = []
+    while len(ret) < edges:
+        if rng.random() < 0.01:
+            # Now and then a popular project depends on one that depends on
+            # it in turn, like plugins of documentation generators do
+            i = popular(projects)
+            ret.append((names[i], names[rng.randrange(i, projects)]))
+            continue
+        i = rng.randrange(1, projects)
+        for _ in range(min(rng.randint(1, 8), edges - len(ret))):
+            ret.append((names[i], names[popular(i)]))
+    # Projects are indexed, and their dependencies found, in no particular order
+    rng.shuffle(ret)
+    return ret
+
+
+def check_with_networkx() -> Callable[[ProjectName, ProjectName], bool]:
+    depgraph: DiGraph[ProjectName] = DiGraph()
+
+    def add_edge(a: ProjectName, b: ProjectName) -> bool:
+        depgraph.add_edge(a, b)
+        try:
+            find_cycle(depgraph, source=a, orientation="original")  # type: ignore
+        except NetworkXNoCycle:
+            return True
+        depgraph.remove_edge(a, b)
+        return False
+
+    return add_edge
+
+
+def check_incrementally() -> Callable[[ProjectName, ProjectName], bool]:
+    return DependencyGraph().add_edge
+
+
+def main(edges: int = 100_000, projects: int = 25_000) -> None:
+    workload = synthetic_edges(edges, projects)
+    log.info(f"{len(workload):,} edges between {projects:,} projects")
+    results = {}
+    for name, make in [
+        ("DependencyGraph", check_incrementally),
+        ("networkx", check_with_networkx),
+    ]:
+        add_edge = make()
+        start = time.perf_counter()
+        results[name] = [add_edge(a, b) for a, b in workload]
+        elapsed = time.perf_counter() - start
+        rejected = results[name].count(False)
+        log.info(
+            f"{name:>16}: {elapsed:8.3f}s, {elapsed / len(workload) * 1e6:8.2f}µs "
+            f"per edge, {rejected:,} edges would have closed a cycle"
+        )
+    if len({tuple(added) for added in results.values()}) != 1:
+        log.error("The two disagree on which edges close cycles")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if len(sys.argv) > 3:
+        sys.exit(f"Usage: {sys.argv[0]} [EDGES [PROJECTS]]")
+    main(*map(int, sys.argv[1:]))
@@ -58,8 +58,11 @@ async def main() -> None:
     await shell("uv", "--version")
     await shell(NPM, "--version")
     index_dir = toplevel / "www" / "public" / "_index"
-    for item in index_dir.glob("*.json"):
-        item.unlink()
+    # Records and the symbol index go too, or the projects they're for would
+    # count as indexed
+    for pattern in ["**/*.json", "**/*.meta", ".symbols.db*"]:
+        for item in index_dir.glob(pattern):
+            item.unlink()
 
     subprocess.run(
         ["uv", "run", "py-wtf", "index-top-pypi", str(index_dir), "--top=10"]
@@ -0,0 +1,28 @@
+from py_wtf.indexer.depgraph import DependencyGraph
+from py_wtf.types import ProjectName
+
+a, b, c, d = (ProjectName(name) for name in "abcd")
+
+
+def test_add_edge_rejects_cycles() -> None:
+    graph = DependencyGraph()
+    assert graph.add_edge(a, b)
+    assert graph.add_edge(b, c)
+    assert not graph.add_edge(c, a)
+    assert not graph.add_edge(d, d)
+    assert graph.add_edge(a, c)
+    assert set(graph.edges()) == {(a, b), (b, c), (a, c)}
+
+
+def test_add_edge_reorders() -> None:
+    graph = DependencyGraph()
+    for name in [d, c, b, a]:
+        graph.add_node(name)
+    # Every edge goes against the order they were added in
+    assert graph.add_edge(a, b)
+    assert graph.add_edge(b, c)
+    assert graph.add_edge(c, d)
+    assert not graph.add_edge(d, a)
+    assert graph.waves([a, b, c, d]) == [[d], [c], [b], [a]]
+    # Only edges between the given projects count
+    assert graph.waves([a, c]) == [[a, c]]
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import pytest
+
+from py_wtf.indexer.http import ClientConfig, ClientMetrics, make_client
+from py_wtf.indexer.pypi import index_project
+from py_wtf.repository import converter, ProjectRepository
+from py_wtf.types import Project, VersionEntry
+
+from pytest_httpx import HTTPXMock
+
+
+@pytest.mark.asyncio
+async def test_index_project_shares_client(
+    tmp_path: Path, httpx_mock: HTTPXMock, project: Project
+) -> None:
+    version = project.metadata.version
+    httpx_mock.add_response(
+        url=f"https://pypi.org/pypi/{project.name}/json",
+        json={"info": {"version": version}, "releases": {version: []}},
+    )
+    httpx_mock.add_response(
+        url=f"https://py.wtf/_index/{project.name}.json",
+        content=converter.dumps(project).encode(),
+    )
+    httpx_mock.add_response(url="https://py.wtf/_index/other.json", status_code=404)
+    repo = ProjectRepository(
+        tmp_path, remote_versions={project.name: VersionEntry(version, "")}
+    )
+    metrics = ClientMetrics()
+
+    async with make_client(ClientConfig(max_connections=2), metrics) as client:
+        [indexed] = [
+            proj async for proj in index_project(project.name, repo, client=client)
+        ]
+        # The client outlives the projects indexed with it
+        assert not client.is_closed
+        await client.get("https://py.wtf/_index/other.json")
+
+    assert indexed == project
+    assert set(metrics.hosts) == {"pypi.org", "py.wtf"}
+    assert metrics.hosts["pypi.org"].requests == 1
+    assert metrics.hosts["py.wtf"].requests == 2
+    assert metrics.hosts["py.wtf"].errors == 1
@@ -0,0 +1,92 @@
+from dataclasses import replace
+from pathlib import Path
+from textwrap import dedent
+
+import pytest
+
+from py_wtf.indexer.file import index_file
+from py_wtf.indexer.link import link, Linker
+from py_wtf.types import FQName, Project, ProjectName, SymbolTable
+
+dep = ProjectName("dependency")
+symbols = {
+    FQName("dependencyproject"): dep,
+    FQName("dependencyproject.helper"): dep,
+    FQName("dependencyproject.Thing"): dep,
+    # The project's own namespace package, which the dependency shares
+    FQName("ns"): dep,
+}
+
+
+@pytest.fixture
+def package_dir(tmp_path: Path) -> Path:
+    files = {
+        "ns/mine/__init__.py": """
+            import dependencyproject
+            from dependencyproject import helper, Thing
+            from os import path
+
+            class Local:
+                def meth(self, other: "Local") -> dependencyproject.Other: ...
+
+            def func(
+                thing: Thing, where: path, n: int, l: list[Thing]
+            ) -> dict[str, Local]: ...
+
+            __all__ = ["helper", "Local"]
+            """,
+        "ns/mine/sub.py": """
+            from ns.mine import Local
+            from dependencyproject import Thing
+            x: Local
+            y: Thing
+            """,
+    }
+    for name, code in files.items():
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(dedent(code))
+    return tmp_path
+
+
+def index(package_dir: Path, symbols: SymbolTable, project: Project) -> Project:
+    return replace(
+        project,
+        modules=[
+            index_file(package_dir, path, symbols)
+            for path in sorted(package_dir.rglob("*.py"))
+        ],
+    )
+
+
+def test_link_like_parsing_with_symbols(package_dir: Path, project: Project) -> None:
+    parsed = index(package_dir, SymbolTable(symbols), project)
+    unlinked = index(package_dir, SymbolTable(), project)
+    assert unlinked != parsed
+
+    linked = link(unlinked, SymbolTable(symbols))
+
+    assert linked == parsed
+    # Linking again doesn't change anything, or copy anything
+    assert link(linked, SymbolTable(symbols)) is linked
+
+
+def test_link_again_with_new_symbols(package_dir: Path, project: Project) -> None:
+    # Before the dependency was indexed
+    linked = link(index(package_dir, SymbolTable(), project), SymbolTable())
+    [_, sub] = linked.modules
+    [x, y] = sub.variables
+    assert y.type is not None and y.type.xref is not None
+    assert y.type.xref.project is None
+
+    linker = Linker(SymbolTable(symbols))
+    relinked = linker.project(linked)
+
+    assert linker.changed > 0
+    [_, new_sub] = relinked.modules
+    [new_x, new_y] = new_sub.variables
+    assert new_y.type is not None and new_y.type.xref is not None
+    assert new_y.type.xref.project == dep
+    # The project's own symbols aren't attributed to the namespace package it
+    # shares with the dependency, and are kept as they were
+    assert new_x is x
+    assert relinked == index(package_dir, SymbolTable(symbols), project)
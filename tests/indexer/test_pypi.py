@@ -1,4 +1,5 @@
 import json
+from functools import partial
 from pathlib import Path
 from tarfile import TarFile
 from zipfile import ZipFile
@@ -7,13 +8,17 @@ import httpx
 import pytest
 
 from py_wtf.indexer.pypi import (
-    _build_symbol_table,
     Artifact,
     download,
     fetch_pypi_metadata,
+    index_project,
+    is_unchanged,
     pick_artifact,
+    ProjectNotFound,
 )
-from py_wtf.types import FQName, Project
+from py_wtf.repository import converter, ProjectRepository
+from py_wtf.repository.failures import KnownFailure
+from py_wtf.types import FQName, Project, ProjectName, VersionEntry
 
 from pytest_httpx import HTTPXMock
 
@@ -114,8 +119,10 @@ async def test_no_extras_in_deps(httpx_mock: HTTPXMock, pypi_json: bytes) -> Non
     assert "aiohttp" not in metadata.dependencies
 
 
-def test_symbol_table_building(project: Project) -> None:
-    table = _build_symbol_table([project])
+def test_symbol_table_building(tmp_path: Path, project: Project) -> None:
+    repo = ProjectRepository(tmp_path)
+    repo._save(project)
+    table = repo.symbol_table([project.name])
     assert table[FQName("foo")] == "testproject"
 
 
@@ -188,3 +195,95 @@ def test_pick_artifact_skips_yanked(
     assert pick_artifact([sdist_artifact, pure_python_artifact]) == sdist_artifact
     sdist_artifact["yanked"] = True
     assert pick_artifact([sdist_artifact, pure_python_artifact]) is None
+
+
+@pytest.mark.parametrize(
+    ("indexed", "uploaded", "unchanged"),
+    [
+        ("1.0", ["1.0"], True),
+        ("1.0", ["0.9.1", "1.0"], True),
+        ("1.0", ["1.0", "1.1rc1"], False),
+        ("nightly", ["nightly"], True),
+        ("nightly", ["1.0"], False),
+    ],
+)
+def test_is_unchanged(indexed: str, uploaded: list[str], unchanged: bool) -> None:
+    assert is_unchanged(VersionEntry(indexed, ""), uploaded) == unchanged
+    assert not is_unchanged(None, uploaded)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("known", [False, True])
+async def test_index_project_consults_remote_versions(
+    tmp_path: Path, httpx_mock: HTTPXMock, project: Project, known: bool
+) -> None:
+    version = project.metadata.version
+    httpx_mock.add_response(
+        url=f"https://pypi.org/pypi/{project.name}/json",
+        json={"info": {"version": version}, "releases": {version: []}},
+    )
+    remote_versions = {}
+    if known:
+        remote_versions[project.name] = VersionEntry(version, "")
+        httpx_mock.add_response(
+            url=f"https://py.wtf/_index/{project.name}.json",
+            content=converter.dumps(project).encode(),
+        )
+    repo = ProjectRepository(tmp_path, remote_versions=remote_versions)
+
+    [indexed] = [proj async for proj in index_project(project.name, repo)]
+
+    # Unknown projects aren't fetched from py.wtf at all
+    assert (indexed == project) == known
+
+
+@pytest.mark.asyncio
+async def test_index_project_remembers_failures(
+    tmp_path: Path, httpx_mock: HTTPXMock
+) -> None:
+    name = ProjectName("missing")
+    httpx_mock.add_response(url=f"https://pypi.org/pypi/{name}/json", status_code=404)
+    repo = ProjectRepository(tmp_path, remote_versions={})
+    with pytest.RaisesGroup(ProjectNotFound):
+        await repo.get(name, partial(index_project, repo=repo))
+    await repo.aclose()
+
+    # the next run doesn't ask PyPI again
+    repo = ProjectRepository(tmp_path, remote_versions={})
+    with pytest.raises(KnownFailure, match="not-found"):
+        await repo.get(name, partial(index_project, repo=repo))
+    # and doesn't count it as indexed
+    assert name not in repo
+    assert not await repo.indexed(name)
+    assert not repo._cache
+    await repo.aclose()
+
+    # unless it has a new version
+    httpx_mock.add_response(url=f"https://pypi.org/pypi/{name}/json", status_code=404)
+    repo = ProjectRepository(tmp_path, remote_versions={})
+    repo.retry_updated({name: ["1.0"]})
+    with pytest.RaisesGroup(ProjectNotFound):
+        await repo.get(name, partial(index_project, repo=repo))
+    await repo.aclose()
+
+
+@pytest.mark.asyncio
+async def test_index_project_without_artifact(
+    tmp_path: Path, httpx_mock: HTTPXMock, project: Project
+) -> None:
+    version = project.metadata.version
+    httpx_mock.add_response(
+        url=f"https://pypi.org/pypi/{project.name}/json",
+        json={"info": {"version": version}, "releases": {version: []}},
+    )
+    repo = ProjectRepository(tmp_path, remote_versions={})
+
+    stub = await repo.get(project.name, partial(index_project, repo=repo))
+    await repo.aclose()
+
+    # the stub is saved, so the project isn't a failure
+    assert stub.modules == []
+    assert stub.metadata.summary is not None
+    assert "Couldn't find suitable artifact" in stub.metadata.summary
+    assert repo.failure(project.name) is None
+    assert project.name in repo
@@ -0,0 +1,213 @@
+import asyncio
+import io
+from functools import partial
+from pathlib import Path
+from zipfile import ZipFile
+
+import httpx
+import pytest
+
+from py_wtf.indexer import pypi
+from py_wtf.indexer.pypi import download, index_project
+from py_wtf.indexer.scheduler import Scheduler, StageLimits
+from py_wtf.repository import ProjectRepository
+from py_wtf.types import Project, ProjectName, SymbolTable
+
+from pytest_httpx import HTTPXMock
+
+
+def wheel(files: dict[str, str]) -> bytes:
+    out = io.BytesIO()
+    with ZipFile(out, mode="w") as archive:
+        for name, contents in files.items():
+            archive.writestr(name, contents)
+    return out.getvalue()
+
+
+def add_project(
+    httpx_mock: HTTPXMock, name: str, deps: list[str], files: dict[str, str]
+) -> None:
+    url = f"https://files.pythonhosted.org/packages/{name}-1.0-py3-none-any.whl"
+    httpx_mock.add_response(
+        url=f"https://pypi.org/pypi/{name}/json",
+        json={
+            "info": {"name": name, "version": "1.0", "requires_dist": deps},
+            "releases": {
+                "1.0": [
+                    {
+                        "filename": url.rpartition("/")[2],
+                        "url": url,
+                        "yanked": False,
+                        "packagetype": "bdist_wheel",
+                        "upload_time": "2024-01-01T00:00:00",
+                    }
+                ]
+            },
+        },
+    )
+    httpx_mock.add_response(url=url, content=wheel(files))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("two_phase", [False, True])
+async def test_scheduler_indexes_dependencies_first(
+    tmp_path: Path, httpx_mock: HTTPXMock, two_phase: bool
+) -> None:
+    add_project(
+        httpx_mock,
+        "sched-alpha",
+        ["sched-beta", "sched-missing"],
+        {"alpha.py": "from beta import Thing\ndef make() -> Thing: ..."},
+    )
+    add_project(httpx_mock, "sched-beta", [], {"beta.py": "class Thing: ..."})
+    httpx_mock.add_response(
+        url="https://pypi.org/pypi/sched-missing/json", status_code=404
+    )
+    repo = ProjectRepository(tmp_path, remote_versions={})
+
+    async with httpx.AsyncClient() as client:
+        scheduler = Scheduler(repo, client, StageLimits(parse=1), two_phase=two_phase)
+        errors = await scheduler.run([ProjectName("sched-alpha")])
+
+    assert set(errors) == {"sched-missing"}
+    assert set(scheduler.graph.edges()) == {
+        ("sched-alpha", "sched-beta"),
+        ("sched-alpha", "sched-missing"),
+    }
+    assert scheduler.queue_depths() == dict.fromkeys(
+        ["fetch", "download", "parse", "link", "save", "blocked"], 0
+    )
+    await repo.flush()
+    alpha = repo.load(ProjectName("sched-alpha"))
+    [func] = alpha.modules[0].functions
+    # beta's symbols were in the symbol table by the time alpha was parsed,
+    # or linked
+    assert func.returns is not None and func.returns.xref is not None
+    assert func.returns.xref.project == "sched-beta"
+    assert repo.failure(ProjectName("sched-missing")) is not None
+    await repo.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("two_phase", [False, True])
+async def test_scheduler_bounds_projects_in_flight(
+    tmp_path: Path,
+    httpx_mock: HTTPXMock,
+    monkeypatch: pytest.MonkeyPatch,
+    two_phase: bool,
+) -> None:
+    names = [f"sched-{i}" for i in range(6)]
+    for i, name in enumerate(names):
+        # Every other project depends on the one before it
+        deps = [names[i - 1]] if i % 2 else []
+        add_project(httpx_mock, name, deps, {f"mod{i}.py": "x = 1"})
+    repo = ProjectRepository(tmp_path, remote_versions={})
+    in_flight: list[int] = []
+
+    async with httpx.AsyncClient() as client:
+        scheduler = Scheduler(
+            repo, client, StageLimits(download=1, parse=1), two_phase=two_phase
+        )
+        real_download = download
+
+        async def counting_download(*args: object) -> Path:
+            in_flight.append(len(scheduler._admitted))
+            return await real_download(*args)  # type: ignore
+
+        monkeypatch.setattr("py_wtf.indexer.scheduler.download", counting_download)
+        errors = await scheduler.run([ProjectName(name) for name in names])
+
+    assert errors == {}
+    assert len(in_flight) == len(names)
+    assert max(in_flight) <= 2
+    await repo.flush()
+    assert all(repo.load(ProjectName(name)) for name in names)
+    await repo.aclose()
+
+
+@pytest.mark.asyncio
+async def test_index_project_two_phase(tmp_path: Path, httpx_mock: HTTPXMock) -> None:
+    add_project(
+        httpx_mock,
+        "sched-alpha",
+        ["sched-beta"],
+        {"alpha.py": "from beta import Thing\ndef make() -> Thing: ..."},
+    )
+    add_project(httpx_mock, "sched-beta", [], {"beta.py": "class Thing: ..."})
+    repo = ProjectRepository(tmp_path, remote_versions={})
+
+    alpha = await repo.get(
+        ProjectName("sched-alpha"), partial(index_project, repo=repo, two_phase=True)
+    )
+
+    [func] = alpha.modules[0].functions
+    assert func.returns is not None and func.returns.xref is not None
+    assert func.returns.xref.project == "sched-beta"
+    await repo.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("two_phase", [False, True])
+async def test_index_project_bounds_unpacked_projects(
+    tmp_path: Path,
+    httpx_mock: HTTPXMock,
+    monkeypatch: pytest.MonkeyPatch,
+    two_phase: bool,
+) -> None:
+    names = [f"sched-{i}" for i in range(4)]
+    for i, name in enumerate(names):
+        add_project(httpx_mock, name, names[i + 1 : i + 2], {f"mod{i}.py": "x = 1"})
+    repo = ProjectRepository(tmp_path, remote_versions={})
+    unpacked: list[int] = []
+    real_download, real_index_release = pypi.download, pypi.index_release
+
+    async def counting_download(*args: object) -> Path:
+        unpacked.append(unpacked[-1] + 1 if unpacked else 1)
+        return await real_download(*args)  # type: ignore
+
+    async def counting_index_release(*args: object) -> Project:
+        try:
+            return await real_index_release(*args)  # type: ignore
+        finally:
+            unpacked.append(unpacked[-1] - 1)
+
+    monkeypatch.setattr(pypi, "MAX_UNPACKED", 1)
+    monkeypatch.setattr(pypi, "download", counting_download)
+    monkeypatch.setattr(pypi, "index_release", counting_index_release)
+
+    # a chain of dependencies longer than the limit doesn't deadlock
+    await repo.get(
+        ProjectName(names[0]), partial(index_project, repo=repo, two_phase=two_phase)
+    )
+
+    assert max(unpacked) == 1
+    assert all([await repo.indexed(ProjectName(name)) for name in names])
+    await repo.aclose()
+
+
+@pytest.mark.asyncio
+async def test_index_project_two_phase_cancels_parsing(
+    tmp_path: Path, httpx_mock: HTTPXMock, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    add_project(httpx_mock, "sched-alpha", [], {"alpha.py": "x = 1"})
+    repo = ProjectRepository(tmp_path, remote_versions={})
+
+    async def parse_forever(*args: object) -> Project:
+        await asyncio.Event().wait()
+        raise AssertionError("unreachable")
+
+    def broken_symbol_table(*args: object) -> SymbolTable:
+        raise RuntimeError("no symbols")
+
+    monkeypatch.setattr("py_wtf.indexer.pypi.index_release", parse_forever)
+    monkeypatch.setattr(ProjectRepository, "symbol_table", broken_symbol_table)
+
+    with pytest.raises(RuntimeError, match="no symbols"):
+        await repo.get(
+            ProjectName("sched-alpha"),
+            partial(index_project, repo=repo, two_phase=True),
+        )
+
+    # The sources aren't still being parsed after they're gone
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+    await repo.aclose()
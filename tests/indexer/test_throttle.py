@@ -0,0 +1,156 @@
+import asyncio
+from time import monotonic
+
+import httpx
+import pytest
+
+from py_wtf.indexer.http import make_client
+from py_wtf.indexer.throttle import (
+    AdaptiveLimiter,
+    HostLimiter,
+    ThrottleConfig,
+    ThrottledTransport,
+    TokenBucket,
+)
+
+from pytest_httpx import HTTPXMock
+
+
+@pytest.mark.asyncio
+async def test_retries_throttled_requests(httpx_mock: HTTPXMock) -> None:
+    url = "https://pypi.org/pypi/throttled/json"
+    for _ in range(2):
+        httpx_mock.add_response(
+            url=url, status_code=429, headers={"Retry-After": "0.05"}
+        )
+    httpx_mock.add_response(url=url, json={"ok": True})
+    limiter = AdaptiveLimiter(ThrottleConfig(initial_limit=8))
+
+    start = monotonic()
+    async with make_client(limiter=limiter) as client:
+        response = await client.get(url)
+
+    assert response.json() == {"ok": True}
+    assert monotonic() - start >= 0.1
+    limits = limiter.limits()["pypi.org"]
+    assert limits.requests == 3
+    assert limits.throttled == 2
+    assert limits.limit < 8
+    assert limits.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_limits_concurrent_requests(httpx_mock: HTTPXMock) -> None:
+    in_flight = 0
+    most_in_flight = 0
+
+    async def respond(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, most_in_flight
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={})
+
+    httpx_mock.add_callback(respond, is_reusable=True)
+    limiter = AdaptiveLimiter(ThrottleConfig(initial_limit=2, max_limit=2, rate=None))
+
+    async with make_client(limiter=limiter) as client:
+        await asyncio.gather(
+            *[client.get(f"https://pypi.org/pypi/p{i}/json") for i in range(10)]
+        )
+
+    assert most_in_flight == 2
+    assert limiter.limits()["pypi.org"].requests == 10
+
+
+class FakeClock:
+    def __init__(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        self.now = 1000.0
+        self.slept: list[float] = []
+        monkeypatch.setattr("py_wtf.indexer.throttle.monotonic", lambda: self.now)
+        monkeypatch.setattr("py_wtf.indexer.throttle.asyncio.sleep", self.sleep)
+
+    async def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_fast_responses_increase_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    FakeClock(monkeypatch)
+    host = HostLimiter(ThrottleConfig(initial_limit=2, max_limit=4))
+
+    # About one more for every limit's worth of responses
+    for _ in range(2):
+        host.responded(200, 0.1)
+    assert host.limit == pytest.approx(2 + 1 / 2 + 1 / 2.5)
+    for _ in range(20):
+        host.responded(200, 0.1)
+    assert host.limit == 4
+
+
+def test_slow_responses_decrease_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    clock = FakeClock(monkeypatch)
+    host = HostLimiter(ThrottleConfig(initial_limit=10))
+    host.responded(200, 0.1)
+    limit = host.limit
+
+    host.responded(200, 0.5)
+    assert host.limit == pytest.approx(limit * 0.9)
+    # Once per response time
+    host.responded(200, 0.5)
+    assert host.limit == pytest.approx(limit * 0.9)
+    clock.now += 0.5
+    host.responded(200, 0.5)
+    assert host.limit == pytest.approx(limit * 0.9 * 0.9)
+    # Fast enough again
+    host.responded(200, 0.15)
+    assert host.limit > limit * 0.9 * 0.9
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_requests(monkeypatch: pytest.MonkeyPatch) -> None:
+    clock = FakeClock(monkeypatch)
+    bucket = TokenBucket(rate=4, burst=2)
+
+    # The burst goes out at once, then one request every 1 / rate seconds
+    for _ in range(2):
+        await bucket.acquire()
+    assert clock.slept == []
+    for _ in range(3):
+        await bucket.acquire()
+    assert clock.slept == [0.25, 0.25, 0.25]
+
+    # Tokens come back while it's quiet, up to the burst
+    clock.now += 60
+    clock.slept.clear()
+    for _ in range(2):
+        await bucket.acquire()
+    assert clock.slept == []
+    await bucket.acquire()
+    assert clock.slept == [0.25]
+
+
+class HangingTransport(httpx.AsyncBaseTransport):
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.Event().wait()
+        raise AssertionError("unreachable")
+
+
+@pytest.mark.asyncio
+async def test_cancelled_requests_release_without_failing() -> None:
+    limiter = AdaptiveLimiter(ThrottleConfig(initial_limit=8, rate=None))
+    transport = ThrottledTransport(HangingTransport(), limiter)
+
+    request = httpx.Request("GET", "https://pypi.org/pypi/slow/json")
+    task = asyncio.ensure_future(transport.handle_async_request(request))
+    await asyncio.sleep(0)
+    assert limiter.limits()["pypi.org"].in_flight == 1
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    limits = limiter.limits()["pypi.org"]
+    assert limits.in_flight == 0
+    assert limits.errors == 0
+    assert limits.limit == 8
@@ -1,10 +1,73 @@
+import asyncio
+import gzip
+import hashlib
+import os
+import pickle
 from dataclasses import replace
 from pathlib import Path
-from typing import AsyncIterable
+from time import time
+from typing import AsyncIterable, Callable
 
+import httpx
 import pytest
-from py_wtf.repository import converter, METADATA_FILENAME, ProjectRepository
-from py_wtf.types import Index, Project, ProjectMetadata, ProjectName
+from py_wtf.repository import (
+    AGGREGATE_FILENAME,
+    CHANGED_FILENAME,
+    converter,
+    MANIFEST_FILENAME,
+    METADATA_FILENAME,
+    ProjectRepository,
+    read_versions,
+    RECORD_SUFFIX,
+    VERSIONS_FILENAME,
+)
+from py_wtf.repository.columnar import ColumnarExport
+from py_wtf.repository.compact import COMPACT_PREFIX, decode_project, encode_compact
+from py_wtf.repository.compression import Compression
+from py_wtf.repository.encoding import ConverterBackend, encode_project, make_converter
+from py_wtf.repository.failures import FailureCache, FAILURES_FILENAME
+from py_wtf.repository.http_cache import CacheStats, HTTPCache
+from py_wtf.repository.layout import FLAT, LAYOUT_FILENAME, SHARDED
+from py_wtf.repository.names import NameIndex, NAMES_DIRECTORY, page_for
+from py_wtf.repository.search import (
+    SEARCH_DIRECTORY,
+    search_entries,
+    SearchEntry,
+    SearchIndex,
+    shard_for,
+    SPLITS_FILENAME,
+)
+from py_wtf.repository.sqlite import SQLiteBackend
+from py_wtf.repository.symbols import SYMBOLS_FILENAME
+from py_wtf.repository.usages import Usage, UsageIndex, USAGES_DIRECTORY
+from py_wtf.types import (
+    Class,
+    Documentation,
+    Export,
+    Failure,
+    FQName,
+    Function,
+    Index,
+    IndexAggregate,
+    IndexMetadata,
+    ManifestEntry,
+    Module,
+    ModuleEntry,
+    Parameter,
+    Project,
+    ProjectDescription,
+    ProjectManifest,
+    ProjectMetadata,
+    ProjectName,
+    ProjectRecord,
+    stdlib_project,
+    Type,
+    Variable,
+    VersionEntry,
+    XRef,
+)
+from pytest_httpx import HTTPXMock
+from rich.progress import Progress
 
 
 @pytest.fixture
@@ -94,13 +157,32 @@ async def test_get_with_bad_factory(repo: ProjectRepository, project: Project) -
 
     with pytest.raises(ValueError):
         await repo.get(ProjectName("DefinitelyNotproject.name"), _factory)
+    assert ProjectName("DefinitelyNotproject.name") not in repo
+
+
+@pytest.mark.asyncio
+async def test_get_with_failing_factory(
+    repo: ProjectRepository, project: Project
+) -> None:
+    async def _factory(_: ProjectName) -> AsyncIterable[Project]:
+        raise RuntimeError("boom")
+        yield project
+
+    waiting = asyncio.ensure_future(repo.get(project.name, _factory))
+    with pytest.raises(RuntimeError):
+        await repo.get(project.name, _factory)
+    # concurrent gets fail too, instead of waiting forever
+    with pytest.raises(RuntimeError):
+        await waiting
+    assert project.name not in repo
+    assert not repo._cache
 
 
 def test_update_index(repo: ProjectRepository, project: Project) -> None:
     metadata_file = repo.directory / METADATA_FILENAME
     repo._save(project)
     repo.write_index(timestamp=1)
-    metadata_before = converter.loads(metadata_file.read_text(), Index)
+    metadata_before = converter.loads(metadata_file.read_text(), IndexMetadata)
     assert metadata_before.generated_at == 1
     repo._save(
         replace(
@@ -114,7 +196,1124 @@ def test_update_index(repo: ProjectRepository, project: Project) -> None:
         )
     )
     repo.update_index()
-    metadata_after = converter.loads(metadata_file.read_text(), Index)
+    metadata_after = converter.loads(metadata_file.read_text(), IndexMetadata)
     assert metadata_after.generated_at > metadata_before.generated_at
     assert metadata_after.latest_projects[0].name == "other"
     assert metadata_after.latest_projects[1].name == project.name
+    assert metadata_after.project_count == 2
+
+
+def test_save_writes_record(repo: ProjectRepository, project: Project) -> None:
+    repo._save(project)
+    record = converter.loads(
+        (repo.directory / f"{project.name}{RECORD_SUFFIX}").read_text(), ProjectRecord
+    )
+    assert record.metadata == project.metadata
+    assert record.content_hash
+
+
+def test_contains_reads_only_record(repo: ProjectRepository, project: Project) -> None:
+    repo._save(project)
+    fresh = ProjectRepository(repo.directory)
+    assert project.name in fresh
+    assert ProjectName("other") not in fresh
+    assert project.name not in fresh._cache
+
+
+def test_generate_index_from_records(repo: ProjectRepository, project: Project) -> None:
+    repo._save(project)
+    fresh = ProjectRepository(repo.directory)
+    index = fresh.generate_index(timestamp=1)
+    assert index.all_project_names == [project.name]
+    assert index.latest_projects == [project.metadata]
+    assert not fresh._cache
+
+
+def test_generate_index_hydrates_in_parallel(
+    tmp_path: Path, project: Project, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr("py_wtf.repository.HYDRATION_CHUNK_SIZE", 1)
+    repo = ProjectRepository(tmp_path)
+    repo._save(project)
+    repo._save(_with_deps(project, "a", [project.name]))
+    # projects from before records existed are backfilled by the workers too
+    (tmp_path / "b.json").write_text(converter.dumps(_with_deps(project, "b", [])))
+
+    serial = ProjectRepository(tmp_path).generate_index(timestamp=1)
+    (tmp_path / f"b{RECORD_SUFFIX}").unlink()
+    with Progress() as progress:
+        parallel = ProjectRepository(tmp_path).generate_index(
+            timestamp=1, workers=2, progress=progress
+        )
+        assert [task.completed for task in progress.tasks] == [3]
+    assert parallel == serial
+    assert parallel.all_project_names == ["a", "b", project.name]
+    assert (tmp_path / f"b{RECORD_SUFFIX}").exists()
+
+
+def test_record_backfilled_for_old_index(
+    repo: ProjectRepository, project: Project
+) -> None:
+    (repo.directory / f"{project.name}.json").write_text(converter.dumps(project))
+    assert project.name in repo
+    assert (repo.directory / f"{project.name}{RECORD_SUFFIX}").exists()
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_and_reloads(tmp_path: Path, project: Project) -> None:
+    repo = ProjectRepository(tmp_path, max_cached_projects=1)
+    other = replace(project, name=ProjectName("other"))
+
+    async def factory(key: ProjectName) -> AsyncIterable[Project]:
+        yield replace(project, name=key)
+
+    assert await repo.get(project.name, factory) == project
+    assert await repo.get(other.name, factory) == other
+    assert project.name not in repo._cache
+    assert project.name in repo
+
+    async def _factory(_: ProjectName) -> AsyncIterable[Project]:
+        # evicted projects are reloaded from disk
+        assert False
+        yield project
+
+    assert await repo.get(project.name, _factory) == project
+    assert other.name not in repo._cache
+
+
+@pytest.mark.asyncio
+async def test_cache_byte_budget_keeps_in_flight(
+    tmp_path: Path, project: Project
+) -> None:
+    repo = ProjectRepository(tmp_path, max_cached_bytes=0)
+    pending = repo._cache[ProjectName("pending")]
+    repo._save(project)
+    assert project.name not in repo._cache
+    assert repo._cache[ProjectName("pending")] is pending
+
+
+def _with_deps(project: Project, name: str, deps: list[str]) -> Project:
+    return replace(
+        project,
+        name=ProjectName(name),
+        metadata=replace(project.metadata, name=ProjectName(name), dependencies=deps),
+    )
+
+
+def test_update_index_applies_dependency_deltas(
+    tmp_path: Path, project: Project
+) -> None:
+    full_dir, run_dir = tmp_path / "full", tmp_path / "run"
+    full_dir.mkdir()
+    run_dir.mkdir()
+    repo = ProjectRepository(full_dir)
+    repo._save(project)
+    repo._save(_with_deps(project, "a", [project.name]))
+    repo._save(_with_deps(project, "b", [project.name]))
+    repo.write_index(timestamp=1)
+    index = converter.loads((full_dir / METADATA_FILENAME).read_text(), IndexMetadata)
+    assert [m.name for m in index.top_projects] == [project.name]
+
+    # the next run starts from just the published index files
+    for filename in [METADATA_FILENAME, AGGREGATE_FILENAME]:
+        (run_dir / filename).write_bytes((full_dir / filename).read_bytes())
+    repo = ProjectRepository(run_dir)
+    repo._save(_with_deps(project, "a", ["c"]))
+    repo._save(_with_deps(project, "b", ["c"]))
+    repo._save(_with_deps(project, "c", []))
+    repo.update_index()
+
+    aggregate = converter.loads(
+        (run_dir / AGGREGATE_FILENAME).read_text(), IndexAggregate
+    )
+    assert aggregate.dependency_counts == {ProjectName("c"): 2}
+    index = converter.loads((run_dir / METADATA_FILENAME).read_text(), IndexMetadata)
+    assert [m.name for m in index.top_projects] == ["c"]
+    assert index.project_count == 4
+    # names come from the aggregate, only the pages of this run's projects
+    # are written
+    names = NameIndex(run_dir / NAMES_DIRECTORY)
+    assert names.read("a") == ["a"]
+    assert names.read("c") == ["c"]
+    assert not names.page_path(page_for(project.name)).exists()
+
+
+def test_update_index_writes_pages_of_evicted_projects(
+    tmp_path: Path, project: Project
+) -> None:
+    repo = ProjectRepository(tmp_path)
+    repo._save(_with_deps(project, "a", []))
+    repo.write_index(timestamp=1)
+
+    run = ProjectRepository(tmp_path, max_cached_projects=0)
+    run._save(_with_deps(project, "zeta", []))
+    assert ProjectName("zeta") not in run._cache
+    run.update_index()
+
+    names = NameIndex(tmp_path / NAMES_DIRECTORY)
+    assert names.read("a") == ["a"]
+    assert names.read("z") == ["zeta"]
+    index = converter.loads((tmp_path / METADATA_FILENAME).read_text(), IndexMetadata)
+    assert index.project_count == 2
+
+
+def test_update_index_needs_aggregate(tmp_path: Path, project: Project) -> None:
+    repo = ProjectRepository(tmp_path)
+    repo._save(project)
+    repo.write_index(timestamp=1)
+    (tmp_path / AGGREGATE_FILENAME).unlink()
+
+    run = ProjectRepository(tmp_path)
+    run._save(_with_deps(project, "a", []))
+    with pytest.raises(FileNotFoundError, match=AGGREGATE_FILENAME):
+        run.update_index()
+    assert NameIndex(tmp_path / NAMES_DIRECTORY).read("a") == []
+
+
+@pytest.mark.asyncio
+async def test_sharded_layout(tmp_path: Path, project: Project) -> None:
+    repo = ProjectRepository(tmp_path, layout=SHARDED)
+    repo._save(project)
+    shard = SHARDED.shard(project.name)
+    assert (tmp_path / shard / f"{project.name}.json").exists()
+    assert not (tmp_path / f"{project.name}.json").exists()
+
+    fresh = ProjectRepository(tmp_path)
+    assert fresh.generate_index(timestamp=1).all_project_names == [project.name]
+    assert await fresh.get(project.name, _never_called) == project
+
+
+@pytest.mark.asyncio
+async def test_migrate_layout(tmp_path: Path, project: Project) -> None:
+    repo = ProjectRepository(tmp_path)
+    repo._save(project)
+    repo.write_index(timestamp=1)
+
+    ProjectRepository(tmp_path).migrate(SHARDED)
+    shard = tmp_path / SHARDED.shard(project.name)
+    assert sorted(p.name for p in shard.iterdir()) == [
+        f"{project.name}.json",
+        f"{project.name}{RECORD_SUFFIX}",
+    ]
+    assert (tmp_path / METADATA_FILENAME).exists()
+    assert await ProjectRepository(tmp_path).get(project.name, _never_called) == project
+
+    ProjectRepository(tmp_path).migrate(FLAT)
+    assert not shard.exists()
+    assert not (tmp_path / LAYOUT_FILENAME).exists()
+    assert (tmp_path / f"{project.name}.json").exists()
+
+
+async def _never_called(_: ProjectName) -> AsyncIterable[Project]:
+    assert False
+    yield
+
+
+@pytest.mark.asyncio
+async def test_compressed_output(tmp_path: Path, project: Project) -> None:
+    repo = ProjectRepository(tmp_path, compression=("gzip", "zstd"))
+    repo._save(project)
+    assert not (tmp_path / f"{project.name}.json").exists()
+    contents = gzip.decompress((tmp_path / f"{project.name}.json.gz").read_bytes())
+    assert converter.loads(contents, Project) == project
+    assert (tmp_path / f"{project.name}.json.zst").exists()
+
+    fresh = ProjectRepository(tmp_path)
+    assert fresh.generate_index(timestamp=1).all_project_names == [project.name]
+    assert await fresh.get(project.name, _never_called) == project
+
+
+def test_manifest_tracks_changed_files(tmp_path: Path, project: Project) -> None:
+    repo = ProjectRepository(tmp_path, compression=("gzip",))
+    repo._save(project)
+    repo.write_manifest()
+    path = f"{project.name}.json.gz"
+    manifest = converter.loads(
+        (tmp_path / MANIFEST_FILENAME).read_text(), dict[str, ManifestEntry]
+    )
+    assert manifest[path].size == (tmp_path / path).stat().st_size
+    assert (tmp_path / CHANGED_FILENAME).read_text() == f"{path}\n"
+
+    # the same contents written again in a later run aren't changed
+    repo = ProjectRepository(tmp_path, compression=("gzip",))
+    repo._save(project)
+    other = replace(project, name=ProjectName("other"))
+    repo._save(other)
+    repo.write_manifest()
+    assert (tmp_path / CHANGED_FILENAME).read_text() == "other.json.gz\n"
+
+
+@pytest.mark.parametrize("module_count", [0, 1, 3])
+def test_encode_project_is_byte_identical(project: Project, module_count: int) -> None:
+    modules = [
+        Module(FQName(f"mod{i}"), [Documentation('ünïcode "docs"')], [], [], [], [])
+        for i in range(module_count)
+    ]
+    project = replace(project, modules=modules)
+    assert b"".join(encode_project(project)) == converter.dumpb(project)
+
+
+def _every_type(project: Project) -> list[tuple[object, type]]:
+    typ = Type("list", None, [Type("Base", XRef(FQName("other.Base"), project.name))])
+    func = Function(
+        FQName("pkg.C.f"),
+        True,
+        [Parameter("x", typ, "[]")],
+        typ,
+        [Documentation("dôcs")],
+    )
+    var = Variable(FQName("pkg.v"), typ, [])
+    inner = Class(FQName("pkg.C.Inner"), [], [], [], [], [], [])
+    cls = Class(
+        FQName("pkg.C"),
+        [FQName("other.Base")],
+        [func],
+        [var],
+        [var],
+        [inner],
+        [Documentation("🤪")],
+    )
+    module = Module(
+        FQName("pkg"),
+        [Documentation("docs")],
+        [func],
+        [var],
+        [cls],
+        [Export(FQName("pkg.Base"), XRef(FQName("other.Base")))],
+    )
+    project = replace(
+        project, modules=[module], documentation=[Documentation("ünïcode")]
+    )
+    aggregate = IndexAggregate()
+    aggregate.update(project.name, replace(project.metadata, dependencies=["other"]))
+    return [
+        (project, Project),
+        (Index(1, [project.metadata], [], [project.name]), Index),
+        (IndexMetadata(1, [project.metadata], [project.metadata], 1), IndexMetadata),
+        (ProjectRecord(project.metadata, "hash"), ProjectRecord),
+        (
+            ProjectManifest(
+                project.name,
+                project.metadata,
+                [],
+                [ModuleEntry(FQName("pkg"), "sha", 1)],
+                "hash",
+            ),
+            ProjectManifest,
+        ),
+        (ManifestEntry("sha", 1), ManifestEntry),
+        (VersionEntry("1.0", "hash"), VersionEntry),
+        (aggregate, IndexAggregate),
+        (ProjectDescription("description", None), ProjectDescription),
+        (
+            SearchEntry("f", FQName("pkg.f"), "function", project.name, "/pkg"),
+            SearchEntry,
+        ),
+    ]
+
+
+@pytest.mark.parametrize("backend", ["json", "orjson"])
+def test_converter_round_trips(project: Project, backend: ConverterBackend) -> None:
+    pytest.importorskip(backend)
+    conv = make_converter(backend)
+    for obj, cl in _every_type(project):
+        assert conv.loads(conv.dumpb(obj), cl) == obj
+        assert conv.loads(conv.dumps(obj), cl) == obj
+
+
+def test_converter_backends_are_byte_identical(project: Project) -> None:
+    pytest.importorskip("orjson")
+    stdlib, fast = make_converter("json"), make_converter("orjson")
+    for obj, _ in _every_type(project):
+        assert fast.dumpb(obj) == stdlib.dumpb(obj)
+    project = _every_type(project)[0][0]
+    assert isinstance(project, Project)
+    assert b"".join(encode_project(project, converter=fast)) == stdlib.dumpb(project)
+
+
+def test_compact_round_trips(project: Project) -> None:
+    project = _every_type(project)[0][0]
+    assert isinstance(project, Project)
+    contents = b"".join(encode_compact(project))
+    assert contents.startswith(COMPACT_PREFIX)
+    assert len(contents) < len(converter.dumpb(project))
+    assert decode_project(contents) == project
+    assert decode_project(converter.dumpb(project)) == project
+
+
+def test_compact_names_starting_with_a_dot(project: Project) -> None:
+    module = Module(
+        FQName("pkg"),
+        [],
+        [],
+        [],
+        [],
+        [
+            Export(FQName(".hidden"), XRef(FQName(".hidden"))),
+            Export(FQName("\\odd"), XRef(FQName("pkg.local"))),
+        ],
+    )
+    project = replace(project, modules=[module])
+    assert decode_project(b"".join(encode_compact(project))) == project
+
+
+def test_compact_version_1(project: Project) -> None:
+    module = Module(FQName("pkg"), [], [], [], [], [])
+    export = {"n": 1, "x": [1]}
+    contents = converter.dumpb(
+        {
+            "version": 1,
+            "name": project.name,
+            "metadata": converter.unstructure(project.metadata),
+            "documentation": [],
+            "modules": [{"n": 0, "e": [export]}],
+            "strings": ["pkg", ".local"],
+        }
+    )
+    local = FQName("pkg.local")
+    module = replace(module, exports=[Export(local, XRef(local))])
+    assert decode_project(contents) == replace(
+        project, documentation=[], modules=[module]
+    )
+
+
+@pytest.mark.asyncio
+async def test_compact_repository(tmp_path: Path, project: Project) -> None:
+    project = _every_type(project)[0][0]
+    assert isinstance(project, Project)
+    repo = ProjectRepository(tmp_path, compact=True)
+    repo._save(project)
+    await repo.aclose()
+    contents = ProjectRepository(tmp_path)._read_project(project.name)
+    assert contents.startswith(COMPACT_PREFIX)
+    loaded, record, _ = ProjectRepository(tmp_path)._load_from_disk(project.name)
+    assert loaded == project
+    # hashed like the plain encoding, so switching modes changes nothing
+    assert record.content_hash == hashlib.sha256(converter.dumpb(project)).hexdigest()
+    assert record == ProjectRepository(tmp_path)._read_record(project.name)
+    with pytest.raises(ValueError):
+        ProjectRepository(tmp_path, compact=True, split_modules=True)
+
+
+@pytest.mark.parametrize("compression", [(), ("gzip",), ("zstd",)])
+def test_save_streams_modules(
+    tmp_path: Path, project: Project, compression: tuple[Compression, ...]
+) -> None:
+    project = replace(
+        project, modules=[Module(FQName(f"m{i}"), [], [], [], [], []) for i in range(3)]
+    )
+    repo = ProjectRepository(tmp_path, compression=compression)
+    repo._save(project)
+    contents = ProjectRepository(tmp_path)._read_project(project.name)
+    assert contents == converter.dumps(project).encode()
+    record = repo._records[project.name]
+    assert record.content_hash == hashlib.sha256(contents).hexdigest()
+
+
+@pytest.mark.asyncio
+async def test_write_behind(tmp_path: Path, project: Project) -> None:
+    repo = ProjectRepository(tmp_path, write_behind=1, io_workers=1)
+
+    async def factory(key: ProjectName) -> AsyncIterable[Project]:
+        yield replace(project, name=key)
+
+    names = [ProjectName(f"p{i}") for i in range(5)]
+    for name in names:
+        assert (await repo.get(name, factory)).name == name
+    await repo.aclose()
+
+    assert sorted(p.name for p in tmp_path.iterdir() if p.suffix == ".json") == [
+        f"{name}.json" for name in names
+    ]
+    # nothing is left behind from the atomic writes
+    assert not [
+        p
+        for p in tmp_path.iterdir()
+        if p.name.startswith(".") and not p.name.startswith(SYMBOLS_FILENAME)
+    ]
+    fresh = ProjectRepository(tmp_path)
+    assert all([await fresh.contains(name) for name in names])
+
+
+@pytest.mark.asyncio
+async def test_contains_is_awaitable(repo: ProjectRepository, project: Project) -> None:
+    assert not await repo.contains(project.name)
+    repo._save(project)
+    assert await ProjectRepository(repo.directory).contains(project.name)
+
+
+@pytest.mark.asyncio
+async def test_fetch_from_remote_revalidates(
+    tmp_path: Path, project: Project, httpx_mock: HTTPXMock
+) -> None:
+    url = f"https://py.wtf/_index/{project.name}.json"
+    content = converter.dumps(project).encode()
+    httpx_mock.add_response(url=url, content=content, headers={"ETag": '"v1"'})
+    httpx_mock.add_response(
+        url=url, status_code=304, match_headers={"If-None-Match": '"v1"'}
+    )
+    cache = HTTPCache(tmp_path / "http")
+    repo = ProjectRepository(tmp_path / "index", http_cache=cache)
+
+    async with httpx.AsyncClient() as client:
+        assert await repo.fetch_from_remote(client, project.name) == project
+        assert await repo.fetch_from_remote(client, project.name) == project
+
+    assert cache.stats == CacheStats(
+        hits=1, misses=1, bytes_downloaded=len(content), bytes_saved=len(content)
+    )
+
+
+@pytest.mark.asyncio
+async def test_fetch_from_remote_sharded(
+    tmp_path: Path, project: Project, httpx_mock: HTTPXMock
+) -> None:
+    shard = SHARDED.shard(project.name)
+    httpx_mock.add_response(
+        url=f"https://py.wtf/_index/{shard}/{project.name}.json",
+        content=converter.dumps(project).encode(),
+    )
+    repo = ProjectRepository(tmp_path, layout=SHARDED)
+
+    async with httpx.AsyncClient() as client:
+        assert await repo.fetch_from_remote(client, project.name) == project
+
+
+@pytest.mark.asyncio
+async def test_http_cache_needs_validators(
+    tmp_path: Path, httpx_mock: HTTPXMock
+) -> None:
+    url = "https://py.wtf/_index/foo.json"
+    httpx_mock.add_response(url=url, content=b"1")
+    httpx_mock.add_response(url=url, content=b"2", match_headers={})
+    cache = HTTPCache(tmp_path)
+
+    async with httpx.AsyncClient() as client:
+        assert await cache.get(client, url) == b"1"
+        assert await cache.get(client, url) == b"2"
+
+    assert not list(tmp_path.iterdir())
+    assert cache.stats.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_http_cache_checks_body(tmp_path: Path, httpx_mock: HTTPXMock) -> None:
+    url = "https://py.wtf/_index/foo.json"
+    httpx_mock.add_response(url=url, content=b"1", headers={"ETag": "1"})
+    cache = HTTPCache(tmp_path)
+
+    async with httpx.AsyncClient() as client:
+        await cache.get(client, url)
+
+    # a body of the same size from a write the entry didn't make it into
+    _, body = cache._paths(url)
+    body.write_bytes(b"2")
+    assert cache._load(url) is None
+
+
+@pytest.mark.asyncio
+async def test_http_cache_evicts(tmp_path: Path, httpx_mock: HTTPXMock) -> None:
+    urls = [f"https://py.wtf/_index/{name}.json" for name in "abc"]
+    for url in urls:
+        httpx_mock.add_response(url=url, content=b"x" * 100, headers={"ETag": "1"})
+    cache = HTTPCache(tmp_path, max_bytes=700)
+
+    async with httpx.AsyncClient() as client:
+        for i, url in enumerate(urls):
+            await cache.get(client, url)
+            # a second apart, so they're evicted in order
+            for path in cache._paths(url):
+                os.utime(path, (time() - 10 + i, time() - 10 + i))
+
+    # Only the last two fit, and no temporary files are left behind
+    assert [cache._load(url) is not None for url in urls] == [False, True, True]
+    assert sorted(path.suffix for path in tmp_path.iterdir()) == [
+        ".body",
+        ".body",
+        ".json",
+        ".json",
+    ]
+
+    # Responses not used in a while are evicted too
+    cache = HTTPCache(tmp_path, max_age=60)
+    entry, _ = cache._paths(urls[2])
+    os.utime(entry, (time(), time() - 120))
+    cache.prune()
+    assert [cache._load(url) is not None for url in urls] == [False, True, False]
+
+
+def test_versions_manifest(tmp_path: Path, project: Project) -> None:
+    full_dir, run_dir = tmp_path / "full", tmp_path / "run"
+    full_dir.mkdir()
+    run_dir.mkdir()
+    full = ProjectRepository(full_dir)
+    full._save(project)
+    full.write_index(0)
+    [record] = full._records.values()
+    assert read_versions(full_dir) == {
+        project.name: VersionEntry(project.metadata.version, record.content_hash)
+    }
+
+    for filename in [METADATA_FILENAME, AGGREGATE_FILENAME, VERSIONS_FILENAME]:
+        (run_dir / filename).write_bytes((full_dir / filename).read_bytes())
+    run = ProjectRepository(run_dir)
+    other = _with_deps(project, "other", [])
+    run._save(other)
+    run.update_index()
+    assert set(read_versions(run_dir)) == {project.name, other.name}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("compression", [(), ("gzip",)])
+async def test_split_modules(
+    tmp_path: Path, project: Project, compression: tuple[Compression, ...]
+) -> None:
+    project = replace(
+        project,
+        modules=[Module(FQName(f"pkg.m{i}"), [], [], [], [], []) for i in range(3)],
+    )
+    repo = ProjectRepository(tmp_path, split_modules=True, compression=compression)
+    repo._save(project)
+    suffix = ".json.gz" if compression else ".json"
+    assert not (tmp_path / f"{project.name}{suffix}").exists()
+    contents = ProjectRepository(tmp_path)._read_compressed(
+        tmp_path / f"{project.name}.modules"
+    )
+    manifest = converter.loads(contents, ProjectManifest)
+    assert [m.name for m in manifest.modules] == ["pkg.m0", "pkg.m1", "pkg.m2"]
+    # the record matches what the single file format would have
+    single = converter.dumps(project).encode()
+    assert manifest.content_hash == hashlib.sha256(single).hexdigest()
+    assert repo._records[project.name].content_hash == manifest.content_hash
+
+    for split_modules in [True, False]:
+        fresh = ProjectRepository(tmp_path, split_modules=split_modules)
+        assert fresh.generate_index(timestamp=1).all_project_names == [project.name]
+        assert await fresh.get(project.name, _never_called) == project
+
+    # modules that went away are removed, along with their manifest entries
+    repo = ProjectRepository(tmp_path, split_modules=True, compression=compression)
+    repo._save(replace(project, modules=project.modules[:1]))
+    repo.write_manifest()
+    modules_dir = tmp_path / f"{project.name}.modules"
+    assert [p.name for p in modules_dir.iterdir()] == [f"pkg.m0{suffix}"]
+    manifest_paths = converter.loads(
+        (tmp_path / MANIFEST_FILENAME).read_text(), dict[str, ManifestEntry]
+    )
+    assert sorted(manifest_paths) == sorted(
+        [f"{project.name}.modules/pkg.m0{suffix}", f"{project.name}.modules{suffix}"]
+    )
+
+
+def test_migrate_moves_split_modules(tmp_path: Path, project: Project) -> None:
+    project = replace(project, modules=[Module(FQName("foo"), [], [], [], [], [])])
+    repo = ProjectRepository(tmp_path, split_modules=True)
+    repo._save(project)
+    repo.migrate(SHARDED)
+    shard = tmp_path / SHARDED.shard(project.name)
+    assert sorted(p.name for p in shard.iterdir()) == [
+        f"{project.name}.meta",
+        f"{project.name}.modules",
+        f"{project.name}.modules.json",
+    ]
+    assert [p.name for p in (shard / f"{project.name}.modules").iterdir()] == [
+        "foo.json"
+    ]
+
+
+def test_migrate_updates_manifest(tmp_path: Path, project: Project) -> None:
+    project = replace(project, modules=[Module(FQName("foo"), [], [], [], [], [])])
+    repo = ProjectRepository(tmp_path, split_modules=True)
+    repo._save(project)
+    repo.write_index(timestamp=1)
+    before = converter.loads(
+        (tmp_path / MANIFEST_FILENAME).read_text(), dict[str, ManifestEntry]
+    )
+
+    ProjectRepository(tmp_path).migrate(SHARDED)
+
+    manifest = converter.loads(
+        (tmp_path / MANIFEST_FILENAME).read_text(), dict[str, ManifestEntry]
+    )
+    shard = SHARDED.shard(project.name)
+    moved = {
+        f"{project.name}.modules.json": f"{shard}/{project.name}.modules.json",
+        f"{project.name}.modules/foo.json": f"{shard}/{project.name}.modules/foo.json",
+    }
+    assert manifest == {moved.get(path, path): entry for path, entry in before.items()}
+    for path in moved.values():
+        assert (tmp_path / path).exists()
+    # The moved files have to be uploaded again, nothing else does
+    assert (tmp_path / CHANGED_FILENAME).read_text().splitlines() == sorted(
+        moved.values()
+    )
+
+
+def test_shard_for() -> None:
+    assert shard_for("ProjectRepository") == "pr"
+    assert shard_for("__init__") == "in"
+    assert shard_for("x") == "x"
+    assert shard_for("__") == "_"
+    assert shard_for("ñu") == "_u"
+    assert shard_for("python", {"py"}) == "pyt"
+    assert shard_for("py", {"py"}) == "py"
+
+
+def _read_shard(directory: Path, name: str) -> list[SearchEntry]:
+    return converter.loads(
+        (directory / SEARCH_DIRECTORY / f"{shard_for(name)}.json").read_bytes(),
+        list[SearchEntry],
+    )
+
+
+def test_search_index(tmp_path: Path, project: Project) -> None:
+    full_dir, run_dir = tmp_path / "full", tmp_path / "run"
+    full_dir.mkdir()
+    run_dir.mkdir()
+    module = Module(
+        FQName("pkg.mod"),
+        [],
+        [Function(FQName("pkg.mod.frobnicate"), False, [], None, [])],
+        [],
+        [],
+        [],
+    )
+    repo = ProjectRepository(full_dir)
+    repo._save(replace(project, modules=[module]))
+    repo.write_index(timestamp=1)
+    assert _read_shard(full_dir, "frobnicate") == [
+        SearchEntry(
+            "frobnicate",
+            FQName("pkg.mod.frobnicate"),
+            "function",
+            project.name,
+            f"/{project.name}/pkg.mod/frobnicate",
+        )
+    ]
+
+    # the next run starts from the published index files, and fetches the
+    # shards it needs
+    for filename in [METADATA_FILENAME, AGGREGATE_FILENAME]:
+        (run_dir / filename).write_bytes((full_dir / filename).read_bytes())
+    (run_dir / SEARCH_DIRECTORY).mkdir()
+    splits = f"{SEARCH_DIRECTORY}/{SPLITS_FILENAME}"
+    (run_dir / splits).write_bytes((full_dir / splits).read_bytes())
+    repo = ProjectRepository(run_dir)
+    renamed = Function(FQName("pkg.mod.defrobnicate"), False, [], None, [])
+    repo._save(replace(project, modules=[replace(module, functions=[renamed])]))
+    fetched: set[str] = set()
+    while missing := [p for p in repo.shards_missing() if p not in fetched]:
+        fetched.update(missing)
+        for path in missing:
+            if (full_dir / path).exists():
+                (run_dir / path).parent.mkdir(exist_ok=True)
+                (run_dir / path).write_bytes((full_dir / path).read_bytes())
+    # the old shards are only known from the project's shard list
+    assert fetched == {
+        f"{SEARCH_DIRECTORY}/.projects/{project.name}.json",
+        *(
+            f"{SEARCH_DIRECTORY}/{shard_for(name)}.json"
+            for name in ["defrobnicate", "frobnicate", "mod"]
+        ),
+    }
+    repo.update_index()
+
+    assert [e.fqname for e in _read_shard(run_dir, "defrobnicate")] == [
+        "pkg.mod.defrobnicate"
+    ]
+    # the old entry is gone, and so is its shard
+    assert not (run_dir / SEARCH_DIRECTORY / f"{shard_for('frobnicate')}.json").exists()
+
+
+def _with_functions(project: Project, name: str, functions: list[str]) -> Project:
+    module = Module(
+        FQName("m"),
+        [],
+        [Function(FQName(f"m.{f}"), False, [], None, []) for f in functions],
+        [],
+        [],
+        [],
+    )
+    return replace(project, name=ProjectName(name), modules=[module])
+
+
+def test_search_index_splits(tmp_path: Path, project: Project) -> None:
+    a = _with_functions(project, "a", ["ge", "getter"])
+    b = _with_functions(project, "b", ["get_b"])
+    SearchIndex(tmp_path).rebuild((p.name, list(search_entries(p))) for p in [a, b])
+    assert sorted(p.stem for p in tmp_path.glob("*.json")) == ["ge", "m"]
+
+    index = SearchIndex(tmp_path, max_shard_rows=2)
+    index.update(_with_functions(project, "a", ["ge", "getter", "get_a"]))
+    index.write()
+    # too big shards are split until they aren't, or can't be
+    assert sorted(p.stem for p in tmp_path.glob("*.json")) == [
+        "ge",
+        "get_",
+        "gett",
+        "m",
+    ]
+    splits = converter.loads((tmp_path / SPLITS_FILENAME).read_bytes(), list[str])
+    assert splits == ["ge", "get"]
+    assert shard_for("get_c", splits) == "get_"
+    assert shard_for("ge", splits) == "ge"
+
+    # b's shard list is from before the split, its entry is still found
+    index = SearchIndex(tmp_path, max_shard_rows=2)
+    index.update(_with_functions(project, "b", []))
+    index.write()
+    rows = converter.loads((tmp_path / "get_.json").read_bytes(), list[SearchEntry])
+    assert [row.name for row in rows] == ["get_a"]
+
+
+def test_write_index_writes_each_shard_once(
+    tmp_path: Path, project: Project, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr("py_wtf.repository.HYDRATION_CHUNK_SIZE", 1)
+    repo = ProjectRepository(tmp_path)
+    session = Type("Session", XRef(FQName("requests.Session"), ProjectName("requests")))
+    for name in ["a", "b", "c"]:
+        params = [Parameter("s", session, None)]
+        func = Function(FQName(f"{name}.frobnicate"), False, params, None, [])
+        module = Module(FQName(name), [], [func], [], [], [])
+        repo._save(replace(project, name=ProjectName(name), modules=[module]))
+    stale = [
+        tmp_path / SEARCH_DIRECTORY / "zz.json",
+        tmp_path / USAGES_DIRECTORY / "gone" / "zz.json",
+    ]
+    for path in stale:
+        path.parent.mkdir(parents=True)
+        path.write_text("[]")
+    written: list[Path] = []
+    write_bytes = Path.write_bytes
+
+    def counting_write_bytes(path: Path, data: bytes) -> int:
+        written.append(path)
+        return write_bytes(path, data)
+
+    monkeypatch.setattr(Path, "write_bytes", counting_write_bytes)
+    repo.write_index(timestamp=1, workers=2)
+
+    shards = [path for path in written if path.suffix == ".json"]
+    assert len(shards) == len(set(shards))
+    assert [e.project for e in _read_shard(tmp_path, "frobnicate")] == ["a", "b", "c"]
+    usages = UsageIndex(tmp_path / USAGES_DIRECTORY).read(
+        f"requests/{shard_for('Session')}"
+    )
+    assert [u.project for u in usages[FQName("requests.Session")]] == ["a", "b", "c"]
+    assert not any(path.exists() for path in stale)
+    manifest = converter.loads(
+        (tmp_path / MANIFEST_FILENAME).read_bytes(), dict[str, ManifestEntry]
+    )
+    assert f"{SEARCH_DIRECTORY}/{shard_for('frobnicate')}.json" in manifest
+    assert f"{USAGES_DIRECTORY}/requests/{shard_for('Session')}.json" in manifest
+
+
+def test_usage_index(tmp_path: Path, project: Project) -> None:
+    session = Type("Session", XRef(FQName("requests.Session"), ProjectName("requests")))
+    func = Function(FQName("pkg.get"), False, [Parameter("s", session, None)], None, [])
+    module = Module(
+        FQName("pkg"),
+        [],
+        [func],
+        [Variable(FQName("pkg.DEFAULT"), Type("list", None, [session]), [])],
+        [],
+        # xrefs into the same project or the standard library aren't usages
+        [
+            Export(FQName("pkg.Own"), XRef(FQName("pkg.mod.Own"))),
+            Export(FQName("pkg.Path"), XRef(FQName("pathlib.Path"), stdlib_project)),
+        ],
+    )
+    other = replace(project, name=ProjectName("other"), modules=[module])
+    project = replace(project, modules=[module])
+    repo = ProjectRepository(tmp_path)
+    repo._save(project)
+    repo._save(other)
+    repo.write_index(timestamp=1)
+
+    shard = f"requests/{shard_for('Session')}"
+    usages = UsageIndex(tmp_path / USAGES_DIRECTORY)
+    assert usages.read(shard) == {
+        "requests.Session": [
+            Usage(ProjectName("other"), FQName("pkg.DEFAULT"), "variable"),
+            Usage(ProjectName("other"), FQName("pkg.get"), "parameter"),
+            Usage(project.name, FQName("pkg.DEFAULT"), "variable"),
+            Usage(project.name, FQName("pkg.get"), "parameter"),
+        ]
+    }
+    assert {p.parent.name for p in (tmp_path / USAGES_DIRECTORY).glob("*/*")} == {
+        "requests"
+    }
+    assert f"{USAGES_DIRECTORY}/{shard}.json" in repo._manifest
+
+    # re-indexing a project replaces its usages
+    repo = ProjectRepository(tmp_path)
+    repo._save(replace(project, modules=[replace(module, variables=[])]))
+    repo.update_index()
+    assert usages.read(shard) == {
+        "requests.Session": [
+            Usage(ProjectName("other"), FQName("pkg.DEFAULT"), "variable"),
+            Usage(ProjectName("other"), FQName("pkg.get"), "parameter"),
+            Usage(project.name, FQName("pkg.get"), "parameter"),
+        ]
+    }
+
+    # and shards nothing uses anymore are removed
+    repo = ProjectRepository(tmp_path)
+    repo._save(replace(project, modules=[]))
+    repo._save(replace(other, modules=[]))
+    assert repo.shards_missing() == []
+    repo.update_index()
+    assert not usages.shard_path(shard).exists()
+    assert f"{USAGES_DIRECTORY}/{shard}.json" not in repo._manifest
+
+
+def test_failure_cache(tmp_path: Path) -> None:
+    path = tmp_path / FAILURES_FILENAME
+    cache = FailureCache(path)
+    gone, broken = ProjectName("gone"), ProjectName("broken")
+    cache.record(gone, "not-found", None, now=0)
+    cache.record(broken, "download", "1.0", now=0)
+    cache.write(now=1)
+
+    cache = FailureCache(path)
+    assert cache.get(gone, now=1) == Failure("not-found", None, 0, 7 * 24 * 3600)
+    # failures expire after their TTL
+    assert cache.get(broken, now=24 * 3600) is None
+    assert list(cache.entries(now=24 * 3600)) == [gone]
+    # re-uploads of the version that failed don't count as new versions
+    assert cache.retry_updated({broken: ["1.0"], gone: ["0.1"]}) == [gone]
+
+    # and expired entries are dropped from disk
+    cache.write(now=24 * 3600)
+    assert FailureCache(path).entries(now=0) == {}
+
+
+def test_failure_cache_drops_retired_reasons(tmp_path: Path) -> None:
+    path = tmp_path / FAILURES_FILENAME
+    path.write_text(
+        '{"old": {"reason": "no-artifact", "version": "1.0", "failed_at": 0,'
+        ' "expires_at": 9}, "gone": {"reason": "not-found", "version": null,'
+        ' "failed_at": 0, "expires_at": 9}}'
+    )
+    cache = FailureCache(path)
+    assert list(cache.entries(now=1)) == ["gone"]
+
+    cache.write(now=1)
+    assert list(converter.parse(path.read_bytes())) == ["gone"]
+
+
+def test_saving_forgets_failure(repo: ProjectRepository, project: Project) -> None:
+    repo.record_failure(project.name, "download", project.metadata.version)
+    repo._save(project)
+    assert repo.failure(project.name) is None
+
+
+def test_symbol_table(tmp_path: Path, project: Project) -> None:
+    module = Module(
+        FQName("pkg"),
+        [],
+        [Function(FQName("pkg.f"), False, [], None, [])],
+        [],
+        [],
+        [],
+    )
+    repo = ProjectRepository(tmp_path)
+    repo._save(replace(project, modules=[module]))
+    repo._save(replace(_with_deps(project, "other", []), modules=[module]))
+
+    table = repo.symbol_table([project.name, ProjectName("other")])
+    assert table[FQName("pkg.f")] == "other"
+    assert repo.symbol_table([project.name])[FQName("pkg.f")] == project.name
+    assert table.get(FQName("pkg.g")) is None
+    assert table[FQName("os.path")] == stdlib_project
+    assert sorted(table) == ["pkg", "pkg.f"]
+
+    # only the database path and project names are sent to other processes
+    unpickled = pickle.loads(pickle.dumps(table))
+    assert not unpickled.data
+    assert unpickled[FQName("pkg.f")] == "other"
+
+
+@pytest.mark.asyncio
+async def test_ensure_skips_loading_indexed_projects(
+    tmp_path: Path, project: Project
+) -> None:
+    ProjectRepository(tmp_path)._save(project)
+    repo = ProjectRepository(tmp_path)
+    await repo.ensure(project.name, _never_called)
+    assert project.name not in repo._cache
+
+    # projects indexed before there was a symbol index are loaded once
+    (tmp_path / SYMBOLS_FILENAME).unlink()
+    repo = ProjectRepository(tmp_path)
+    await repo.ensure(project.name, _never_called)
+    assert project.name in repo._cache
+    await ProjectRepository(tmp_path).ensure(project.name, _never_called)
+
+
+@pytest.mark.asyncio
+async def test_records_without_project_files(tmp_path: Path, project: Project) -> None:
+    repo = ProjectRepository(tmp_path)
+    repo._save(project)
+    await repo.aclose()
+    # Like scripts/publish.py, which only deletes JSON files
+    for path in tmp_path.glob("**/*.json"):
+        path.unlink()
+
+    repo = ProjectRepository(tmp_path)
+    assert project.name not in repo
+    assert not await repo.contains(project.name)
+    assert not await repo.indexed(project.name)
+    # and its symbols are forgotten
+    assert repo._symbols.content_hash(project.name) is None
+    assert await repo.get(project.name, _yields(project)) == project
+    repo.write_index(timestamp=1)
+
+
+def _yields(project: Project) -> Callable[[ProjectName], AsyncIterable[Project]]:
+    async def factory(_: ProjectName) -> AsyncIterable[Project]:
+        yield project
+
+    return factory
+
+
+def _documented_module() -> Module:
+    return Module(
+        FQName("pkg"),
+        [Documentation("Frobnicates widgets")],
+        [Function(FQName("pkg.defrobnicate"), False, [], None, [])],
+        [],
+        [],
+        [],
+    )
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend(tmp_path: Path, project: Project) -> None:
+    project = replace(project, modules=[_documented_module()])
+    repo = ProjectRepository(tmp_path, backend=SQLiteBackend(tmp_path / "index.db"))
+    repo._save(project)
+    repo._save(replace(_with_deps(project, "a", [project.name]), modules=[]))
+    assert not list(tmp_path.glob("*.json"))
+
+    repo = ProjectRepository(
+        tmp_path, max_cached_projects=0, backend=SQLiteBackend(tmp_path / "index.db")
+    )
+    assert ProjectName("a") in repo
+    assert ProjectName("b") not in repo
+    assert await repo.get(project.name, _never_called) == project
+    # records hash the project like its file would
+    assert repo._load_record(project.name) == ProjectRecord(
+        project.metadata,
+        hashlib.sha256(b"".join(encode_project(project))).hexdigest(),
+    )
+
+    repo.write_index(timestamp=1)
+    index = converter.loads((tmp_path / METADATA_FILENAME).read_text(), IndexMetadata)
+    assert index.generated_at == 1
+    assert [m.name for m in index.top_projects] == [project.name]
+    assert index.project_count == 2
+    assert NameIndex(tmp_path / NAMES_DIRECTORY).read("a") == ["a"]
+    await repo.aclose()
+
+
+def test_sqlite_search(tmp_path: Path, project: Project) -> None:
+    backend = SQLiteBackend(tmp_path / "index.db")
+    backend.save(replace(project, modules=[_documented_module()]))
+    assert backend.search("widgets") == [(project.name, "pkg", "module")]
+    assert backend.search("defrobnicate") == [
+        (project.name, "pkg.defrobnicate", "function")
+    ]
+
+    # saving a project again replaces its symbols
+    backend.save(project)
+    assert backend.search("widgets") == []
+    backend.close()
+
+
+@pytest.mark.asyncio
+async def test_export_from_sqlite(tmp_path: Path, project: Project) -> None:
+    project = replace(project, modules=[_documented_module()])
+    backend = SQLiteBackend(tmp_path / "index.db")
+    backend.save(project)
+
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    repo = ProjectRepository(out_dir, max_cached_projects=0)
+    await repo.export(backend)
+    repo.write_index(timestamp=1)
+    await repo.aclose()
+
+    assert (out_dir / f"{project.name}.json").read_bytes() == b"".join(
+        encode_project(project)
+    )
+    index = converter.loads((out_dir / METADATA_FILENAME).read_text(), IndexMetadata)
+    assert index.project_count == 1
+    backend.close()
+
+
+@pytest.mark.asyncio
+async def test_columnar_export(tmp_path: Path, project: Project) -> None:
+    pytest.importorskip("pyarrow")
+    import pyarrow.dataset
+
+    def read(table: str) -> list[dict[str, object]]:
+        return pyarrow.dataset.dataset(tmp_path / "out" / table).to_table().to_pylist()
+
+    project = _every_type(project)[0][0]
+    assert isinstance(project, Project)
+    other = replace(project, name=ProjectName("other"))
+    (tmp_path / "index").mkdir()
+    repo = ProjectRepository(tmp_path / "index")
+    repo._save(project)
+    repo._save(other)
+    await repo.aclose()
+
+    export = ColumnarExport(tmp_path / "out")
+    assert export.export(ProjectRepository(tmp_path / "index")) == (2, 0)
+    assert {row["project"] for row in read("projects")} == {project.name, "other"}
+    functions = [row for row in read("functions") if row["project"] == project.name]
+    assert [(f["function"], f["class"], f["asynchronous"]) for f in functions] == [
+        ("pkg.C.f", None, True),
+        ("pkg.C.f", "pkg.C", True),
+    ]
+    assert functions[0]["returns"] == "list[Base]"
+    assert {
+        (x["kind"], x["target"], x["target_project"])
+        for x in read("xrefs")
+        if x["project"] == project.name
+    } == {
+        ("export", "other.Base", project.name),
+        ("parameter", "other.Base", project.name),
+        ("return", "other.Base", project.name),
+        ("variable", "other.Base", project.name),
+    }
+    assert export.export(ProjectRepository(tmp_path / "index")) == (0, 0)
+
+    # only changed projects are written again, missing ones are removed
+    (tmp_path / "changed").mkdir()
+    repo = ProjectRepository(tmp_path / "changed")
+    repo._save(replace(project, modules=[]))
+    await repo.aclose()
+    assert export.export(ProjectRepository(tmp_path / "changed")) == (1, 1)
+    assert [row["project"] for row in read("projects")] == [project.name]
+    assert read("functions") == []
+
+
+def test_name_pages(tmp_path: Path) -> None:
+    names = NameIndex(tmp_path)
+    written, removed = names.write(map(ProjectName, ["attrs", "anyio", "black"]))
+    assert [path.name for path, _ in written] == ["a.json", "b.json"]
+    assert names.read("a") == ["anyio", "attrs"]
+
+    # adding to a page keeps what's already on it, other pages are left alone
+    written, removed = names.write(map(ProjectName, ["aiohttp", "click"]), {"a"})
+    assert [path.name for path, _ in written] == ["a.json"]
+    assert names.read("a") == ["aiohttp", "anyio", "attrs"]
+    assert not names.page_path("c").exists()
+
+    # rewriting everything drops pages without names
+    written, removed = names.write([ProjectName("attrs")])
+    assert removed == [names.page_path("b")]
+    assert names.read("a") == ["attrs"]
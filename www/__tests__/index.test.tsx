@@ -1,15 +1,31 @@
 import "@testing-library/jest-dom";
-import { render } from "@testing-library/react";
+import { fireEvent, render } from "@testing-library/react";
+import { HttpResponse, http } from "msw";
+import { setupServer } from "msw/node";
+import "whatwg-fetch";
 
 import Index, { Props, getStaticProps } from "@/pages/index";
 
+const server = setupServer(
+  http.get("/_index/.metadata", () => new HttpResponse(null, { status: 404 })),
+  // A project indexed after the site was built
+  http.get("/_index/.names/p.json", () =>
+    HttpResponse.json(["project-alpha", "project-beta", "project-gamma"]),
+  ),
+);
+beforeAll(() => server.listen());
+afterEach(() => server.resetHandlers());
+afterAll(() => server.close());
+
+async function staticProps(): Promise<Props> {
+  const propsResult = await getStaticProps({});
+  expect(propsResult).toHaveProperty("props");
+  return (propsResult as { props: Props }).props;
+}
+
 describe("Index", () => {
   it("contains link to project-alpha", async () => {
-    const propsResult = await getStaticProps({});
-    expect(propsResult).toHaveProperty("props");
-    const props = (propsResult as { props: Props }).props;
-
-    const { getAllByRole } = render(<Index {...props} />);
+    const { getAllByRole } = render(<Index {...await staticProps()} />);
     const links = getAllByRole("link", { name: "project-alpha" });
     links.forEach((link) => {
       expect(link).toBeInTheDocument();
@@ -17,4 +33,19 @@ describe("Index", () => {
       expect(link.parentElement).toHaveTextContent("project-alpha");
     });
   });
+
+  it("finds projects added since the site was built", async () => {
+    const props = await staticProps();
+    expect(props.descriptors.map((d) => d.name)).not.toContain(
+      "project-gamma",
+    );
+
+    const { getByPlaceholderText, findByRole } = render(<Index {...props} />);
+    fireEvent.change(getByPlaceholderText(/Search for a Python package/), {
+      target: { value: "project-gamma" },
+    });
+
+    const link = await findByRole("link", { name: "project-gamma" });
+    expect(link).toHaveAttribute("href", "/project-gamma");
+  });
 });
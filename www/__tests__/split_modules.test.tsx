@@ -0,0 +1,35 @@
+import "@testing-library/jest-dom";
+
+import { renderSPA, setupSPAServer } from "@/lib/test/spa";
+
+const requested = setupSPAServer({ splitModules: true });
+
+describe("Projects indexed with --split-modules", () => {
+  it("load the manifest for the project page", async () => {
+    const { getByRole } = await renderSPA("/project-alpha");
+
+    const heading = getByRole("heading", { name: "Project project-alpha" });
+    expect(heading.children[0]).toHaveAttribute("href", "/project-alpha");
+    for (const mod of ["alpha", "alpha.core", "alpha.foo"]) {
+      expect(getByRole("link", { name: mod })).toHaveAttribute(
+        "href",
+        `/project-alpha/${mod}`,
+      );
+    }
+    expect(requested).toContain("project-alpha.modules.json");
+    expect(requested.some((file) => file.includes(".modules/"))).toBe(false);
+  });
+
+  it("load only the module they show", async () => {
+    const { getByRole } = await renderSPA("/project-alpha/alpha.core/Helper");
+
+    // Inner class link, from the module file
+    expect(getByRole("link", { name: "Utils" })).toHaveAttribute(
+      "href",
+      "/project-alpha/alpha.core/Helper.Utils",
+    );
+    expect(requested.filter((file) => file.includes(".modules/"))).toEqual([
+      "project-alpha.modules/alpha.core.json",
+    ]);
+  });
+});
@@ -0,0 +1,47 @@
+import useFetchUsages from "hooks/fetchUsages";
+
+import { xref } from "@/lib/url";
+
+import { TBody, Table, Td, Tr } from "../core/layout/CondensedTable";
+import { Link } from "../core/navigation/Link";
+import { H3 } from "../core/typography/Heading";
+
+interface Props {
+  project: string;
+  fqname: string;
+}
+
+export default function UsedBy({ project, fqname }: Props) {
+  const { usages } = useFetchUsages(project, fqname);
+  if (usages.length === 0) {
+    return null;
+  }
+
+  return (
+    <div>
+      <H3>Used by</H3>
+      <Table>
+        <TBody>
+          {usages.map(([usingProject, usingSymbol, kind]) => (
+            <Tr key={`${usingProject}/${usingSymbol}/${kind}`}>
+              <Td>{usingProject}</Td>
+              <Td>
+                <Link
+                  to={
+                    xref(undefined, {
+                      fqname: usingSymbol,
+                      project: usingProject,
+                    }) ?? `/${usingProject}`
+                  }
+                >
+                  {usingSymbol}
+                </Link>
+              </Td>
+              <Td>{kind}</Td>
+            </Tr>
+          ))}
+        </TBody>
+      </Table>
+    </div>
+  );
+}
@@ -3,6 +3,7 @@ import { Navigate, useParams } from "react-router-dom";
 
 import Class from "@/components/Docs/Class";
 import Function from "@/components/Docs/Function";
+import UsedBy from "@/components/Docs/UsedBy";
 import Variable from "@/components/Docs/Variable";
 import ClassContents from "@/components/Sidebar/ClassContents";
 import ModuleContents from "@/components/Sidebar/ModuleContents";
@@ -106,6 +107,7 @@ export default function SymbolPage() {
           sidebar={<Sidebar project={project}>{getSidebarContent()}</Sidebar>}
         >
           {getContent()}
+          {symbol && <UsedBy project={project.name} fqname={symbol.name} />}
         </ContentWithSidebar>
       </PageLayout>
     );
@@ -11,6 +11,8 @@ import { Link } from "./navigation/Link";
 type SearchParams = {
   descriptors: Index;
   placeholder: string;
+  // Lets the page load more descriptors for what's being searched for
+  onSearchTermChange?: (term: string) => void;
 };
 
 const SearchContainer = styled.div`
@@ -93,7 +95,11 @@ function Match({ result }: MatchProps): ReactElement {
 
 const MAX_DISPLAYED_RESULTS = 50;
 
-export const Search = ({ descriptors, placeholder }: SearchParams) => {
+export const Search = ({
+  descriptors,
+  placeholder,
+  onSearchTermChange,
+}: SearchParams) => {
   const [searchTerm, setSearchTerm] = useState("");
   const [results, setResults] = useState<Results | null>(null);
   useHotkeys("/", (event) => {
@@ -108,7 +114,7 @@ export const Search = ({ descriptors, placeholder }: SearchParams) => {
     } else {
       setResults(null);
     }
-  }, [searchTerm]);
+  }, [searchTerm, descriptors]);
 
   function keyPressHandler(event: React.KeyboardEvent, index: number) {
     if (event.key === "ArrowDown" && index + 1 < (results?.length ?? 0)) {
@@ -129,6 +135,7 @@ export const Search = ({ descriptors, placeholder }: SearchParams) => {
         id="Search_Input"
         onChange={(event) => {
           setSearchTerm(event.target.value);
+          onSearchTermChange?.(event.target.value);
         }}
         value={searchTerm}
         placeholder={`${placeholder} (press / to focus)`}
@@ -1,17 +1,50 @@
-import useFetchProject from "./fetchProject";
+import { useMemo } from "react";
+import useSWR from "swr";
+
+import * as docs from "@/lib/docs";
+import { moduleJson as getModuleJsonUrl } from "@/lib/url";
+
+import useFetchProject, { fetchJson } from "./fetchProject";
+
+const fetcher = async (moduleJsonUrl: string): Promise<docs.Module> => {
+  const mod = await fetchJson<docs.Module>(moduleJsonUrl);
+  if (!mod) {
+    throw new Error(`${moduleJsonUrl} not found`);
+  }
+  return mod;
+};
 
 const useFetchModule = (projectName: string, moduleName: string) => {
-  const { project, projectJsonUrl, error, isLoading } =
+  const { project, split, projectJsonUrl, error, isLoading } =
     useFetchProject(projectName);
 
+  const stub = project?.modules.find((mod) => mod.name === moduleName);
+  // Only the module asked for is fetched from split projects
+  const { data, error: moduleError } = useSWR<docs.Module, Error>(
+    split && stub ? getModuleJsonUrl(projectName, moduleName) : null,
+    fetcher,
+  );
+
+  // Symbols of the module are searchable from the header too
+  const withModule = useMemo(
+    () =>
+      project && split && data
+        ? {
+            ...project,
+            modules: project.modules.map((mod) =>
+              mod.name === moduleName ? data : mod,
+            ),
+          }
+        : project,
+    [project, split, data, moduleName],
+  );
+
   return {
-    isLoading,
-    error,
-    project,
+    isLoading: isLoading || (split && !!stub && !(moduleError || data)),
+    error: error ?? moduleError,
+    project: withModule,
     projectJsonUrl,
-    module: project
-      ? project.modules.find((mod) => mod.name === moduleName)
-      : undefined,
+    module: split ? data : stub,
   };
 };
 
@@ -1,20 +1,78 @@
 import useSWR from "swr";
 
 import * as docs from "@/lib/docs";
-import { projectJson as getProjectJsonUrl } from "@/lib/url";
+import {
+  projectJson as getProjectJsonUrl,
+  projectManifestJson as getProjectManifestJsonUrl,
+} from "@/lib/url";
 
-const fetcher = (input: RequestInfo | URL, init?: RequestInit) =>
-  fetch(input, init).then((res) => res.json());
+export type FetchedProject = {
+  project: docs.Project;
+  // Whether the project only has a manifest, and a file per module. Its
+  // modules only have names then, useFetchModule fetches the rest.
+  split: boolean;
+};
+
+// Resolves to undefined if there's no such file
+export async function fetchJson<T>(url: string): Promise<T | undefined> {
+  const res = await fetch(url);
+  if (res.status === 404) {
+    return undefined;
+  }
+  if (!res.ok) {
+    throw new Error(`${res.status} ${res.statusText}`);
+  }
+  return (await res.json()) as T;
+}
+
+const moduleStub = (entry: docs.ModuleEntry): docs.Module => ({
+  name: entry.name,
+  documentation: [],
+  functions: [],
+  variables: [],
+  classes: [],
+  exports: [],
+});
+
+const fetcher = async (
+  projectManifestJsonUrl: string,
+  projectJsonUrl: string,
+): Promise<FetchedProject> => {
+  const manifest = await fetchJson<docs.ProjectManifest>(
+    projectManifestJsonUrl,
+  );
+  if (manifest) {
+    return {
+      project: {
+        name: manifest.name,
+        metadata: manifest.metadata,
+        documentation: manifest.documentation,
+        modules: manifest.modules.map(moduleStub),
+      },
+      split: true,
+    };
+  }
+  // Not indexed with --split-modules
+  const project = await fetchJson<docs.Project>(projectJsonUrl);
+  if (!project) {
+    throw new Error(`${projectJsonUrl} not found`);
+  }
+  return { project, split: false };
+};
 
 const useFetchProject = (projectName: string) => {
   const projectJsonUrl = getProjectJsonUrl(projectName);
 
-  const { data, error } = useSWR<docs.Project, Error>(projectJsonUrl, fetcher);
+  const { data, error } = useSWR<FetchedProject, Error>(
+    [getProjectManifestJsonUrl(projectName), projectJsonUrl],
+    fetcher,
+  );
 
   return {
     isLoading: !(error || data),
     error,
-    project: data,
+    project: data?.project,
+    split: data?.split ?? false,
     projectJsonUrl,
   };
 };
@@ -100,9 +100,7 @@ const useFetchSymbol = (
     error,
     project,
     projectJsonUrl,
-    module: project
-      ? project.modules.find((mod) => mod.name === moduleName)
-      : undefined,
+    module,
     symbolType,
     symbol,
   };
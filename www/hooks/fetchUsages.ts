@@ -0,0 +1,23 @@
+import useSWR from "swr";
+
+import * as docs from "@/lib/docs";
+import { usagesShard } from "@/lib/url";
+
+// Symbols nothing uses have no shard
+const fetcher = (input: RequestInfo | URL, init?: RequestInit) =>
+  fetch(input, init).then((res) => (res.ok ? res.json() : {}));
+
+const useFetchUsages = (projectName: string, fqname: string) => {
+  const { data, error } = useSWR<docs.UsagesShard, Error>(
+    usagesShard(projectName, fqname),
+    fetcher,
+  );
+
+  return {
+    isLoading: !(error || data),
+    error,
+    usages: data?.[fqname] ?? [],
+  };
+};
+
+export default useFetchUsages;
@@ -1,3 +1,4 @@
+import { createHash } from "crypto";
 import { promises as fs } from "fs";
 import path from "path";
 import process from "process";
@@ -15,9 +16,101 @@ export async function getIndexMetadata(): Promise<IndexMetadata> {
   return JSON.parse(json) as IndexMetadata;
 }
 
+export async function getProjectNames(): Promise<Array<string>> {
+  const namesDirectory = path.join(indexDirectory, ".names");
+  const pages = (await fs.readdir(namesDirectory)).filter((page) =>
+    page.endsWith(".json"),
+  );
+  const names = await Promise.all(
+    pages.map(async (page) => {
+      const json = await fs.readFile(path.join(namesDirectory, page), "utf8");
+      return JSON.parse(json) as Array<string>;
+    }),
+  );
+  return names.flat().sort();
+}
+
+type Layout = {
+  shard_width: number;
+};
+
+async function getLayout(): Promise<Layout> {
+  try {
+    const json = await fs.readFile(
+      path.join(indexDirectory, ".layout"),
+      "utf8",
+    );
+    return JSON.parse(json) as Layout;
+  } catch {
+    return { shard_width: 0 };
+  }
+}
+
+function projectDirectory(name: string, layout: Layout): string {
+  if (!layout.shard_width) {
+    return indexDirectory;
+  }
+  const shard = createHash("sha256")
+    .update(name)
+    .digest("hex")
+    .slice(0, layout.shard_width);
+  return path.join(indexDirectory, shard);
+}
+
+async function readProjectFile(name: string, file: string): Promise<string> {
+  const layout = await getLayout();
+  try {
+    return await fs.readFile(
+      path.join(projectDirectory(name, layout), file),
+      "utf8",
+    );
+  } catch {
+    // Directories that are being migrated may still have projects in the
+    // other layout
+    const fallback = { shard_width: layout.shard_width ? 0 : 2 };
+    return await fs.readFile(
+      path.join(projectDirectory(name, fallback), file),
+      "utf8",
+    );
+  }
+}
+
+export async function getProjectManifest(
+  name: string,
+): Promise<ProjectManifest> {
+  const json = await readProjectFile(name, `${name}.modules.json`);
+  return JSON.parse(json) as ProjectManifest;
+}
+
+export async function getModule(
+  name: string,
+  moduleName: string,
+): Promise<Module> {
+  const json = await readProjectFile(
+    name,
+    path.join(`${name}.modules`, `${moduleName}.json`),
+  );
+  return JSON.parse(json) as Module;
+}
+
 export async function getProject(name: string): Promise<Project> {
-  const indexFile = path.join(indexDirectory, `${name}.json`);
-  const json = await fs.readFile(indexFile, "utf8");
+  let json;
+  try {
+    json = await readProjectFile(name, `${name}.json`);
+  } catch {
+    // Projects indexed with --split-modules only have a manifest, and a file
+    // per module
+    const manifest = await getProjectManifest(name);
+    const modules = await Promise.all(
+      manifest.modules.map((mod) => getModule(name, mod.name)),
+    );
+    return {
+      name: manifest.name,
+      metadata: manifest.metadata,
+      documentation: manifest.documentation,
+      modules,
+    };
+  }
   return JSON.parse(json) as Project;
 }
 
@@ -96,9 +189,29 @@ export type Project = {
   modules: Array<Module>;
 };
 
+export type ModuleEntry = {
+  name: string;
+  sha256: string;
+  size: number;
+};
+
+export type ProjectManifest = {
+  name: string;
+  metadata: ProjectMetadata;
+  documentation: Array<Documentation>;
+  modules: Array<ModuleEntry>;
+  content_hash: string;
+};
+
 export type IndexMetadata = {
   generated_at: number;
   latest_projects: Array<ProjectMetadata>;
   top_projects: Array<ProjectMetadata>;
-  all_project_names: Array<string>;
+  project_count: number;
 };
+
+// A row of a usages shard written by the indexer: the project and symbol
+// using a symbol, and whether it's an export, parameter, return or variable type
+export type Usage = [string, string, string];
+
+export type UsagesShard = { [fqname: string]: Array<Usage> };
@@ -11,17 +11,64 @@ import { getProject } from "@/lib/docs";
 
 import { SPARoutes } from "@/pages/_spa";
 
-export function setupSPAServer() {
+const notFound = () => new HttpResponse(null, { status: 404 });
+
+type Options = {
+  // Serve the test index like it was indexed with --split-modules: only a
+  // manifest and a file per module for every project
+  splitModules?: boolean;
+};
+
+export function setupSPAServer({ splitModules = false }: Options = {}) {
+  const requested: Array<string> = [];
   const server = setupServer(
-    http.get("/_index/:file", async ({ params }) =>
-      HttpResponse.json(
-        await getProject((params.file as string).replace(/\.json$/, "")),
-      ),
-    ),
+    // The test index has no usages of any symbol the tests visit
+    http.get("/_index/.usages/*", notFound),
+    http.get("/_index/:file", async ({ params }) => {
+      const file = params.file as string;
+      requested.push(file);
+      const manifest = file.match(/^(.*)\.modules\.json$/);
+      if (manifest) {
+        if (!splitModules) {
+          return notFound();
+        }
+        const project = await getProject(manifest[1]);
+        return HttpResponse.json({
+          ...project,
+          modules: project.modules.map((mod) => ({
+            name: mod.name,
+            sha256: "",
+            size: 0,
+          })),
+          content_hash: "",
+        });
+      }
+      if (splitModules) {
+        return notFound();
+      }
+      return HttpResponse.json(await getProject(file.replace(/\.json$/, "")));
+    }),
+    http.get("/_index/:dir/:file", async ({ params }) => {
+      const dir = params.dir as string;
+      const file = params.file as string;
+      requested.push(`${dir}/${file}`);
+      const split = dir.match(/^(.*)\.modules$/);
+      if (!splitModules || !split) {
+        return notFound();
+      }
+      const project = await getProject(split[1]);
+      const mod = project.modules.find((m) => `${m.name}.json` === file);
+      return mod ? HttpResponse.json(mod) : notFound();
+    }),
   );
   beforeAll(() => server.listen());
-  afterEach(() => server.resetHandlers());
+  afterEach(() => {
+    server.resetHandlers();
+    requested.length = 0;
+  });
   afterAll(() => server.close());
+  // Index files the page under test requested, without the /_index/ prefix
+  return requested;
 }
 
 export async function renderSPA(path: string): Promise<RenderResult> {
@@ -21,6 +21,38 @@ export function projectJson(name: string): string {
   return `/_index/${normalizeProjectName(name)}.json`;
 }
 
+// Projects indexed with --split-modules have a manifest instead, and a file
+// per module
+export function projectManifestJson(name: string): string {
+  return `/_index/${normalizeProjectName(name)}.modules.json`;
+}
+
+export function moduleJson(name: string, moduleName: string): string {
+  return `/_index/${normalizeProjectName(name)}.modules/${moduleName}.json`;
+}
+
+// Must match page_for in py_wtf/repository/names.py
+export function namesPage(name: string): string {
+  const first = normalizeProjectName(name).slice(0, 1);
+  const page = /[a-z0-9]/.test(first) ? first : "_";
+  return `/_index/.names/${page}.json`;
+}
+
+// Must match shard_for in py_wtf/repository/search.py
+function shardFor(name: string): string {
+  const prefix = Array.from(name.replace(/^_+/, "").toLowerCase()).slice(0, 2);
+  if (prefix.length === 0) {
+    return "_";
+  }
+  return prefix.map((c) => (/[a-z0-9]/.test(c) ? c : "_")).join("");
+}
+
+// Must match usages in py_wtf/repository/usages.py
+export function usagesShard(project: string, fqname: string): string {
+  const name = fqname.slice(fqname.lastIndexOf(".") + 1);
+  return `/_index/.usages/${project}/${shardFor(name)}.json`;
+}
+
 export function project(p: docs.Project): string {
   return `/${p.name}`;
 }
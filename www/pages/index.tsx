@@ -1,5 +1,6 @@
 import styled from "@emotion/styled";
 import { GetStaticProps } from "next";
+import { useMemo, useState } from "react";
 import useSWR from "swr";
 
 import SymbolLinkTable, {
@@ -20,6 +21,7 @@ import {
   Project,
   ProjectMetadata,
   getIndexMetadata,
+  getProjectNames,
 } from "@/lib/docs";
 import {
   SearchDescriptor,
@@ -76,6 +78,7 @@ export interface Props {
   recentProjects: ProjectSymbol[];
   descriptors: SearchDescriptor[];
   generatedAt: number;
+  projectCount: number;
 }
 
 const metadataToSymbol = (prj: ProjectMetadata) => ({
@@ -83,21 +86,24 @@ const metadataToSymbol = (prj: ProjectMetadata) => ({
   ...prj,
 });
 
+const projectDescriptor = (name: string): SearchDescriptor => ({
+  name,
+  fqname: name,
+  type: "project" as SymbolType,
+  url: url.project({ name } as Project),
+});
+
 export const getStaticProps: GetStaticProps<Props> = async () => {
   const metadata = await getIndexMetadata();
-  const projectNames = metadata.all_project_names;
-  const descriptors = projectNames.map((name) => ({
-    name,
-    fqname: name,
-    type: "project" as SymbolType,
-    url: url.project({ name } as Project),
-  }));
+  const projectNames = await getProjectNames();
+  const descriptors = projectNames.map(projectDescriptor);
   return {
     props: {
       topProjects: metadata.top_projects.map(metadataToSymbol),
       recentProjects: metadata.latest_projects.map(metadataToSymbol),
       descriptors,
       generatedAt: metadata.generated_at,
+      projectCount: metadata.project_count,
     },
   };
 };
@@ -110,17 +116,14 @@ function useHomeData() {
     fetcher,
   );
 
-  const props: Props | undefined = data
+  // .metadata just has the fields that change every update, project names
+  // are in pages, see useProjectDescriptors
+  const props: Omit<Props, "descriptors"> | undefined = data
     ? {
         topProjects: data.top_projects.map(metadataToSymbol),
         recentProjects: data.latest_projects.map(metadataToSymbol),
-        descriptors: data.all_project_names.map((name: string) => ({
-          name,
-          fqname: name,
-          type: "project" as SymbolType,
-          url: url.project({ name } as Project),
-        })),
         generatedAt: data.generated_at,
+        projectCount: data.project_count,
       }
     : undefined;
 
@@ -131,6 +134,24 @@ function useHomeData() {
   };
 }
 
+// Names of projects added since the site was built are only in the page of
+// names starting like the search term, so that one is fetched as it's typed
+function useProjectDescriptors(
+  descriptors: SearchDescriptor[],
+  searchTerm: string,
+) {
+  const { data } = useSWR<string[], Error>(
+    searchTerm ? url.namesPage(searchTerm) : null,
+    (url: string) => fetch(url).then((res) => (res.ok ? res.json() : [])),
+  );
+
+  return useMemo(() => {
+    const known = new Set(descriptors.map((d) => d.name));
+    const added = (data ?? []).filter((name) => !known.has(name));
+    return makeIndex([...descriptors, ...added.map(projectDescriptor)]);
+  }, [descriptors, data]);
+}
+
 function humanizeTime(timestamp: number) {
   const dt = new Intl.DateTimeFormat(undefined, {
     timeStyle: "short",
@@ -144,16 +165,19 @@ export default function Home({
   recentProjects,
   descriptors,
   generatedAt,
+  projectCount,
 }: Props) {
   const { data, isLoading, error } = useHomeData();
+  const [searchTerm, setSearchTerm] = useState("");
+  const index = useProjectDescriptors(descriptors, searchTerm);
   if (!isLoading) {
     if (error) {
       console.error(error);
     } else if (data) {
       topProjects = data.topProjects;
       recentProjects = data.recentProjects;
-      descriptors = data.descriptors;
       generatedAt = data.generatedAt;
+      projectCount = data.projectCount;
     } else {
       console.error("No data");
     }
@@ -163,8 +187,9 @@ export default function Home({
       <ProjectContainer>
         <SearchContainer>
           <Search
-            descriptors={makeIndex(descriptors)}
+            descriptors={index}
             placeholder="👉Search for a Python package👈"
+            onSearchTermChange={setSearchTerm}
           />
         </SearchContainer>
         <ProjectTables>
@@ -180,8 +205,7 @@ export default function Home({
           />
         </ProjectTables>
         <TimestampFooter>
-          Generated on {humanizeTime(generatedAt)} for {descriptors.length}{" "}
-          projects
+          Generated on {humanizeTime(generatedAt)} for {projectCount} projects
         </TimestampFooter>
       </ProjectContainer>
     </PageLayout>